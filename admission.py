@@ -0,0 +1,322 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+
+from config import RATE_LIMITS, ADMISSION_MAX_WAIT, ADMISSION_DEFAULT_BACKOFF
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("admission")
+
+# Fairness key of the code currently running (a Streamlit session or API client).
+# Context variables follow coroutines handed to the shared event loop.
+_current_session = contextvars.ContextVar("admission_session", default="default")
+
+
+def set_session(session_id):
+    """Attribute API calls made from the current context to a session"""
+    _current_session.set(session_id)
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a call would have to wait longer than allowed for its turn"""
+
+    def __init__(self, provider, retry_after):
+        super().__init__(
+            f"{provider} is busy (estimated wait {retry_after:.0f} seconds), please try again")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued call waiting for its turn"""
+
+    def __init__(self, session, loop=None):
+        self.session = session
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        self.loop = loop
+        if loop is not None:
+            self.future = loop.create_future()
+        else:
+            self.event = threading.Event()
+
+    def wake(self):
+        """Signal the waiter (called without the limiter lock held)"""
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ProviderLimiter:
+    """
+    Token bucket, concurrency cap and fair queue for one API provider.
+
+    A call needs a token (refilled at `rate` per second up to `burst`) and a
+    free concurrency slot. Waiting calls are queued per session and served
+    round-robin across sessions, so one busy session can't starve the others.
+    A 429 response blocks the provider until its Retry-After has passed.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrency):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.tokens = float(burst)
+        self.active = 0
+        self.blocked_until = 0.0
+        self.granted = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self.avg_wait = 0.0  # Exponential moving average of queue waits
+        self._refilled_at = time.monotonic()
+        self._queues = OrderedDict()  # session -> deque of waiters, in round-robin order
+        self._timer_due = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Add the tokens earned since the last refill (lock must be held)"""
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _estimate_wait(self, now, queued):
+        """Rough time until a call queued behind `queued` others gets a token (lock must be held)"""
+        blocked = max(0.0, self.blocked_until - now)
+        missing = max(0.0, queued + 1 - self.tokens)
+        return blocked + missing / self.rate
+
+    def _dispatch(self):
+        """Grant queued calls while tokens and slots are available (lock must be held)"""
+        now = time.monotonic()
+        self._refill(now)
+        woken = []
+        delay = None
+        while self._queues and self.active < self.max_concurrency:
+            if now < self.blocked_until:
+                delay = self.blocked_until - now
+                break
+            if self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                break
+
+            # Serve the session at the head, then move it to the back
+            session, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            del self._queues[session]
+            if queue:
+                self._queues[session] = queue
+
+            self.tokens -= 1
+            self.active += 1
+            self.granted += 1
+            waiter.granted = True
+            wait = now - waiter.enqueued_at
+            self.avg_wait = 0.8 * self.avg_wait + 0.2 * wait
+            if wait > 1.0:
+                logger.info(f"[{self.name}] Call admitted after waiting {wait:.2f} seconds")
+            woken.append(waiter)
+
+        if delay is not None and (self._timer_due is None or now + delay < self._timer_due):
+            # Nothing will release a slot, so wake up when the next token is due
+            self._timer_due = now + delay
+            timer = threading.Timer(delay, self._on_timer)
+            timer.daemon = True
+            timer.start()
+        return woken
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer_due = None
+            woken = self._dispatch()
+        for waiter in woken:
+            waiter.wake()
+
+    def _enqueue(self, timeout, loop=None):
+        """Queue a call, rejecting it up front if its estimated wait exceeds the timeout"""
+        session = _current_session.get()
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            estimate = self._estimate_wait(now, self._queued())
+            if timeout is not None and estimate > timeout:
+                self.rejected += 1
+                raise AdmissionRejectedError(self.name, estimate)
+
+            waiter = _Waiter(session, loop)
+            self._queues.setdefault(session, deque()).append(waiter)
+            woken = self._dispatch()
+        for other in woken:
+            other.wake()
+        return waiter
+
+    def _withdraw(self, waiter):
+        """
+        Remove a waiter that gave up
+
+        Returns:
+            bool: False if it had already been granted a slot
+        """
+        with self._lock:
+            if waiter.granted:
+                return False
+            queue = self._queues.get(waiter.session)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.session]
+            self.rejected += 1
+            return True
+
+    def acquire(self, timeout=ADMISSION_MAX_WAIT):
+        """
+        Block until the call may proceed; release() must be called afterwards
+
+        Raises:
+            AdmissionRejectedError: If the call could not be admitted in time
+        """
+        waiter = self._enqueue(timeout)
+        if not waiter.event.wait(timeout) and self._withdraw(waiter):
+            raise AdmissionRejectedError(self.name, self.retry_after())
+
+    async def acquire_async(self, timeout=ADMISSION_MAX_WAIT):
+        """Async version of acquire()"""
+        waiter = self._enqueue(timeout, asyncio.get_running_loop())
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            if self._withdraw(waiter):
+                raise AdmissionRejectedError(self.name, self.retry_after())
+        except BaseException:
+            if not self._withdraw(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        """Free the concurrency slot of a finished call"""
+        with self._lock:
+            self.active -= 1
+            woken = self._dispatch()
+        for waiter in woken:
+            waiter.wake()
+
+    def block_for(self, seconds):
+        """Stop admitting calls for `seconds` after the provider answered 429"""
+        with self._lock:
+            self.rate_limited += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+        logger.warning(f"[{self.name}] Rate limited, pausing calls for {seconds:.1f} seconds")
+
+    def retry_after(self):
+        """Estimated wait for a call queued now"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return self._estimate_wait(now, self._queued())
+
+    def snapshot(self):
+        """Get the current queue depth, estimated wait and counters"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            queued = self._queued()
+            return {
+                "name": self.name,
+                "queued": queued,
+                "sessions_waiting": len(self._queues),
+                "active": self.active,
+                "max_concurrency": self.max_concurrency,
+                "tokens": self.tokens,
+                "estimated_wait": self._estimate_wait(now, queued),
+                "avg_wait": self.avg_wait,
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "rate_limited": self.rate_limited
+            }
+
+
+class _Admission:
+    """Holds an admission slot for the duration of a with / async with block"""
+
+    def __init__(self, provider, timeout=ADMISSION_MAX_WAIT):
+        self.limiter = get_limiter(provider)
+        self.timeout = timeout
+
+    def __enter__(self):
+        self.limiter.acquire(self.timeout)
+        return self.limiter
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.limiter.release()
+
+    async def __aenter__(self):
+        await self.limiter.acquire_async(self.timeout)
+        return self.limiter
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.limiter.release()
+
+
+def admission(provider, timeout=ADMISSION_MAX_WAIT):
+    """
+    Wait for a provider's admission before an API call, usable with both
+    `with` and `async with`:
+
+        async with admission("fish_audio"):
+            response = await client.post(...)
+
+    Args:
+        provider (str): Key in RATE_LIMITS
+        timeout (float): Longest acceptable wait for a turn in seconds
+
+    Raises:
+        AdmissionRejectedError: If the call would wait longer than the timeout
+    """
+    return _Admission(provider, timeout)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, or the default backoff"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return ADMISSION_DEFAULT_BACKOFF
+
+
+def report_rate_limited(provider, retry_after=None):
+    """Record a 429 from a provider so queued calls wait instead of retrying into it"""
+    get_limiter(provider).block_for(parse_retry_after(retry_after))
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    """Get the process-wide limiter for a provider, creating it on first use"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            limits = RATE_LIMITS[provider]
+            _limiters[provider] = ProviderLimiter(
+                provider, limits["rate"], limits["burst"], limits["max_concurrency"])
+        return _limiters[provider]
+
+
+def all_limiters():
+    """Get snapshots of every limiter created so far"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.snapshot() for limiter in limiters]
@@ -0,0 +1,403 @@
+import json
+import time
+import asyncio
+import logging
+import argparse
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, quote
+
+from config import API_HOST, API_PORT, API_MAX_BODY_BYTES, API_REQUEST_TIMEOUT, CELEBRITIES
+from speech_recognizer import SpeechRecognizer
+from text_transformer import TextTransformer
+from voice_synthesizer import VoiceSynthesizer
+from circuit_breaker import CircuitOpenError, all_breakers
+from admission import AdmissionRejectedError, all_limiters, set_session
+from metrics import start_request, current_request, prometheus_text
+from janitor import get_janitor, prometheus_text as disk_prometheus_text
+from audio_store import read_audio
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("api_server")
+
+MAX_HEADERS = 100
+
+
+class APIError(Exception):
+    """An error answered with a JSON body and the given HTTP status"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class _AbortResponse(Exception):
+    """The response can't be completed after bytes were sent; drop the connection"""
+
+
+class Request:
+    """A parsed HTTP request"""
+
+    def __init__(self, method, target, version, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = parse_qs(url.query)
+        self.version = version
+        self.headers = headers  # Lower-cased names
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        """Whether the client wants to reuse the connection"""
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def param(self, name, default=None):
+        """Get a query string parameter"""
+        return self.query.get(name, [default])[0]
+
+    def json(self):
+        """Parse the body as a JSON object"""
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+        if not isinstance(payload, dict):
+            raise APIError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return payload
+
+
+class AudioSink:
+    """
+    Receives synthesized audio like a LiveAudioStream, but hands the chunks to
+    a coroutine on the same event loop instead of blocking HTTP threads.
+    """
+
+    RESET = object()
+    END = object()
+    FAILED = object()
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def write(self, chunk):
+        self.queue.put_nowait(bytes(chunk))
+
+    def reset(self):
+        self.queue.put_nowait(self.RESET)
+
+    def finish(self):
+        self.queue.put_nowait(self.END)
+
+    def fail(self):
+        self.queue.put_nowait(self.FAILED)
+
+
+class PipelineAPI:
+    """
+    Asyncio HTTP/1.1 server exposing the voice pipeline without a browser.
+
+    Every connection is a coroutine on one event loop, so many clients are
+    served concurrently while the recognizer, transformer and synthesizer
+    share their connection pools and caches.
+
+    Endpoints:
+        GET  /health       Status and circuit breaker states
+        GET  /metrics      Stage latency histograms and disk usage in Prometheus text format
+        GET  /celebrities  Available voices
+        POST /transcribe   WAV body -> {"text": ...} (?language=)
+        POST /transform    {"text", "celebrity"} -> {"text": ...}
+        POST /synthesize   {"text", "celebrity"} -> streamed audio/mpeg
+        POST /pipeline     WAV body -> streamed audio/mpeg (?celebrity=&language=)
+    """
+
+    def __init__(self):
+        self.recognizer = SpeechRecognizer()
+        self.transformer = TextTransformer()
+        self.synthesizer = VoiceSynthesizer()
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.metrics,
+            ("GET", "/celebrities"): self.celebrities,
+            ("POST", "/transcribe"): self.transcribe,
+            ("POST", "/transform"): self.transform,
+            ("POST", "/synthesize"): self.synthesize,
+            ("POST", "/pipeline"): self.pipeline
+        }
+
+    # Connection handling
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client or an error closes it"""
+        # Each connection task has its own context; queue its calls as one client
+        peer = writer.get_extra_info("peername")
+        set_session(f"api:{peer[0] if peer else 'unknown'}")
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, writer), API_REQUEST_TIMEOUT)
+                except APIError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, e.headers, keep_alive=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    break
+                if request is None:
+                    break
+                if not await self._dispatch(request, writer):
+                    break
+        except (_AbortResponse, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        """Read one request, or return None when the client closed the connection"""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise APIError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise APIError(HTTPStatus.LENGTH_REQUIRED, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > API_MAX_BODY_BYTES:
+            raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                           f"Request body exceeds {API_MAX_BODY_BYTES} bytes")
+
+        if length and headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, version, headers, body)
+
+    async def _dispatch(self, request, writer):
+        """Route a request and send its response; returns whether to keep the connection"""
+        start_time = time.time()
+        keep_alive = request.keep_alive
+        status = HTTPStatus.OK
+        # Stages timed while handling the request share its ID (the client's, if it sent one)
+        start_request(request.headers.get("x-request-id", "")[:64] or None)
+        try:
+            if request.method == "OPTIONS":
+                status = HTTPStatus.NO_CONTENT
+                await self._send(writer, status, b"", {
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "Content-Type, X-Request-ID"
+                }, keep_alive)
+                return keep_alive
+
+            handler = self.routes.get((request.method, request.path))
+            if handler is None:
+                if any(path == request.path for _, path in self.routes):
+                    raise APIError(HTTPStatus.METHOD_NOT_ALLOWED, "Method not allowed")
+                raise APIError(HTTPStatus.NOT_FOUND, "Not found")
+            status = await handler(request, writer, keep_alive) or HTTPStatus.OK
+        except APIError as e:
+            status = e.status
+            await self._send_json(writer, status, {"error": e.message}, e.headers, keep_alive)
+        except (CircuitOpenError, AdmissionRejectedError) as e:
+            status = HTTPStatus.SERVICE_UNAVAILABLE
+            await self._send_json(writer, status, {"error": str(e)},
+                                  {"Retry-After": str(max(1, round(e.retry_after)))}, keep_alive)
+        except ValueError as e:
+            status = HTTPStatus.BAD_REQUEST
+            await self._send_json(writer, status, {"error": str(e)}, keep_alive=keep_alive)
+        except (_AbortResponse, ConnectionError):
+            logger.warning(f"{request.method} {request.path} aborted after "
+                           f"{time.time() - start_time:.2f} seconds")
+            raise
+        except Exception as e:
+            logger.error(f"{request.method} {request.path} failed: {str(e)}")
+            status = HTTPStatus.BAD_GATEWAY
+            await self._send_json(writer, status, {"error": str(e)}, keep_alive=keep_alive)
+
+        logger.info(f"{request.method} {request.path} -> {int(status)} "
+                    f"in {time.time() - start_time:.2f} seconds")
+        return keep_alive
+
+    # Response helpers
+
+    def _head(self, status, headers, keep_alive):
+        """Build the status line and headers"""
+        lines = [f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}",
+                 "Access-Control-Allow-Origin: *",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if current_request() is not None:
+            lines.append(f"X-Request-ID: {current_request()}")
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer, status, body, headers=None, keep_alive=True):
+        """Send a complete response"""
+        headers = dict(headers or {})
+        headers["Content-Length"] = str(len(body))
+        writer.write(self._head(status, headers, keep_alive) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None, keep_alive=True):
+        """Send a JSON response"""
+        headers = dict(headers or {})
+        headers["Content-Type"] = "application/json"
+        await self._send(writer, status, json.dumps(payload).encode(), headers, keep_alive)
+
+    async def _stream_synthesis(self, writer, text, celebrity_id, keep_alive, headers=None):
+        """
+        Synthesize speech and send it with chunked encoding as it arrives.
+
+        Headers go out with the first chunk, so failures before that still get
+        a proper error response. A retry after audio was sent can't be undone;
+        the connection is dropped so the client sees a truncated response.
+        """
+        sink = AudioSink()
+        task = asyncio.create_task(self.synthesizer.synthesize_speech_async(
+            text, celebrity_id, live_stream=sink))
+        started = False
+        try:
+            while True:
+                item = await sink.queue.get()
+                if item is sink.END:
+                    break
+                if item is sink.RESET or item is sink.FAILED:
+                    if started:
+                        raise _AbortResponse()
+                    if item is sink.FAILED:
+                        await task  # Raises the synthesis error
+                    continue
+
+                if not started:
+                    response_headers = dict(headers or {})
+                    response_headers.update({"Content-Type": "audio/mpeg",
+                                             "Cache-Control": "no-store",
+                                             "Transfer-Encoding": "chunked"})
+                    writer.write(self._head(HTTPStatus.OK, response_headers, keep_alive))
+                    started = True
+                writer.write(f"{len(item):X}\r\n".encode() + item + b"\r\n")
+                await writer.drain()
+
+            output_file = await task
+            if not started:
+                # Nothing was streamed, e.g. an empty file; send it whole
+                await self._send(writer, HTTPStatus.OK, read_audio(output_file),
+                                 {**(headers or {}), "Content-Type": "audio/mpeg"}, keep_alive)
+                return
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            if not task.done():
+                # The client went away; stop paying for the synthesis
+                task.cancel()
+
+    # Endpoints
+
+    def _celebrity(self, celebrity_id):
+        if celebrity_id not in CELEBRITIES:
+            raise APIError(HTTPStatus.BAD_REQUEST,
+                           f"Unknown celebrity, expected one of: {', '.join(CELEBRITIES)}")
+        return celebrity_id
+
+    def _text(self, payload):
+        text = payload.get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise APIError(HTTPStatus.BAD_REQUEST, "Field 'text' must be a non-empty string")
+        return text
+
+    async def health(self, request, writer, keep_alive):
+        await self._send_json(writer, HTTPStatus.OK, {
+            "status": "ok",
+            "breakers": all_breakers(),
+            "admission": all_limiters()
+        }, keep_alive=keep_alive)
+
+    async def metrics(self, request, writer, keep_alive):
+        await self._send(writer, HTTPStatus.OK, (prometheus_text() + disk_prometheus_text()).encode("utf-8"),
+                         {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}, keep_alive)
+
+    async def celebrities(self, request, writer, keep_alive):
+        await self._send_json(writer, HTTPStatus.OK, {
+            celebrity_id: {"name": celebrity["name"], "description": celebrity["description"]}
+            for celebrity_id, celebrity in CELEBRITIES.items()
+        }, keep_alive=keep_alive)
+
+    async def _transcribe_body(self, request):
+        if not request.body:
+            raise APIError(HTTPStatus.BAD_REQUEST, "Request body must contain WAV audio")
+        text = await self.recognizer.transcribe_audio_async(request.body, request.param("language"))
+        if not text:
+            raise APIError(HTTPStatus.UNPROCESSABLE_ENTITY, "No speech could be transcribed")
+        return text
+
+    async def transcribe(self, request, writer, keep_alive):
+        text = await self._transcribe_body(request)
+        await self._send_json(writer, HTTPStatus.OK, {"text": text}, keep_alive=keep_alive)
+
+    async def transform(self, request, writer, keep_alive):
+        payload = request.json()
+        text = self._text(payload)
+        celebrity_id = self._celebrity(payload.get("celebrity"))
+        transformed = await self.transformer.transform_text_async(text, celebrity_id)
+        await self._send_json(writer, HTTPStatus.OK, {"text": transformed}, keep_alive=keep_alive)
+
+    async def synthesize(self, request, writer, keep_alive):
+        payload = request.json()
+        text = self._text(payload)
+        celebrity_id = self._celebrity(payload.get("celebrity"))
+        await self._stream_synthesis(writer, text, celebrity_id, keep_alive)
+
+    async def pipeline(self, request, writer, keep_alive):
+        celebrity_id = self._celebrity(request.param("celebrity"))
+        transcript = await self._transcribe_body(request)
+        transformed = await self.transformer.transform_text_async(transcript, celebrity_id)
+        # Texts travel percent-encoded, since header values must be Latin-1
+        await self._stream_synthesis(writer, transformed, celebrity_id, keep_alive, {
+            "X-Transcript": quote(transcript),
+            "X-Transformed-Text": quote(transformed)
+        })
+
+
+async def serve(host=API_HOST, port=API_PORT):
+    """Run the API server until cancelled"""
+    api = PipelineAPI()
+    # Clips sent to clients are not held, the janitor reclaims them under the output quota
+    get_janitor()
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    logger.info(f"API server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Headless HTTP API for the Celebrity Voice Transformer")
+    parser.add_argument("--host", default=API_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=API_PORT, help="Port to listen on")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("API server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,41 @@
+import time
+script_started = time.perf_counter()
+
 import os
+import uuid
 import streamlit as st
-import time
 import threading
 import atexit
+import concurrent.futures
 from pathlib import Path
-import base64
-
-from audio_processor import AudioProcessor
-from text_transformer import TextTransformer
-from voice_synthesizer import VoiceSynthesizer
-from config import CELEBRITIES, RECORD_SECONDS
-from utils import cleanup_temp_files
-
-# Initialize components
-audio_processor = AudioProcessor()
-text_transformer = TextTransformer()
-voice_synthesizer = VoiceSynthesizer()
+import json
+import streamlit.components.v1 as components
+
+from config import (CELEBRITIES, RECORD_SECONDS, SAMPLE_RATE, VAD_MAX_SECONDS, MEDIA_SERVER_PORT, JOB_POLL_INTERVAL,
+                    JANITOR_HOLD_SECONDS, TTS_PARALLEL_ENABLED, RACE_TRANSCRIPTION)
+from utils import cleanup_temp_files, audio_data_uri
+from http_client import warm_up_connections
+from circuit_breaker import all_breakers
+from admission import set_session, all_limiters
+from jobs import JobManager, JobCancelled
+from media_server import (LiveAudioStream, ensure_media_server, register_stream,
+                          media_base_url, media_path)
+from components import get_audio_processor, get_text_transformer, get_voice_synthesizer
+from startup_profile import record_timing, startup_report
+from metrics import start_request, observe, stage_summary, recent_traces
+from janitor import get_janitor
+from audio_store import read_audio, get_audio_store
+
+# Components are process-wide singletons, created on first use rather than on every rerun.
+# They hold no per-user settings: those live in st.session_state and are passed into each call
+audio_processor = get_audio_processor()
+voice_synthesizer = get_voice_synthesizer()
+
+# Open keep-alive connections to the API hosts (only happens once per process)
+warm_up_connections()
+
+# Keeps temp_audio and output_audio within their quotas (one thread per process)
+janitor = get_janitor()
 
 # Set page config
 st.set_page_config(
@@ -24,27 +44,319 @@ st.set_page_config(
     layout="wide"
 )
 
-# Helper functions
+# Queue this session's API calls fairly against the other sessions
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+set_session(st.session_state["session_id"])
 
+# Per-session transcription and synthesis settings, changed in the Settings tab
+st.session_state.setdefault("use_fish_audio", True)
+st.session_state.setdefault("race_transcription", RACE_TRANSCRIPTION)
+st.session_state.setdefault("parallel_synthesis", TTS_PARALLEL_ENABLED)
+
+# Helper functions
 
-def autoplay_audio(file_path):
-    """Autoplay audio in Streamlit with iOS Safari compatibility"""
-    with open(file_path, "rb") as f:
-        audio_bytes = f.read()
 
-    audio_base64 = base64.b64encode(audio_bytes).decode()
+def autoplay_audio(file_path, download_name=None):
+    """
+    Play an output clip (file path or audio store reference) from the local
+    media server, with a download link.
 
+    The page only holds the clip's URL; the browser fetches and caches the
+    audio itself. Falls back to inlining the audio when the media server is
+    not running.
+    """
     # Determine MIME type based on file extension
-    mime_type = "audio/mp3" if file_path.endswith(".mp3") else "audio/wav"
+    mime_type = "audio/mpeg" if file_path.endswith(".mp3") else "audio/wav"
+
+    path = media_path(file_path) if ensure_media_server() else None
+    if path is not None:
+        media_player(path, mime_type, download_name=download_name)
+        return
+
+    audio_bytes = bytes(read_audio(file_path))
 
     html = f"""
     <audio controls>
-        <source src="data:{mime_type};base64,{audio_base64}" type="{mime_type}">
+        <source src="{audio_data_uri(audio_bytes, mime_type)}" type="{mime_type}">
         Your browser does not support the audio element.
     </audio>
     """
     st.markdown(html, unsafe_allow_html=True)
 
+    if download_name:
+        st.download_button(
+            label="💾 Download Audio",
+            data=audio_bytes,
+            file_name=download_name,
+            mime=mime_type,
+            use_container_width=True
+        )
+
+
+def _media_base_js():
+    """JavaScript expression for the media server's base URL as seen by the browser"""
+    # Without a public media URL, reach the media server on the host serving this page
+    return f"({json.dumps(media_base_url())} || " \
+        f"`${{new URL(document.baseURI).protocol}}//${{new URL(document.baseURI).hostname}}:{MEDIA_SERVER_PORT}`)"
+
+
+def _keep_held_js(url_js):
+    """
+    JavaScript that re-fetches a clip's headers while the page is open
+
+    Every fetch renews the session's janitor hold on the clip, so it stays
+    available for as long as the page shows it, however long it sits idle.
+    """
+    interval_ms = int(JANITOR_HOLD_SECONDS * 1000 / 4)
+    return f'setInterval(() => fetch({url_js}, {{method: "HEAD"}}).catch(() => {{}}), {interval_ms});'
+
+
+def media_player(path, mime_type="audio/mpeg", autoplay=False, download_name=None):
+    """Render an audio player (and optional download link) for a URL path on the local media server"""
+    download_link = ""
+    if download_name:
+        download_link = f"""
+    <a id="download" download={json.dumps(download_name)}
+       style="display: block; margin-top: 8px; font-family: sans-serif; text-align: center">
+        💾 Download Audio
+    </a>"""
+    html = f"""
+    <audio id="player" controls {"autoplay" if autoplay else ""} style="width: 100%">
+        Your browser does not support the audio element.
+    </audio>{download_link}
+    <script>
+        const base = {_media_base_js()};
+        const player = document.getElementById("player");
+        player.type = "{mime_type}";
+        player.src = base + "{path}";
+        const download = document.getElementById("download");
+        if (download) download.href = player.src + (player.src.includes("?") ? "&" : "?") +
+            "download=" + encodeURIComponent(download.download);
+        {"" if path.startswith("/stream/") else _keep_held_js("player.src")}
+    </script>
+    """
+    components.html(html, height=100 if download_name else 60)
+
+
+def media_download_link(file_path, download_name):
+    """Render a download link for an output clip served by the media server"""
+    html = f"""
+    <a id="download" download={json.dumps(download_name)}
+       style="display: block; font-family: sans-serif; text-align: center">
+        💾 Download Audio
+    </a>
+    <script>
+        const url = {_media_base_js()} + "{media_path(file_path)}";
+        document.getElementById("download").href = url + "&download=" + encodeURIComponent({json.dumps(download_name)});
+        {_keep_held_js("url")}
+    </script>
+    """
+    components.html(html, height=30)
+
+
+@st.cache_resource
+def get_job_manager():
+    """Worker pool shared by every session; jobs survive script reruns"""
+    return JobManager()
+
+
+def run_synthesis_stage(job, text, celebrity_id, parallel):
+    """
+    Synthesize speech inside a job, publishing the live stream as soon as it exists
+
+    Args:
+        job (Job): The running job
+        text (str or iterable): Text to synthesize, or sentences still being generated
+        celebrity_id (str): The ID of the celebrity voice to use
+        parallel (bool): The session's choice of sentence-parallel synthesis for a finished text
+    """
+    live_stream = None
+    if ensure_media_server():
+        live_stream = LiveAudioStream("audio/mpeg")
+        job.set_result("stream_path", register_stream(live_stream))
+
+    chunk_stats = []  # Filled by a parallel synthesis
+    if isinstance(text, str):
+        future = voice_synthesizer.start_streaming_synthesis(
+            text, celebrity_id, live_stream, chunk_stats, parallel=parallel)
+    else:
+        future = voice_synthesizer.start_sentence_stream_synthesis(
+            text, celebrity_id, live_stream, chunk_stats)
+    while True:
+        try:
+            output_file = future.result(timeout=JOB_POLL_INTERVAL)
+            break
+        except concurrent.futures.TimeoutError:
+            if job.cancelled:
+                future.cancel()
+                raise JobCancelled()
+
+    if live_stream is not None and live_stream.first_chunk_at is not None:
+        job.set_result("first_audio_seconds",
+                       live_stream.first_chunk_at - live_stream.created_at)
+    if chunk_stats:
+        job.set_result("chunk_stats", chunk_stats)
+    job.set_result("output_file", output_file)
+
+
+def transform_and_synthesize(job, text, celebrity_id, parallel):
+    """Run the transform and synthesize stages of a job"""
+    text_transformer = get_text_transformer()
+    if not text_transformer.streaming:
+        with job.stage("transform"):
+            transformed_text = text_transformer.transform_text(text, celebrity_id)
+        job.set_result("transformed_text", transformed_text)
+
+        with job.stage("synthesize"):
+            run_synthesis_stage(job, transformed_text, celebrity_id, parallel)
+        return
+
+    def transformed_sentences():
+        # Runs on the synthesizer's worker thread while synthesis is underway
+        sentences = []
+        with job.stage("transform", "Streaming sentences into synthesis"):
+            for sentence in text_transformer.transform_text_stream(text, celebrity_id):
+                sentences.append(sentence)
+                job.set_result("transformed_text", " ".join(sentences))
+                yield sentence
+
+    # Both stages run at once: each sentence is synthesized as soon as it is written
+    with job.stage("synthesize"):
+        run_synthesis_stage(job, transformed_sentences(), celebrity_id, parallel)
+
+
+def microphone_pipeline(job, session_id, celebrity_id, record_duration, use_vad, stream_transcription,
+                        use_fish, race, parallel):
+    """Record, transcribe, transform and synthesize as a background job"""
+    set_session(session_id)
+    start_request(job.id[:12])
+
+    race_result = {}  # Filled if Google races Fish Audio
+
+    # Keep the recording in memory; nothing is written to temp_audio
+    with job.stage("record", "Listening... (stops when you stop talking)" if use_vad
+                   else f"Recording for {record_duration} seconds..."):
+        if stream_transcription:
+            recording, transcribed_text = audio_processor.capture_and_transcribe(
+                record_duration, use_vad=use_vad, cancel_event=job.cancel_event, use_fish=use_fish,
+                race=race, race_result=race_result)
+        else:
+            recording = audio_processor.capture_audio(
+                record_duration, use_vad=use_vad, cancel_event=job.cancel_event)
+        # Recording stops early on cancellation; don't go on with the partial audio
+        job.check_cancelled()
+    job.set_result("recording", recording)
+    job.set_result("overruns", audio_processor.last_capture_overruns)
+
+    if stream_transcription:
+        job.skip_stage("transcribe", "Transcribed while recording")
+    else:
+        with job.stage("transcribe", f"Using {audio_processor.get_current_transcription_service(use_fish, race)}"):
+            transcribed_text = audio_processor.transcribe_audio(
+                recording, use_fish=use_fish, race=race, race_result=race_result)
+    if race_result:
+        job.set_result("race_result", race_result)
+    job.set_result("transcribed_text", transcribed_text)
+
+    transform_and_synthesize(job, transcribed_text, celebrity_id, parallel)
+
+
+def text_pipeline(job, session_id, celebrity_id, text, parallel):
+    """Transform and synthesize typed text as a background job"""
+    set_session(session_id)
+    start_request(job.id[:12])
+
+    transform_and_synthesize(job, text, celebrity_id, parallel)
+
+
+STAGE_LABELS = {
+    "record": "Recording",
+    "transcribe": "Transcribing",
+    "transform": "Transforming text in celebrity style",
+    "synthesize": "Generating celebrity voice"
+}
+STAGE_ICONS = {"pending": "⏳", "running": "🔄",
+               "done": "✅", "failed": "❌", "cancelled": "⏹️"}
+
+
+def submit_job(job_key, kind, stages, fn, *args):
+    """Start a pipeline job for this session, cancelling the one it replaces"""
+    job_manager = get_job_manager()
+    if st.session_state.get(job_key):
+        job_manager.cancel(st.session_state[job_key])
+    job = job_manager.submit(kind, stages, fn, st.session_state["session_id"], *args)
+    st.session_state[job_key] = job.id
+
+
+def poll_job(job_key, results):
+    """
+    Show progress of the session's job and collect its results once it ends
+
+    Args:
+        job_key (str): Session state key holding the job id
+        results (dict): Session state key for each job result to keep
+
+    Returns:
+        dict: Snapshot of the job while it is still running, otherwise None
+    """
+    job_id = st.session_state.get(job_key)
+    job = get_job_manager().get(job_id) if job_id else None
+    if job is None:
+        st.session_state.pop(job_key, None)
+        return None
+
+    snapshot = job.snapshot()
+    for result_key, state_key in results.items():
+        if result_key in snapshot["results"]:
+            st.session_state[state_key] = snapshot["results"][result_key]
+
+    if snapshot["status"] == "done":
+        st.session_state.pop(job_key)
+        if "first_audio_seconds" in snapshot["results"]:
+            st.caption(
+                f"Playback started after {snapshot['results']['first_audio_seconds']:.2f} seconds")
+        return None
+    if snapshot["status"] == "failed":
+        st.session_state.pop(job_key)
+        st.error(f"Could not generate the celebrity voice: {snapshot['error']}")
+        return None
+    if snapshot["status"] == "cancelled":
+        st.session_state.pop(job_key)
+        st.info("Cancelled.")
+        return None
+
+    stages = snapshot["stages"]
+    finished = sum(1 for stage in stages.values() if stage["status"] == "done")
+    st.progress(finished / len(stages),
+                text=f"Working... {snapshot['elapsed']:.0f}s")
+    for name, stage in stages.items():
+        line = f"{STAGE_ICONS[stage['status']]} {STAGE_LABELS[name]}"
+        if stage["seconds"] is not None:
+            line += f" ({stage['seconds']:.1f}s)"
+        elif stage["status"] == "running" and stage["message"]:
+            line += f" — {stage['message']}"
+        st.write(line)
+
+    if st.button("⏹️ Cancel", key=f"cancel_{job_key}", use_container_width=True):
+        job.cancel()
+    return snapshot
+
+
+def show_voice_output(stream_key, file_key, complete, download_name):
+    """
+    Play the synthesized voice. The live player stays in place when the job
+    finishes, so playback that already started is not interrupted.
+    """
+    stream_path = st.session_state.get(stream_key)
+    if stream_path:
+        media_player(stream_path, autoplay=True)
+        if complete:
+            media_download_link(st.session_state[file_key], download_name)
+    elif complete:
+        # Display audio with a download link, served by URL
+        autoplay_audio(st.session_state[file_key], download_name=download_name)
+
 
 # App UI
 st.title("Celebrity Voice Transformer 🎤")
@@ -81,16 +393,32 @@ st.sidebar.info(
 # Tab 1: Microphone Input
 with tab1:
     # Show current transcription service
-    current_service = audio_processor.get_current_transcription_service()
+    current_service = audio_processor.get_current_transcription_service(
+        st.session_state["use_fish_audio"], st.session_state["race_transcription"])
     st.info(f"Currently using {current_service} for speech recognition")
 
+    # Stop automatically when the speaker stops talking
+    use_vad = st.checkbox(
+        "Stop recording when I stop talking",
+        value=False,
+        help=f"Records until you pause (up to {VAD_MAX_SECONDS:.0f} seconds) and trims silence"
+    )
+
+    # Transcribe utterances while still recording
+    stream_transcription = st.checkbox(
+        "Transcribe while recording",
+        value=True,
+        help="Sends each finished sentence for transcription during recording (Fish Audio only)"
+    )
+
     # Record duration slider (only shown in the microphone tab)
     record_duration = st.slider(
         "Recording Duration (seconds)",
         min_value=2,
         max_value=10,
         value=RECORD_SECONDS,
-        step=1
+        step=1,
+        disabled=use_vad
     )
 
     col1, col2 = st.columns(2)
@@ -100,65 +428,54 @@ with tab1:
 
         # Record button
         if st.button("🎙️ Record Audio", key="record_button", use_container_width=True):
-            with st.spinner(f"Recording for {record_duration} seconds..."):
-                audio_file = audio_processor.record_audio(record_duration)
-
-            st.session_state["audio_file"] = audio_file
-            st.session_state["processing_complete"] = False
-
-            with st.spinner(f"Transcribing audio using {audio_processor.get_current_transcription_service()}..."):
-                transcribed_text = audio_processor.transcribe_audio(audio_file)
-
-            st.session_state["transcribed_text"] = transcribed_text
+            for key in ["processing_complete", "recording", "transcribed_text",
+                        "transformed_text", "output_file", "stream_path", "chunk_stats"]:
+                st.session_state.pop(key, None)
+            submit_job("mic_job", "microphone",
+                       ["record", "transcribe", "transform", "synthesize"],
+                       microphone_pipeline, selected_celebrity, record_duration,
+                       use_vad, stream_transcription, st.session_state["use_fish_audio"],
+                       st.session_state["race_transcription"], st.session_state["parallel_synthesis"])
+
+        mic_job = poll_job("mic_job", {
+            "recording": "recording",
+            "overruns": "capture_overruns",
+            "race_result": "last_race",
+            "transcribed_text": "transcribed_text",
+            "transformed_text": "transformed_text",
+            "stream_path": "stream_path",
+            "chunk_stats": "chunk_stats",
+            "output_file": "output_file"
+        })
+        st.session_state["processing_complete"] = mic_job is None and "output_file" in st.session_state
+
+        if "recording" in st.session_state:
+            if st.session_state.get("capture_overruns"):
+                st.warning(
+                    f"Audio capture overran {st.session_state['capture_overruns']} times; "
+                    "parts of the recording may be missing")
 
             # Display original audio
-            st.audio(audio_file)
+            st.audio(st.session_state["recording"].to_bytes(), format="audio/wav")
 
+        if "transcribed_text" in st.session_state:
             # Display transcribed text
-            st.text_area("Transcribed Text", transcribed_text, height=150)
-
-            # Process text and generate speech
-            with st.spinner("Transforming text in celebrity style..."):
-                transformed_text = text_transformer.transform_text(
-                    transcribed_text, selected_celebrity
-                )
-
-            st.session_state["transformed_text"] = transformed_text
-
-            with st.spinner("Generating celebrity voice..."):
-                output_file = voice_synthesizer.synthesize_speech(
-                    transformed_text, selected_celebrity
-                )
-
-            if output_file:
-                st.session_state["output_file"] = output_file
-                st.session_state["processing_complete"] = True
+            st.text_area("Transcribed Text", st.session_state["transcribed_text"], height=150)
 
     with col2:
         st.header(f"{CELEBRITIES[selected_celebrity]['name']}'s Voice")
 
-        # Show transformed text and audio if processing is complete
-        if "processing_complete" in st.session_state and st.session_state["processing_complete"]:
+        show_voice_output("stream_path", "output_file", st.session_state["processing_complete"],
+                          f"{CELEBRITIES[selected_celebrity]['name']}_voice.mp3")
+
+        if "transformed_text" in st.session_state:
             # Display transformed text
             st.text_area(
                 f"Text in {CELEBRITIES[selected_celebrity]['name']}'s Style",
                 st.session_state["transformed_text"],
                 height=150
             )
-
-            # Display audio with custom player only
-            autoplay_audio(st.session_state["output_file"])
-
-            # Download button
-            with open(st.session_state["output_file"], "rb") as f:
-                st.download_button(
-                    label="💾 Download Audio",
-                    data=f,
-                    file_name=f"{CELEBRITIES[selected_celebrity]['name']}_voice.mp3",
-                    mime="audio/mp3",
-                    use_container_width=True
-                )
-        else:
+        elif mic_job is None:
             st.info("Record your voice to transform it into the celebrity's voice!")
 
 # Tab 2: Text Input (Test)
@@ -182,50 +499,35 @@ with tab2:
         # Transform button
         if st.button("🔄 Transform Text", key="transform_button", use_container_width=True) and user_text:
             st.session_state["text_input"] = user_text
-            st.session_state["text_processing_complete"] = False
-
-            # Process text and generate speech
-            with st.spinner("Transforming text in celebrity style..."):
-                transformed_text = text_transformer.transform_text(
-                    user_text, selected_celebrity
-                )
-
-            st.session_state["text_transformed"] = transformed_text
-
-            with st.spinner("Generating celebrity voice..."):
-                output_file = voice_synthesizer.synthesize_speech(
-                    transformed_text, selected_celebrity
-                )
-
-            if output_file:
-                st.session_state["text_output_file"] = output_file
-                st.session_state["text_processing_complete"] = True
+            for key in ["text_processing_complete", "text_transformed",
+                        "text_output_file", "text_stream_path", "chunk_stats"]:
+                st.session_state.pop(key, None)
+            submit_job("text_job", "text", ["transform", "synthesize"],
+                       text_pipeline, selected_celebrity, user_text, st.session_state["parallel_synthesis"])
+
+        text_job = poll_job("text_job", {
+            "transformed_text": "text_transformed",
+            "stream_path": "text_stream_path",
+            "chunk_stats": "chunk_stats",
+            "output_file": "text_output_file"
+        })
+        st.session_state["text_processing_complete"] = \
+            text_job is None and "text_output_file" in st.session_state
 
     with col2:
         st.header(f"{CELEBRITIES[selected_celebrity]['name']}'s Voice")
 
-        # Show transformed text and audio if processing is complete
-        if "text_processing_complete" in st.session_state and st.session_state["text_processing_complete"]:
+        show_voice_output("text_stream_path", "text_output_file", st.session_state["text_processing_complete"],
+                          f"{CELEBRITIES[selected_celebrity]['name']}_text_voice.mp3")
+
+        if "text_transformed" in st.session_state:
             # Display transformed text
             st.text_area(
                 f"Text in {CELEBRITIES[selected_celebrity]['name']}'s Style",
                 st.session_state["text_transformed"],
                 height=150
             )
-
-            # Display audio with custom player only
-            autoplay_audio(st.session_state["text_output_file"])
-
-            # Download button
-            with open(st.session_state["text_output_file"], "rb") as f:
-                st.download_button(
-                    label="💾 Download Audio",
-                    data=f,
-                    file_name=f"{CELEBRITIES[selected_celebrity]['name']}_text_voice.mp3",
-                    mime="audio/mp3",
-                    use_container_width=True
-                )
-        else:
+        elif text_job is None:
             st.info(
                 "Enter text and click 'Transform Text' to convert it to the celebrity's voice.")
 
@@ -235,10 +537,18 @@ with tab3:
 
     # Audio Input Device Selection
     st.subheader("🎙️ Audio Input Device")
-    input_devices = audio_processor.get_available_input_devices()
+    # The device list is cached and rebuilt when a device is plugged in or removed
+    rescan_devices = st.button("🔄 Rescan Devices")
+    input_devices = audio_processor.get_available_input_devices(refresh=rescan_devices)
 
     # Format device options for the selectbox
-    device_options = {str(device['index']): f"{device['name']} ({device['channels']} channels, {device['sample_rate']}Hz)"
+    def format_device(device):
+        label = f"{device['name']} ({device['channels']} channels, {device['sample_rate']}Hz)"
+        if SAMPLE_RATE not in device['sample_rates']:
+            label += f" ⚠️ no {SAMPLE_RATE}Hz"
+        return label
+
+    device_options = {str(device['index']): format_device(device)
                       for device in input_devices}
 
     # Get current device info
@@ -254,14 +564,23 @@ with tab3:
             current_device_index) if current_device_index in device_options else 0
     )
 
-    # Apply device selection
-    if selected_device:
+    # Apply device selection only when it changes
+    if selected_device and int(selected_device) != audio_processor.selected_device_index:
         if audio_processor.set_input_device(int(selected_device)):
             st.success(
                 f"Successfully set input device to: {device_options[selected_device]}")
         else:
             st.error("Failed to set input device. Please try another device.")
 
+    if input_devices:
+        selected_info = next((device for device in input_devices
+                              if str(device['index']) == selected_device), None)
+        if selected_info is not None:
+            st.caption("Supported sample rates: " +
+                       (", ".join(f"{rate}Hz" for rate in selected_info['sample_rates']) or "none detected"))
+    else:
+        st.warning("No input devices found. Connect a microphone and click 'Rescan Devices'.")
+
     # Device Information
     st.info("""
     💡 **Tips for Audio Input:**
@@ -273,12 +592,26 @@ with tab3:
 
     # Transcription Service Settings
     st.subheader("🔄 Transcription Service")
-    current_service = audio_processor.get_current_transcription_service()
-    st.write(f"Current service: **{current_service}**")
-
     if st.button("Toggle Transcription Service", use_container_width=True):
-        new_service = audio_processor.toggle_transcription_service()
+        st.session_state["use_fish_audio"] = not st.session_state["use_fish_audio"]
+        new_service = "Fish Audio" if st.session_state["use_fish_audio"] else "Google Speech Recognition"
         st.success(f"Switched to: {new_service}")
+    current_service = audio_processor.get_current_transcription_service(
+        st.session_state["use_fish_audio"], st.session_state["race_transcription"])
+    st.write(f"Current service: **{current_service}**")
+
+    st.session_state["race_transcription"] = st.checkbox(
+        "Race Fish Audio against Google",
+        value=st.session_state["race_transcription"],
+        help="Starts Google after a short delay and uses whichever answers first"
+    )
+
+    # Outcome of this session's last race
+    last_race = st.session_state.get("last_race")
+    if last_race and last_race["winner"]:
+        timings = ", ".join(f"{name}: {latency:.2f}s" if latency is not None else f"{name}: cancelled"
+                            for name, latency in last_race["latencies"].items())
+        st.caption(f"Last race won by **{last_race['winner']}** ({timings})")
 
     st.info("""
     **About the Transcription Services:**
@@ -287,6 +620,143 @@ with tab3:
     Choose the service that works best for your needs.
     """)
 
+    # API health
+    st.subheader("🩺 API Health")
+    breakers = all_breakers()
+    if breakers:
+        for breaker in breakers:
+            status = {"closed": "🟢", "half-open": "🟡", "open": "🔴"}[breaker["state"]]
+            details = f"{breaker['calls']} calls in window, {breaker['failure_rate']:.0%} failing, " \
+                f"avg {breaker['avg_latency']:.2f}s"
+            if breaker["state"] == "open":
+                details += f", retrying in {breaker['retry_after']:.0f}s"
+            st.write(f"{status} **{breaker['name']}**: {breaker['state']} ({details})")
+    else:
+        st.write("No API calls made yet.")
+
+    # Shared admission control across sessions
+    st.subheader("🚦 API Queues")
+    limiters = all_limiters()
+    if limiters:
+        for limiter in limiters:
+            details = f"{limiter['active']}/{limiter['max_concurrency']} in flight, {limiter['queued']} queued"
+            if limiter["queued"]:
+                details += f" from {limiter['sessions_waiting']} sessions, " \
+                    f"estimated wait {limiter['estimated_wait']:.1f}s"
+            details += f", avg wait {limiter['avg_wait']:.2f}s, {limiter['rate_limited']} rate limits"
+            st.write(f"**{limiter['name']}**: {details}")
+    else:
+        st.write("No API calls made yet.")
+
+    # Cache statistics
+    st.subheader("⚡ Caches")
+    tts_stats = voice_synthesizer.get_cache_stats()
+    if tts_stats:
+        st.write(
+            f"**TTS cache:** {tts_stats['hits']} hits, {tts_stats['misses']} misses "
+            f"({tts_stats['hit_rate']:.0%} hit rate), {tts_stats['entries']} clips, "
+            f"{tts_stats['bytes'] / (1024 * 1024):.1f} / {tts_stats['max_bytes'] / (1024 * 1024):.0f} MB")
+    else:
+        st.write("**TTS cache:** disabled")
+    asr_stats = audio_processor.fish_recognizer.get_cache_stats()
+    if asr_stats:
+        st.write(
+            f"**ASR cache:** {asr_stats['hits']} hits, {asr_stats['misses']} misses "
+            f"({asr_stats['hit_rate']:.0%} hit rate), {asr_stats['entries']} transcripts")
+    else:
+        st.write("**ASR cache:** disabled")
+    transform_stats = get_text_transformer().get_cache_stats()
+    if transform_stats:
+        st.write(
+            f"**Transform cache:** {transform_stats['hits']} hits, {transform_stats['misses']} misses "
+            f"({transform_stats['hit_rate']:.0%} hit rate), {transform_stats['entries']} / "
+            f"{transform_stats['max_entries']} rewrites")
+    else:
+        st.write("**Transform cache:** disabled")
+
+    # Sentence-parallel synthesis
+    st.subheader("🧩 Parallel Synthesis")
+    st.session_state["parallel_synthesis"] = st.checkbox(
+        "Synthesize long texts sentence by sentence in parallel",
+        value=st.session_state["parallel_synthesis"],
+        help="Splits long texts at sentence boundaries and synthesizes the parts concurrently"
+    )
+    # Per-chunk stats of this session's last parallel synthesis
+    if st.session_state.get("chunk_stats"):
+        st.dataframe(
+            [{
+                "Chunk": stats["chunk"],
+                "Characters": stats["chars"],
+                "KB": round(stats["bytes"] / 1024, 1),
+                "Seconds": round(stats["seconds"], 2),
+                "Chars/s": round(stats["chars_per_second"]),
+                "Ready after (s)": round(stats["ready_after"], 2)
+            } for stats in st.session_state["chunk_stats"]],
+            hide_index=True,
+            use_container_width=True
+        )
+
+    # Per-stage latency of recent pipeline runs
+    st.subheader("📈 Latency")
+    latency = stage_summary()
+    if latency:
+        st.dataframe(
+            [{
+                "Stage": stats["stage"],
+                "Count": stats["count"],
+                "p50 (ms)": round(stats["p50"] * 1000),
+                "p95 (ms)": round(stats["p95"] * 1000),
+                "p99 (ms)": round(stats["p99"] * 1000),
+                "Mean (ms)": round(stats["mean"] * 1000)
+            } for stats in latency],
+            hide_index=True,
+            use_container_width=True
+        )
+        with st.expander("Recent requests"):
+            for trace in recent_traces():
+                st.write(f"**{trace['request_id']}**: " + ", ".join(
+                    f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in trace["stages"]))
+    else:
+        st.write("No measurements yet.")
+    st.caption(f"Prometheus metrics: `{media_base_url() or f'http://<this host>:{MEDIA_SERVER_PORT}'}/metrics`")
+
+    # Disk usage of the directories the janitor keeps within quota
+    st.subheader("🧹 Disk Usage")
+    st.dataframe(
+        [{
+            "Directory": usage["directory"],
+            "Files": usage["files"],
+            "MB": round(usage["bytes"] / 1024 / 1024, 1),
+            "Quota MB": round(usage["max_bytes"] / 1024 / 1024),
+            "Max age (h)": round(usage["max_age"] / 3600, 1),
+            "Deleted": usage["deleted_files"],
+            "Freed MB": round(usage["deleted_bytes"] / 1024 / 1024, 1)
+        } for usage in janitor.stats()],
+        hide_index=True,
+        use_container_width=True
+    )
+    free_bytes = [usage["free_bytes"] for usage in janitor.stats() if usage["free_bytes"] is not None]
+    if free_bytes:
+        st.caption(f"{min(free_bytes) / 1024 / 1024 / 1024:.1f} GB free on disk")
+    store = get_audio_store("outputs").stats()
+    if store["backend"] == "pack":
+        st.caption(f"Synthesized audio: {store['entries']} clips in {store['segments']} pack segments "
+                   f"({store['segment_bytes'] / 1024 / 1024:.1f} MB, "
+                   f"{store['dead_bytes'] / 1024 / 1024:.1f} MB reclaimable by compaction)")
+
+    # Startup cost of this process, to catch slow imports and initialization
+    st.subheader("⏱️ Startup")
+    st.dataframe(
+        [{
+            "Step": timing["name"],
+            "Kind": timing["kind"],
+            "Milliseconds": round(timing["seconds"] * 1000)
+        } for timing in startup_report()],
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption("Run `python startup_profile.py` for a per-module import breakdown.")
+
     # API Information
     st.subheader("🔑 API Information")
     st.markdown("""
@@ -301,13 +771,30 @@ with tab3:
 
 
 def cleanup():
-    if "audio_file" in st.session_state:
-        cleanup_temp_files(st.session_state["audio_file"])
+    recording = st.session_state.get("recording")
+    if recording is not None and recording.path:
+        cleanup_temp_files(recording.path)
 
 
 # Register cleanup function
 atexit.register(cleanup)
 
+# Protect the files this session still shows from the janitor
+session_id = st.session_state["session_id"]
+recording = st.session_state.get("recording")
+janitor.hold(f"{session_id}:recording", recording.path if recording is not None else None)
+for key in ("output_file", "text_output_file"):
+    janitor.hold(f"{session_id}:{key}", st.session_state.get(key))
+
 # Add footer
 st.markdown("---")
 st.caption("Powered by OpenAI and Fish Audio API | Made for Raspberry Pi")
+
+# Only the first run of the script in this process is recorded
+record_timing("first script run", "run", time.perf_counter() - script_started)
+observe("ui_render", time.perf_counter() - script_started)
+
+# Refresh while a pipeline job is running; any interaction also reruns the script
+if mic_job is not None or text_job is not None:
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
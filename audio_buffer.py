@@ -0,0 +1,157 @@
+import struct
+import wave
+import logging
+import numpy as np
+
+from config import SAMPLE_RATE, CHANNELS, FORMAT, TEMP_AUDIO_DIR
+from utils import generate_unique_filename
+from metrics import timed_stage
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("audio_buffer")
+
+# Canonical 44-byte PCM WAV header
+WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+
+class AudioBuffer:
+    """
+    In-memory PCM recording stored as a complete WAV file in one bytearray.
+
+    The header is reserved up front and filled in by finalize(), so the WAV
+    bytes, the raw PCM and the NumPy samples are all zero-copy views of the
+    same buffer. Supports the buffer protocol on Python 3.12+ (memoryview(buf)
+    gives the WAV bytes); use the `wav` property on older versions. While a
+    view is alive the buffer cannot be resized, so append() and trim() must
+    happen before views are taken.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=CHANNELS, sample_width=2, capacity=0):
+        """
+        Args:
+            sample_rate (int): Sample rate in Hz
+            channels (int): Number of channels
+            sample_width (int): Bytes per sample
+            capacity (int): Number of PCM bytes to preallocate
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.path = None  # Set once the buffer has been written to disk
+        self._data = bytearray(WAV_HEADER.size + capacity)
+        self._length = WAV_HEADER.size
+        self._finalized = False
+
+    @classmethod
+    def from_file(cls, file_path):
+        """Load a PCM WAV file into a new buffer"""
+        with wave.open(file_path, 'rb') as wf:
+            buffer = cls(wf.getframerate(), wf.getnchannels(), wf.getsampwidth(),
+                         capacity=wf.getnframes() * wf.getnchannels() * wf.getsampwidth())
+            buffer.append(wf.readframes(wf.getnframes()))
+        buffer.path = file_path
+        return buffer
+
+    @property
+    def frame_bytes(self):
+        """Bytes per sample frame (all channels)"""
+        return self.channels * self.sample_width
+
+    @property
+    def pcm_length(self):
+        """Number of PCM bytes captured"""
+        return self._length - WAV_HEADER.size
+
+    @property
+    def duration(self):
+        """Duration of the recording in seconds"""
+        return self.pcm_length / float(self.frame_bytes * self.sample_rate)
+
+    def append(self, frame):
+        """Copy a chunk of PCM data (bytes or int16 array) into the buffer"""
+        end = self._length + memoryview(frame).nbytes
+        self._data[self._length:min(end, len(self._data))] = frame
+        self._length = end
+        self._finalized = False
+
+    def trim(self, start, end):
+        """
+        Keep only the PCM bytes in [start, end), in place
+
+        Args:
+            start (int): First PCM byte offset to keep
+            end (int): PCM byte offset to stop at
+        """
+        header = WAV_HEADER.size
+        del self._data[header + end:]
+        del self._data[header:header + start]
+        self._length = len(self._data)
+        self._finalized = False
+
+    def finalize(self):
+        """Release unused capacity and write the WAV header"""
+        if self._finalized:
+            return self
+        del self._data[self._length:]
+        data_size = self.pcm_length
+        WAV_HEADER.pack_into(
+            self._data, 0,
+            b'RIFF', 36 + data_size, b'WAVE',
+            b'fmt ', 16, 1, self.channels, self.sample_rate,
+            self.sample_rate * self.frame_bytes, self.frame_bytes,
+            self.sample_width * 8,
+            b'data', data_size
+        )
+        self._finalized = True
+        return self
+
+    @property
+    def wav(self):
+        """Zero-copy view of the complete WAV file"""
+        self.finalize()
+        return memoryview(self._data)
+
+    @property
+    def pcm(self):
+        """Zero-copy view of the raw PCM data"""
+        self.finalize()
+        return memoryview(self._data)[WAV_HEADER.size:]
+
+    def samples(self):
+        """Zero-copy NumPy view of the 16-bit PCM samples"""
+        return np.frombuffer(self.pcm, dtype=np.int16)
+
+    def __buffer__(self, flags):
+        return self.wav
+
+    def __len__(self):
+        return self._length
+
+    def to_bytes(self):
+        """Copy the WAV file into an immutable bytes object"""
+        return bytes(self.wav)
+
+    def save(self, file_path=None):
+        """
+        Write the WAV file to disk (only once)
+
+        Args:
+            file_path (str, optional): Destination, defaults to a new file in TEMP_AUDIO_DIR
+
+        Returns:
+            str: Path to the WAV file
+        """
+        if self.path is not None and file_path is None:
+            return self.path
+
+        if file_path is None:
+            file_path = generate_unique_filename(TEMP_AUDIO_DIR, FORMAT)
+
+        with timed_stage("wav_write"), open(file_path, 'wb') as f:
+            f.write(self.wav)
+
+        self.path = file_path
+        logger.info(f"Saved recording to: {file_path}")
+        return file_path
@@ -1,16 +1,23 @@
 import os
+import time
+import asyncio
 import tempfile
-import pyaudio
 import wave
-import speech_recognition as sr
-from pydub import AudioSegment
 import io
 import numpy as np
 import logging
 
-from config import SAMPLE_RATE, CHANNELS, CHUNK_SIZE, RECORD_SECONDS, FORMAT, TEMP_AUDIO_DIR
-from utils import generate_unique_filename, ensure_directory_exists
+from config import (SAMPLE_RATE, CHANNELS, CHUNK_SIZE, RECORD_SECONDS, FORMAT, TEMP_AUDIO_DIR, VAD_MAX_SECONDS,
+                    RACE_TRANSCRIPTION, TRANSCRIPTION_HEDGE_DELAY)
+from utils import ensure_directory_exists
+from audio_store import get_audio_store
 from speech_recognizer import SpeechRecognizer
+from vad import VoiceActivityDetector
+from audio_buffer import AudioBuffer
+from streaming_asr import StreamingTranscriber
+from http_client import run_async
+from device_manager import DeviceManager, device_key
+from metrics import timed_stage
 
 # Configure logger
 logging.basicConfig(level=logging.INFO,
@@ -20,104 +27,268 @@ logger = logging.getLogger("audio_processor")
 
 class AudioProcessor:
     def __init__(self):
-        self.recognizer = sr.Recognizer()
+        self._recognizer = None  # Google recognizer, created on first use
         self.fish_recognizer = SpeechRecognizer()  # Initialize Fish Audio recognizer
-        self.p = pyaudio.PyAudio()
-        self.use_fish_audio = True  # Set to True to use Fish Audio, False to use Google
+        self.devices = DeviceManager()  # Owns PyAudio and the cached device list
         self.selected_device_index = None  # Default to system default device
+        self._selected_device_key = None  # Follows the selection across rescans
+        self.last_capture_overruns = 0  # Overruns during the most recent recording
         ensure_directory_exists(TEMP_AUDIO_DIR)
 
-    def __del__(self):
-        """Clean up PyAudio when the object is destroyed"""
-        if hasattr(self, 'p'):
-            self.p.terminate()
-
-    def get_available_input_devices(self):
-        """Get a list of available audio input devices"""
-        input_devices = []
-        for i in range(self.p.get_device_count()):
-            device_info = self.p.get_device_info_by_index(i)
-            if device_info['maxInputChannels'] > 0:  # If it's an input device
-                name = device_info['name']
-                input_devices.append({
-                    'index': i,
-                    'name': name,
-                    'channels': device_info['maxInputChannels'],
-                    'sample_rate': int(device_info['defaultSampleRate'])
-                })
-        return input_devices
+    @property
+    def p(self):
+        """PyAudio instance, owned by the device manager"""
+        return self.devices.pa
+
+    @property
+    def recognizer(self):
+        """Google Speech Recognition client, created on first use"""
+        if self._recognizer is None:
+            import speech_recognition as sr  # Import here, only needed for Google
+            self._recognizer = sr.Recognizer()
+        return self._recognizer
+
+    def get_available_input_devices(self, refresh=False):
+        """
+        Get a list of available audio input devices
+
+        Args:
+            refresh (bool): Rescan now instead of using the cached list, which
+                is otherwise only rebuilt when a device is plugged in or removed
+
+        Returns:
+            list: Device dicts with index, name, channels, sample_rate and sample_rates
+        """
+        return self.devices.input_devices(refresh=refresh)
 
     def set_input_device(self, device_index):
         """Set the audio input device by its index"""
-        if device_index is not None:
-            device_info = self.p.get_device_info_by_index(device_index)
-            if device_info['maxInputChannels'] > 0:
-                self.selected_device_index = device_index
-                logger.info(f"Selected input device: {device_info['name']}")
-                return True
-        return False
+        if device_index is None:
+            return False
+        if device_index == self.selected_device_index:
+            return True  # Unchanged, nothing to look up
+
+        device = self.devices.get_device(device_index)
+        if device is None:
+            return False
+        self.selected_device_index = device_index
+        self._selected_device_key = device_key(device)
+        logger.info(f"Selected input device: {device['name']}")
+        if SAMPLE_RATE not in device['sample_rates']:
+            logger.warning(f"{device['name']} does not report support for {SAMPLE_RATE} Hz")
+        return True
 
     def get_current_device_info(self):
         """Get information about the currently selected input device"""
-        if self.selected_device_index is not None:
-            return self.p.get_device_info_by_index(self.selected_device_index)
-        return self.p.get_default_input_device_info()
+        if self._selected_device_key is not None:
+            # Indices can shift when devices are plugged in or removed
+            device = self.devices.find_device(self._selected_device_key)
+            if device is not None:
+                self.selected_device_index = device['index']
+                return device
+            logger.warning("Selected input device disappeared, using the system default")
+            self.selected_device_index = None
+            self._selected_device_key = None
+
+        device = self.devices.default_device()
+        if device is None:
+            return {'index': None, 'name': "System default"}
+        return device
+
+    def record_audio(self, seconds=None, use_vad=False, max_seconds=None):
+        """
+        Record audio from the selected microphone and save to a temporary WAV file
+
+        Args:
+            seconds (float, optional): Fixed recording length, defaults to RECORD_SECONDS
+            use_vad (bool): Stop automatically once the speaker stops talking and
+                trim leading/trailing silence instead of recording a fixed window
+            max_seconds (float, optional): Safety cap for VAD recordings,
+                defaults to VAD_MAX_SECONDS
+
+        Returns:
+            str: Path to the recorded WAV file
+        """
+        return self.capture_audio(seconds, use_vad, max_seconds).save()
+
+    def capture_audio(self, seconds=None, use_vad=False, max_seconds=None, on_chunk=None, cancel_event=None):
+        """
+        Record audio from the selected microphone into memory
+
+        Args:
+            seconds (float, optional): Fixed recording length, defaults to RECORD_SECONDS
+            use_vad (bool): Stop automatically once the speaker stops talking and
+                trim leading/trailing silence instead of recording a fixed window
+            max_seconds (float, optional): Safety cap for VAD recordings,
+                defaults to VAD_MAX_SECONDS
+            on_chunk (callable, optional): Called with each captured chunk as it arrives
+            cancel_event (threading.Event, optional): Stops recording early once set,
+                e.g. Job.cancel_event; the audio captured so far is returned
 
-    def record_audio(self, seconds=None):
-        """Record audio from the selected microphone and save to a temporary WAV file"""
+        Returns:
+            AudioBuffer: The recording, not yet written to disk
+        """
         if seconds is None:
             seconds = RECORD_SECONDS
+        if max_seconds is None:
+            max_seconds = VAD_MAX_SECONDS
 
         # Get device info for the selected or default device
         device_info = self.get_current_device_info()
         logger.info(f"Recording using device: {device_info['name']}")
 
-        # Open stream with the selected device
-        stream = self.p.open(
-            format=self.p.get_format_from_width(2),  # 16-bit format
-            channels=CHANNELS,
-            rate=SAMPLE_RATE,
-            input=True,
-            input_device_index=self.selected_device_index,  # Use selected device
-            frames_per_buffer=CHUNK_SIZE
-        )
+        from capture import CaptureEngine  # Import here, it loads PyAudio
 
-        logger.info(f"Recording audio for {seconds} seconds...")
+        sample_width = 2  # 16-bit samples (paInt16)
+        num_chunks = int(SAMPLE_RATE / CHUNK_SIZE *
+                         (max_seconds if use_vad else seconds))
+        chunk_bytes = CHUNK_SIZE * CHANNELS * sample_width
+        recording = AudioBuffer(SAMPLE_RATE, CHANNELS, sample_width,
+                                capacity=num_chunks * chunk_bytes)
 
-        frames = []
-        for i in range(0, int(SAMPLE_RATE / CHUNK_SIZE * seconds)):
-            data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-            frames.append(data)
+        # Capture runs in the PortAudio callback; we consume chunk views from its ring buffer
+        with self.devices.in_use() as pa, CaptureEngine(pa, self.selected_device_index) as engine, \
+                timed_stage("capture"):
+            chunks = engine.chunks(num_chunks)
+            if use_vad:
+                self._record_until_silence(chunks, recording, on_chunk, cancel_event)
+            else:
+                logger.info(f"Recording audio for {seconds} seconds...")
+
+                for data in chunks:
+                    if cancel_event is not None and cancel_event.is_set():
+                        logger.info("Recording cancelled")
+                        break
+                    recording.append(data)
+                    if on_chunk is not None:
+                        on_chunk(data)
 
         logger.info("Recording finished.")
+        self.last_capture_overruns = engine.overruns
+
+        return recording.finalize()
+
+    def _record_until_silence(self, chunks, recording, on_chunk=None, cancel_event=None):
+        """
+        Consume chunks until speech has been followed by the VAD hangover
+        period of silence, or until the chunks run out, then trim leading and
+        trailing silence from the recording in place
 
-        stream.stop_stream()
-        stream.close()
+        Args:
+            chunks: Iterator of captured chunks (bounded by the maximum duration)
+            recording (AudioBuffer): Buffer to append the captured audio to
+            on_chunk (callable, optional): Called with each captured chunk as it arrives
+            cancel_event (threading.Event, optional): Stops recording early once set
+        """
+        vad = VoiceActivityDetector()
+        logger.info("Recording audio until silence...")
+
+        speech_flags = []
+        silent_run = 0
+        heard_speech = False
+        for data in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Recording cancelled")
+                break
+            recording.append(data)
+            if on_chunk is not None:
+                on_chunk(data)
+            speech = vad.is_speech(data)
+            speech_flags.append(speech)
 
-        # Save to temporary file
-        temp_filename = generate_unique_filename(TEMP_AUDIO_DIR, FORMAT)
+            if speech:
+                heard_speech = True
+                silent_run = 0
+            else:
+                silent_run += 1
+                if heard_speech and silent_run >= vad.hangover_frames:
+                    break
+        else:
+            logger.info("Reached maximum recording duration")
 
-        with wave.open(temp_filename, 'wb') as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(self.p.get_sample_size(
-                self.p.get_format_from_width(2)))
-            wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(b''.join(frames))
+        keep = vad.trim(speech_flags)
+        if keep is None:
+            logger.warning("No speech detected, keeping the full recording")
+            return
 
-        logger.info(f"Saved recording to: {temp_filename}")
-        return temp_filename
+        start, end = keep
+        chunk_bytes = CHUNK_SIZE * recording.frame_bytes
+        recording.trim(start * chunk_bytes, end * chunk_bytes)
+        logger.info(
+            f"Trimmed recording from {len(speech_flags)} to {end - start} chunks")
 
-    def transcribe_audio(self, audio_file):
+    def capture_and_transcribe(self, seconds=None, use_vad=False, max_seconds=None, cancel_event=None,
+                               use_fish=True, race=RACE_TRANSCRIPTION, race_result=None):
+        """
+        Record audio while transcribing finished utterances in the background,
+        so the transcript is nearly complete when recording stops
+
+        Args:
+            seconds (float, optional): Fixed recording length, defaults to RECORD_SECONDS
+            use_vad (bool): Stop automatically once the speaker stops talking
+            max_seconds (float, optional): Safety cap for VAD recordings
+            cancel_event (threading.Event, optional): Stops recording early once set;
+                nothing more is transcribed then
+            use_fish (bool): Transcribe with Fish Audio; False records first and uses Google
+            race (bool): Race Google against Fish Audio if the full recording has to be transcribed
+            race_result (dict, optional): Receives the outcome of that race (see transcribe_audio_race)
+
+        Returns:
+            tuple: (AudioBuffer recording, transcribed text)
+        """
+        if not use_fish:
+            recording = self.capture_audio(seconds, use_vad, max_seconds, cancel_event=cancel_event)
+            if cancel_event is not None and cancel_event.is_set():
+                return recording, ""
+            return recording, self.transcribe_audio(recording, use_fish=False)
+
+        transcriber = StreamingTranscriber(self.fish_recognizer).start()
+        try:
+            recording = self.capture_audio(
+                seconds, use_vad, max_seconds, on_chunk=transcriber.feed, cancel_event=cancel_event)
+        finally:
+            transcriber.close()
+        if cancel_event is not None and cancel_event.is_set():
+            # Utterances already submitted finish in the background; nobody waits for them
+            return recording, transcriber.transcript
+
+        try:
+            transcribed_text = transcriber.result()
+        except Exception as e:
+            logger.error(f"Error with streaming transcription: {str(e)}")
+            transcribed_text = ""
+
+        if transcribed_text and transcriber.complete:
+            logger.info("Streaming transcription successful")
+            return recording, transcribed_text
+
+        # Nothing usable from the live pipeline, or a gap where an utterance failed:
+        # transcribe the whole recording rather than lose part of what was said
+        if transcribed_text:
+            logger.warning(f"{transcriber.failed_segments} utterances could not be transcribed "
+                           f"while recording, transcribing full recording")
+        else:
+            logger.warning(
+                "Streaming transcription returned empty result, transcribing full recording")
+        return recording, self.transcribe_audio(recording, race=race, race_result=race_result)
+
+    def transcribe_audio(self, audio_file, use_fish=True, race=RACE_TRANSCRIPTION, race_result=None):
         """
         Transcribe the recorded audio using either Fish Audio or Google Speech Recognition
 
         Args:
-            audio_file (str): Path to the audio file
+            audio_file (str or AudioBuffer): Path to the audio file or an in-memory recording
+            use_fish (bool): Use Fish Audio (falling back to Google), False for Google only
+            race (bool): Hedge Fish Audio with Google, see transcribe_audio_race
+            race_result (dict, optional): Receives the outcome of the race, if there is one
 
         Returns:
             str: Transcribed text
         """
-        if self.use_fish_audio:
+        if use_fish and race:
+            return self.transcribe_audio_race(audio_file, race_result=race_result)
+
+        if use_fish:
             logger.info("Transcribing audio using Fish Audio API...")
             try:
                 # Use Fish Audio for transcription
@@ -134,39 +305,141 @@ class AudioProcessor:
                     f"Error with Fish Audio transcription: {str(e)}, falling back to Google")
 
         # Fallback to Google Speech Recognition
+        import speech_recognition as sr  # Import here, only needed for Google
         logger.info("Transcribing audio using Google Speech Recognition...")
-        with sr.AudioFile(audio_file) as source:
-            audio_data = self.recognizer.record(source)
+        try:
+            text = self._recognize_google(audio_file)
+            logger.info("Google transcription successful")
+            return text
+        except sr.UnknownValueError:
+            logger.error(
+                "Google Speech Recognition could not understand audio")
+            return "Speech Recognition could not understand audio"
+        except sr.RequestError as e:
+            logger.error(
+                f"Could not request results from Google Speech Recognition service; {e}")
+            return f"Could not request results from Speech Recognition service; {e}"
+
+    def _recognize_google(self, audio_file):
+        """Transcribe with Google Speech Recognition, raising sr errors on failure"""
+        import speech_recognition as sr  # Import here, only needed for Google
+        if isinstance(audio_file, AudioBuffer):
+            # Hand the PCM view straight to the recognizer, no file needed
+            audio_data = sr.AudioData(
+                audio_file.pcm, audio_file.sample_rate, audio_file.sample_width)
+        else:
+            with sr.AudioFile(audio_file) as source:
+                audio_data = self.recognizer.record(source)
+        return self.recognizer.recognize_google(audio_data)
+
+    def transcribe_audio_race(self, audio_file, hedge_delay=None, race_result=None):
+        """
+        Transcribe with Fish Audio and hedge with Google Speech Recognition,
+        returning whichever produces an acceptable result first
+
+        Args:
+            audio_file (str or AudioBuffer): Path to the audio file or an in-memory recording
+            hedge_delay (float, optional): Seconds to wait before starting Google
+                (0 starts both at once), defaults to TRANSCRIPTION_HEDGE_DELAY
+            race_result (dict, optional): Receives the mode, winner (None if both
+                failed) and the latency of each service. It belongs to the caller,
+                so concurrent races don't mix up their results
+
+        Returns:
+            str: Transcribed text
+        """
+        if hedge_delay is None:
+            hedge_delay = TRANSCRIPTION_HEDGE_DELAY
+        return run_async(self._race_transcription(audio_file, hedge_delay, race_result))
+
+    async def _race_transcription(self, audio_file, hedge_delay, race_result=None):
+        """Run the hedged race on the shared event loop"""
+        loop = asyncio.get_running_loop()
+        primary_failed = asyncio.Event()
+        latencies = {}
+
+        async def fish():
+            start_time = time.time()
+            text = None
             try:
-                text = self.recognizer.recognize_google(audio_data)
-                logger.info("Google transcription successful")
-                return text
-            except sr.UnknownValueError:
-                logger.error(
-                    "Google Speech Recognition could not understand audio")
-                return "Speech Recognition could not understand audio"
-            except sr.RequestError as e:
-                logger.error(
-                    f"Could not request results from Google Speech Recognition service; {e}")
-                return f"Could not request results from Speech Recognition service; {e}"
+                text = await self.fish_recognizer.transcribe_audio_async(audio_file)
+            finally:
+                latencies["Fish Audio"] = time.time() - start_time
+                if not text:
+                    primary_failed.set()
+            if not text:
+                raise ValueError("Fish Audio returned an empty result")
+            return "Fish Audio", text
+
+        async def google():
+            # Start the backup early if the primary fails before the hedge delay
+            try:
+                await asyncio.wait_for(primary_failed.wait(), hedge_delay)
+            except asyncio.TimeoutError:
+                pass
+            logger.info("Starting hedged Google Speech Recognition request")
+            start_time = time.time()
+            try:
+                text = await loop.run_in_executor(None, self._recognize_google, audio_file)
+            finally:
+                latencies["Google"] = time.time() - start_time
+            return "Google", text
+
+        logger.info(
+            f"Racing Fish Audio against Google (hedge delay {hedge_delay}s)...")
+        pending = {asyncio.create_task(fish()), asyncio.create_task(google())}
+        winner, result, last_error = None, None, None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        winner, result = task.result()
+                        break
+                    except Exception as e:
+                        last_error = e
+                        logger.warning(f"Race transcription attempt failed: {str(e)}")
+        finally:
+            # Cancel the loser (a Google request already running in a thread is abandoned)
+            for task in pending:
+                task.cancel()
 
-    def toggle_transcription_service(self):
-        """Toggle between Fish Audio and Google Speech Recognition"""
-        self.use_fish_audio = not self.use_fish_audio
-        service = "Fish Audio" if self.use_fish_audio else "Google Speech Recognition"
-        logger.info(f"Switched transcription service to: {service}")
-        return service
+        if race_result is not None:
+            race_result.update({
+                "mode": "race",
+                "winner": winner,
+                "latencies": {name: latencies.get(name) for name in ("Fish Audio", "Google")}
+            })
 
-    def get_current_transcription_service(self):
-        """Get the name of the current transcription service"""
-        return "Fish Audio" if self.use_fish_audio else "Google Speech Recognition"
+        if winner is None:
+            import speech_recognition as sr  # Import here, only needed for Google
+            logger.error(f"All race transcription attempts failed: {str(last_error)}")
+            if isinstance(last_error, sr.RequestError):
+                return f"Could not request results from Speech Recognition service; {last_error}"
+            return "Speech Recognition could not understand audio"
+
+        logger.info(
+            f"{winner} won the transcription race in {latencies[winner]:.2f} seconds")
+        return result
+
+    def get_current_transcription_service(self, use_fish=True, race=RACE_TRANSCRIPTION):
+        """
+        Get the name of the transcription service used with the given settings
+
+        Args:
+            use_fish (bool): The caller's choice of Fish Audio over Google, see transcribe_audio
+            race (bool): The caller's choice of racing Google against Fish Audio
+        """
+        if use_fish and race:
+            return "Fish Audio racing Google Speech Recognition"
+        return "Fish Audio" if use_fish else "Google Speech Recognition"
 
     def play_audio(self, audio_file):
         """Play audio file using PyAudio"""
-        with wave.open(audio_file, 'rb') as wf:
+        with self.devices.in_use() as pa, wave.open(audio_file, 'rb') as wf:
             # Open stream
-            stream = self.p.open(
-                format=self.p.get_format_from_width(wf.getsampwidth()),
+            stream = pa.open(
+                format=pa.get_format_from_width(wf.getsampwidth()),
                 channels=wf.getnchannels(),
                 rate=wf.getframerate(),
                 output=True
@@ -186,9 +459,19 @@ class AudioProcessor:
             stream.close()
 
     def save_audio_from_bytes(self, audio_bytes, output_file=None):
-        """Save audio bytes to a file"""
+        """
+        Save audio bytes
+
+        Args:
+            audio_bytes (bytes): Contents of the audio file
+            output_file (str, optional): Write a plain file here instead of
+                adding the audio to the recordings store
+
+        Returns:
+            str: The file path, or the reference of the clip in the recordings store
+        """
         if output_file is None:
-            output_file = generate_unique_filename(TEMP_AUDIO_DIR, FORMAT)
+            return get_audio_store("recordings").put(audio_bytes, FORMAT)
 
         with open(output_file, 'wb') as f:
             f.write(audio_bytes)
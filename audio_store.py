@@ -0,0 +1,589 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import atexit
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from urllib.parse import quote, unquote
+
+from config import (AUDIO_STORE_BACKEND, AUDIO_STORE_DIRS, PACK_SEGMENT_MAX_BYTES, PACK_COMPACT_GARBAGE_RATIO,
+                    PACK_INDEX_SYNC_EVERY, PACK_FSYNC)
+from utils import generate_unique_filename, ensure_directory_exists
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the pack is then not guarded against a second process
+    fcntl = None
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("audio_store")
+
+# References to clips in a pack look like store://<store name>/<key>
+STORE_SCHEME = "store://"
+
+# Segment record: magic, flags, key length, data length, CRC32 of key and data, creation time
+RECORD_HEADER = struct.Struct("<4sBHIId")
+RECORD_MAGIC = b"APK1"
+FLAG_DELETE = 1
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "lock"
+SEGMENT_PATTERN = "segment-{:06d}.pack"
+
+
+def is_store_ref(ref):
+    """Whether a reference points into a pack rather than at a plain file"""
+    return isinstance(ref, str) and ref.startswith(STORE_SCHEME)
+
+
+class AudioStore(ABC):
+    """
+    Common interface of the places generated audio is kept.
+
+    Clips are addressed by references: strings the UI, API server and janitor
+    pass around and resolve with read_audio() and friends. put() returns a
+    reference; read() returns the clip's bytes. A backend missing one of the
+    abstract methods can't be instantiated.
+    """
+
+    backend = None
+
+    def __init__(self, name, directory):
+        self.name = name
+        self.directory = directory
+
+    @abstractmethod
+    def put(self, data, extension, name=None):
+        """
+        Store bytes as a clip and return its reference
+
+        Args:
+            data (bytes-like): The audio
+            extension (str): File extension of the format, e.g. "mp3"
+            name (str, optional): Name of the clip without extension, e.g. a
+                cache key; a new unique one by default. A clip stored under an
+                existing name replaces it
+        """
+
+    @abstractmethod
+    def read(self, ref):
+        """Get a clip's bytes (bytes or a read-only memoryview)"""
+
+    @abstractmethod
+    def info(self, ref):
+        """Get (size, created_at) of a clip, or None if it does not exist"""
+
+    @abstractmethod
+    def delete(self, ref):
+        """Delete a clip; returns whether it existed"""
+
+    @abstractmethod
+    def entries(self):
+        """List (reference, created_at, size) of every clip"""
+
+    def local_path(self, ref):
+        """Path of the clip as a plain file, or None if it only exists inside the store"""
+        return None
+
+    def compact(self):
+        """Reclaim space from deleted clips; returns the number of bytes freed"""
+        return 0
+
+    def stats(self):
+        entries = self.entries()
+        return {"name": self.name, "backend": self.backend, "directory": self.directory,
+                "entries": len(entries), "bytes": sum(size for _, _, size in entries)}
+
+
+class DirectoryStore(AudioStore):
+    """One plain file per clip; references are the file paths"""
+
+    backend = "directory"
+
+    def __init__(self, name, directory):
+        super().__init__(name, directory)
+        ensure_directory_exists(directory)
+
+    def put(self, data, extension, name=None):
+        if name is None:
+            path = generate_unique_filename(self.directory, extension)
+            with open(path, "wb") as f:
+                f.write(data)
+            return path
+
+        # Named clips may be read while they are replaced, so publish them atomically
+        path = os.path.join(self.directory, f"{name}.{extension}")
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return path
+
+    def read(self, ref):
+        with open(ref, "rb") as f:
+            return f.read()
+
+    def info(self, ref):
+        try:
+            stat = os.stat(ref)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def delete(self, ref):
+        try:
+            os.remove(ref)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def entries(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                # Dot files are clips still being written
+                if entry.is_file(follow_symlinks=False) and not entry.name.startswith("."):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def local_path(self, ref):
+        return ref
+
+
+class PackStore(AudioStore):
+    """
+    Clips appended to segment files instead of one file each.
+
+    Every put or delete appends a self-describing record (header with a
+    CRC32, key, data) to the active segment, which is rotated once it reaches
+    segment_max_bytes. An in-memory index maps keys to (segment, offset,
+    length); a snapshot of it is written atomically every few changes
+    together with the segment sizes it covers. On open the snapshot is loaded
+    and the segments are scanned past the covered offsets, so records written
+    after the last snapshot are recovered and a torn record at the end of a
+    segment (a crash mid-write) is truncated away.
+
+    Reads return zero-copy memoryviews into a read-only mmap of the segment.
+    compact() copies the live clips out of mostly-dead sealed segments and
+    retires those segments.
+    """
+
+    backend = "pack"
+
+    def __init__(self, name, directory, segment_max_bytes=PACK_SEGMENT_MAX_BYTES,
+                 garbage_ratio=PACK_COMPACT_GARBAGE_RATIO, sync_every=PACK_INDEX_SYNC_EVERY, fsync=PACK_FSYNC):
+        """
+        Args:
+            name (str): Store name, part of every reference
+            directory (str): Directory the clips belong to; the pack lives in its "pack" subdirectory
+            segment_max_bytes (int): Size at which the active segment is sealed
+            garbage_ratio (float): Dead share above which compact() rewrites a sealed segment
+            sync_every (int): Changes between index snapshots
+            fsync (bool): fsync every append instead of leaving it to the OS
+
+        Raises:
+            BlockingIOError: Another process has the pack open
+        """
+        super().__init__(name, directory)
+        self.pack_dir = os.path.join(directory, "pack")
+        self.segment_max_bytes = segment_max_bytes
+        self.garbage_ratio = garbage_ratio
+        self.sync_every = sync_every
+        self.fsync = fsync
+        self._index = {}  # key -> (segment, data offset, length, created_at)
+        self._segments = {}  # segment -> size in bytes
+        self._dead = {}  # segment -> bytes of deleted or replaced records
+        self._retired = set()  # Compacted segments whose files may still need removing
+        self._maps = {}  # segment -> mmap
+        self._active = None
+        self._active_file = None
+        self._unsynced = 0
+        self._lock = threading.RLock()
+
+        ensure_directory_exists(self.pack_dir)
+        self._lock_file = open(os.path.join(self.pack_dir, LOCK_FILE), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise BlockingIOError(f"{self.pack_dir} is in use by another process")
+
+        started_at = time.perf_counter()
+        recovered = self._recover()
+        self._open_active()
+        logger.info(f"[{self.name}] Opened pack with {len(self._index)} clips in {len(self._segments)} segments "
+                    f"({recovered} records recovered past the index) in {time.perf_counter() - started_at:.3f}s")
+
+    # Recovery
+
+    def _segment_path(self, segment):
+        return os.path.join(self.pack_dir, SEGMENT_PATTERN.format(segment))
+
+    def _load_snapshot(self):
+        """Load the index snapshot; returns the segment sizes it covers"""
+        try:
+            with open(os.path.join(self.pack_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self._index = {key: tuple(entry) for key, entry in snapshot["entries"].items()}
+            self._dead = {int(segment): dead for segment, dead in snapshot["dead"].items()}
+            self._retired = set(snapshot.get("retired", []))
+            return {int(segment): size for segment, size in snapshot["segments"].items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"[{self.name}] Rebuilding the pack index, the snapshot is unreadable: {str(e)}")
+            self._index, self._dead, self._retired = {}, {}, set()
+            return {}
+
+    def _recover(self):
+        """Rebuild the index from the snapshot and the segments; returns the number of records replayed"""
+        covered = self._load_snapshot()
+
+        # A crash between writing a snapshot and removing compacted segments leaves them behind
+        for segment in self._retired:
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+        self._retired = set()
+
+        on_disk = sorted(int(name[8:14]) for name in os.listdir(self.pack_dir)
+                         if name.startswith("segment-") and name.endswith(".pack"))
+        # Clips in segments that are gone (e.g. removed by hand) cannot be read any more
+        self._index = {key: entry for key, entry in self._index.items() if entry[0] in on_disk}
+
+        replayed = 0
+        for segment in on_disk:
+            start = covered.get(segment, 0)
+            replayed += self._replay(segment, start)
+            self._segments[segment] = os.path.getsize(self._segment_path(segment))
+        if replayed or covered != self._segments:
+            self._write_snapshot()
+        return replayed
+
+    def _replay(self, segment, offset):
+        """Apply the records of a segment from offset on, truncating a torn tail"""
+        path = self._segment_path(segment)
+        replayed = 0
+        with open(path, "r+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset > size:
+                # The snapshot is newer than the data that reached the disk
+                logger.warning(f"[{self.name}] Segment {segment} is shorter than indexed, rescanning it")
+                self._index = {key: entry for key, entry in self._index.items() if entry[0] != segment}
+                self._dead.pop(segment, None)
+                offset = 0
+            f.seek(offset)
+            while offset < size:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                magic, flags, key_length, data_length, checksum, created_at = RECORD_HEADER.unpack(header)
+                body = f.read(key_length + data_length)
+                if magic != RECORD_MAGIC or len(body) < key_length + data_length or \
+                        zlib.crc32(body) != checksum:
+                    break
+                key = body[:key_length].decode("utf-8")
+                record_size = RECORD_HEADER.size + key_length + data_length
+                self._forget(key)
+                if flags & FLAG_DELETE:
+                    self._dead[segment] = self._dead.get(segment, 0) + record_size
+                else:
+                    self._index[key] = (segment, offset + RECORD_HEADER.size + key_length, data_length, created_at)
+                offset += record_size
+                replayed += 1
+
+            if offset < size:
+                logger.warning(f"[{self.name}] Truncating {size - offset} bytes of a torn record "
+                               f"at the end of segment {segment}")
+                f.truncate(offset)
+        return replayed
+
+    def _forget(self, key):
+        """Drop a key from the index, counting its record as dead"""
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            segment, _, length, _ = entry
+            self._dead[segment] = self._dead.get(segment, 0) + RECORD_HEADER.size + \
+                len(key.encode("utf-8")) + length
+        return entry
+
+    def _write_snapshot(self):
+        """Atomically replace the index snapshot"""
+        snapshot = {
+            "segments": {str(segment): size for segment, size in self._segments.items()},
+            "entries": self._index,
+            "dead": {str(segment): dead for segment, dead in self._dead.items() if segment in self._segments},
+            "retired": sorted(self._retired)
+        }
+        path = os.path.join(self.pack_dir, INDEX_FILE)
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        self._unsynced = 0
+
+    # Writing
+
+    def _open_active(self):
+        segment = max(self._segments, default=0)
+        if segment == 0 or self._segments[segment] >= self.segment_max_bytes:
+            segment += 1
+            self._segments[segment] = 0
+        self._active = segment
+        self._active_file = open(self._segment_path(segment), "ab")
+
+    def _rotate(self):
+        self._active_file.close()
+        self._active += 1
+        self._segments[self._active] = 0
+        self._active_file = open(self._segment_path(self._active), "ab")
+        logger.info(f"[{self.name}] Started segment {self._active}")
+
+    def _append(self, key, data, flags=0, created_at=None):
+        """Append a record to the active segment and update the index"""
+        encoded_key = key.encode("utf-8")
+        data = memoryview(data).cast("B")
+        record_size = RECORD_HEADER.size + len(encoded_key) + len(data)
+        if created_at is None:
+            created_at = time.time()
+        checksum = zlib.crc32(data, zlib.crc32(encoded_key))
+
+        if self._segments[self._active] and self._segments[self._active] + record_size > self.segment_max_bytes:
+            self._rotate()
+        offset = self._segments[self._active]
+        self._active_file.write(RECORD_HEADER.pack(RECORD_MAGIC, flags, len(encoded_key), len(data),
+                                                   checksum, created_at) + encoded_key)
+        self._active_file.write(data)
+        self._active_file.flush()
+        if self.fsync:
+            os.fsync(self._active_file.fileno())
+        self._segments[self._active] = offset + record_size
+
+        self._forget(key)
+        if flags & FLAG_DELETE:
+            self._dead[self._active] = self._dead.get(self._active, 0) + record_size
+        else:
+            self._index[key] = (self._active, offset + RECORD_HEADER.size + len(encoded_key), len(data), created_at)
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self._write_snapshot()
+
+    def _ref(self, key):
+        return f"{STORE_SCHEME}{self.name}/{quote(key)}"
+
+    def _key(self, ref):
+        prefix = f"{STORE_SCHEME}{self.name}/"
+        if not ref.startswith(prefix):
+            raise KeyError(ref)
+        return unquote(ref[len(prefix):])
+
+    def put(self, data, extension, name=None):
+        key = f"{name}.{extension}" if name is not None else \
+            os.path.basename(generate_unique_filename("", extension))
+        with self._lock:
+            self._append(key, data)
+        return self._ref(key)
+
+    def delete(self, ref):
+        key = self._key(ref)
+        with self._lock:
+            if key not in self._index:
+                return False
+            self._append(key, b"", flags=FLAG_DELETE)
+        return True
+
+    # Reading
+
+    def _map(self, segment, end):
+        """Get an mmap of a segment covering at least `end` bytes"""
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            if segment == self._active:
+                self._active_file.flush()
+            with open(self._segment_path(segment), "rb") as f:
+                # Views handed out earlier keep the old map alive until they are released
+                mapped = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def read(self, ref):
+        key = self._key(ref)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                raise FileNotFoundError(ref)
+            segment, offset, length, _ = entry
+            if length == 0:
+                return memoryview(b"")
+            return memoryview(self._map(segment, offset + length))[offset:offset + length]
+
+    def info(self, ref):
+        try:
+            key = self._key(ref)
+        except KeyError:
+            return None
+        with self._lock:
+            entry = self._index.get(key)
+        return (entry[2], entry[3]) if entry is not None else None
+
+    def entries(self):
+        with self._lock:
+            return [(self._ref(key), created_at, length)
+                    for key, (_, _, length, created_at) in self._index.items()]
+
+    # Maintenance
+
+    def compact(self):
+        """
+        Rewrite sealed segments that are mostly dead
+
+        The live clips are appended to the active segment, then a snapshot
+        marks the old segments as retired before their files are removed, so a
+        crash at any point leaves every clip readable.
+        """
+        freed = 0
+        with self._lock:
+            candidates = [segment for segment, size in self._segments.items()
+                          if segment != self._active and size and self._dead.get(segment, 0) / size >= self.garbage_ratio]
+            if not candidates:
+                return 0
+
+            for segment in candidates:
+                live = [(key, entry) for key, entry in self._index.items() if entry[0] == segment]
+                mapped = self._map(segment, self._segments[segment]) if live else None
+                for key, (_, offset, length, created_at) in live:
+                    self._append(key, mapped[offset:offset + length], created_at=created_at)
+                    freed -= RECORD_HEADER.size + len(key.encode("utf-8")) + length
+                freed += self._segments.pop(segment)
+                self._dead.pop(segment, None)
+                self._maps.pop(segment, None)
+                self._retired.add(segment)
+
+            self._write_snapshot()
+            for segment in candidates:
+                os.remove(self._segment_path(segment))
+            self._retired.clear()
+            self._write_snapshot()
+
+        logger.info(f"[{self.name}] Compacted {len(candidates)} segments, freeing {freed / 1024 / 1024:.1f} MB")
+        return freed
+
+    def stats(self):
+        with self._lock:
+            live = sum(length for _, _, length, _ in self._index.values())
+            return {
+                "name": self.name,
+                "backend": self.backend,
+                "directory": self.directory,
+                "entries": len(self._index),
+                "bytes": live,
+                "segments": len(self._segments),
+                "segment_bytes": sum(self._segments.values()),
+                "dead_bytes": sum(self._dead.get(segment, 0) for segment in self._segments)
+            }
+
+    def close(self):
+        """Write a final index snapshot and release the pack"""
+        with self._lock:
+            if self._active_file is None:
+                return
+            if self._unsynced:
+                self._write_snapshot()
+            self._active_file.close()
+            self._active_file = None
+            self._lock_file.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_audio_store(name):
+    """
+    Get the process-wide store for a kind of audio, creating it on first use
+
+    Args:
+        name (str): "outputs" (synthesized speech), "tts_cache" or "recordings"
+
+    Returns:
+        AudioStore: A PackStore, or a DirectoryStore when AUDIO_STORE_BACKEND
+            is "directory" or another process holds the pack
+    """
+    with _stores_lock:
+        if name not in _stores:
+            directory = AUDIO_STORE_DIRS[name]
+            store = None
+            if AUDIO_STORE_BACKEND == "pack":
+                try:
+                    store = PackStore(name, directory)
+                    atexit.register(store.close)
+                except BlockingIOError as e:
+                    logger.warning(f"Using plain files for {name}: {str(e)}")
+            _stores[name] = store or DirectoryStore(name, directory)
+        return _stores[name]
+
+
+def open_stores():
+    """Get the stores created so far in this process"""
+    with _stores_lock:
+        return list(_stores.values())
+
+
+def _store_for(ref):
+    """Find the store a pack reference belongs to, or None for a plain file"""
+    if not is_store_ref(ref):
+        return None
+    name = ref[len(STORE_SCHEME):].split("/", 1)[0]
+    if name not in AUDIO_STORE_DIRS:
+        raise FileNotFoundError(ref)
+    return get_audio_store(name)
+
+
+def read_audio(ref):
+    """Get the bytes of a clip given by reference or plain file path"""
+    store = _store_for(ref)
+    if store is None:
+        with open(ref, "rb") as f:
+            return f.read()
+    return store.read(ref)
+
+
+def audio_info(ref):
+    """Get (size, created_at) of a clip given by reference or plain file path, or None if it is gone"""
+    store = _store_for(ref)
+    if store is None:
+        try:
+            stat = os.stat(ref)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+    return store.info(ref)
+
+
+def delete_audio(ref):
+    """Delete a clip given by reference or plain file path; returns whether it existed"""
+    store = _store_for(ref)
+    if store is None:
+        try:
+            os.remove(ref)
+            return True
+        except FileNotFoundError:
+            return False
+    return store.delete(ref)
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import statistics
+
+import numpy as np
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("benchmarks")
+
+# Lengths of the synthetic recordings and clips in seconds (VAD_MAX_SECONDS is 15)
+DURATIONS = [1, 5, 15, 60]
+
+MP3_BYTES_PER_SECOND = 192000 // 8  # Fish Audio streams 192 kbps MP3
+TTS_CHUNK_BYTES = 8192
+
+# Differences below these are noise, whatever the relative margin says
+TIME_SLACK = 0.0005
+MEMORY_SLACK = 64 * 1024
+
+
+def synthetic_mp3(seconds, seed=0):
+    """Random bytes the size of an MP3 clip of the given length"""
+    return np.random.default_rng(seed).integers(
+        0, 256, int(seconds * MP3_BYTES_PER_SECOND), dtype=np.uint8).tobytes()
+
+
+def bench_record_audio(seconds, workdir):
+    """Join captured chunks into an AudioBuffer and write the WAV (record_audio)"""
+    from audio_buffer import AudioBuffer
+    from config import SAMPLE_RATE, CHANNELS, CHUNK_SIZE
+    from load_test import synthetic_recording
+
+    pcm = bytes(synthetic_recording(seconds, seed=0).pcm)
+    chunk_bytes = CHUNK_SIZE * CHANNELS * 2
+    chunks = [pcm[offset:offset + chunk_bytes] for offset in range(0, len(pcm), chunk_bytes)]
+    path = os.path.join(workdir, "record.wav")
+
+    def run():
+        recording = AudioBuffer(SAMPLE_RATE, CHANNELS, 2, capacity=len(chunks) * chunk_bytes)
+        for chunk in chunks:
+            recording.append(chunk)
+        recording.finalize().save(path)
+
+    return run
+
+
+def bench_asr_packb(seconds, workdir):
+    """Serialize the ASR request with the uncompressed upload (SpeechRecognizer._request_asr)"""
+    import ormsgpack
+    from load_test import synthetic_recording
+    from speech_recognizer import ASRRequest, prepare_asr_upload
+
+    audio_payload, _ = prepare_asr_upload(synthetic_recording(seconds, seed=0), codec="wav")
+
+    def run():
+        request = ASRRequest.model_construct(audio=audio_payload, language=None, ignore_timestamps=True)
+        ormsgpack.packb(request.model_dump(exclude={'audio'}) | {'audio': audio_payload})
+
+    return run
+
+
+def bench_autoplay_base64(seconds, workdir):
+    """Read an output clip and inline it as a data URI (autoplay_audio without the media server)"""
+    from utils import audio_data_uri
+
+    path = os.path.join(workdir, "clip.mp3")
+    with open(path, "wb") as f:
+        f.write(synthetic_mp3(seconds))
+
+    def run():
+        with open(path, "rb") as f:
+            audio_data_uri(f.read(), "audio/mpeg")
+
+    return run
+
+
+def bench_tts_chunk_writes(seconds, workdir):
+    """Collect streamed TTS chunks in memory and feed a live stream (VoiceSynthesizer._stream_audio)"""
+    from media_server import LiveAudioStream
+
+    audio = synthetic_mp3(seconds)
+    chunks = [audio[offset:offset + TTS_CHUNK_BYTES] for offset in range(0, len(audio), TTS_CHUNK_BYTES)]
+
+    def run():
+        live_stream = LiveAudioStream()
+        received = bytearray()
+        for chunk in chunks:
+            received += chunk
+            live_stream.write(chunk)
+        live_stream.finish()
+
+    return run
+
+
+def bench_get_wav_duration(seconds, workdir):
+    """Read the duration from a WAV header (utils.get_wav_duration)"""
+    from load_test import synthetic_recording
+    from utils import get_wav_duration
+
+    path = synthetic_recording(seconds, seed=0).save(os.path.join(workdir, "duration.wav"))
+
+    def run():
+        get_wav_duration(path)
+
+    return run
+
+
+# name -> factory(seconds, workdir) returning the function to measure
+BENCHMARKS = {
+    "record_audio": bench_record_audio,
+    "asr_packb": bench_asr_packb,
+    "autoplay_base64": bench_autoplay_base64,
+    "tts_chunk_writes": bench_tts_chunk_writes,
+    "get_wav_duration": bench_get_wav_duration
+}
+
+
+def measure(run, repeat):
+    """
+    Time a function and measure its peak Python memory
+
+    Args:
+        run (callable): The code to measure
+        repeat (int): Number of timed runs
+
+    Returns:
+        dict: Median, minimum and mean time in seconds and peak allocated bytes
+    """
+    run()  # Warm up caches and lazy imports
+
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start_time)
+
+    # Tracing slows allocations down, so memory is measured in a separate run
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"median": statistics.median(times), "min": min(times),
+            "mean": statistics.fmean(times), "peak_bytes": peak - baseline}
+
+
+def run_benchmarks(names, durations, repeat):
+    """Run the selected benchmarks at every duration and return the results"""
+    results = []
+    workdir = tempfile.mkdtemp(prefix="benchmarks_")
+    # Keep the per-call INFO logging of the measured code out of the timings
+    logging.disable(logging.INFO)
+    try:
+        for name in names:
+            for seconds in durations:
+                stats = measure(BENCHMARKS[name](seconds, workdir), repeat)
+                results.append({"benchmark": name, "seconds": seconds, **stats})
+    finally:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """
+    Compare results with a baseline run
+
+    Returns:
+        list: Descriptions of the time or memory regressions beyond max_regression (a fraction)
+    """
+    previous = {(entry["benchmark"], entry["seconds"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        base = previous.get((entry["benchmark"], entry["seconds"]))
+        if base is None:
+            continue
+        label = f"{entry['benchmark']} ({entry['seconds']}s audio)"
+        if entry["median"] > base["median"] * (1 + max_regression) + TIME_SLACK:
+            regressions.append(f"{label}: {base['median'] * 1000:.2f} ms -> {entry['median'] * 1000:.2f} ms")
+        if entry["peak_bytes"] > base["peak_bytes"] * (1 + max_regression) + MEMORY_SLACK:
+            regressions.append(f"{label}: peak {base['peak_bytes'] / 1024:.0f} KB -> "
+                               f"{entry['peak_bytes'] / 1024:.0f} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the local CPU and I/O work between API calls")
+    parser.add_argument("benchmarks", nargs="*",
+                        help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--durations", default=",".join(str(seconds) for seconds in DURATIONS),
+                        help="Comma-separated audio lengths in seconds")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per benchmark and length")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to save the results")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed slowdown or memory growth against the baseline (fraction)")
+    args = parser.parse_args()
+
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    durations = [float(seconds) if "." in seconds else int(seconds) for seconds in args.durations.split(",")]
+    results = run_benchmarks(names, durations, args.repeat)
+
+    print(f"\n{'Benchmark':<18} {'Audio':>6} {'Median':>10} {'Min':>10} {'Peak memory':>12}")
+    for entry in results:
+        print(f"{entry['benchmark']:<18} {entry['seconds']:>5}s {entry['median'] * 1000:>8.2f}ms "
+              f"{entry['min'] * 1000:>8.2f}ms {entry['peak_bytes'] / 1024:>9.0f} KB")
+
+    report = {
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != report["machine"]:
+            logger.warning(f"Baseline was recorded on {baseline.get('machine')}, "
+                           f"this is {report['machine']}; timings may not be comparable")
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
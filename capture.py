@@ -0,0 +1,195 @@
+import math
+import logging
+import threading
+import numpy as np
+import pyaudio
+
+from config import SAMPLE_RATE, CHANNELS, CHUNK_SIZE, CAPTURE_RING_SECONDS, CAPTURE_STALL_TIMEOUT
+from metrics import timed_stage
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("capture")
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer / single-consumer ring of int16 samples.
+
+    Positions are absolute frame counts since the start of the capture, so a
+    reader can tell when the writer has lapped it and data was lost.
+    """
+
+    def __init__(self, capacity, channels=CHANNELS):
+        """
+        Args:
+            capacity (int): Number of sample frames the ring can hold
+            channels (int): Samples per frame
+        """
+        self.capacity = capacity
+        self.channels = channels
+        self.written = 0  # Total frames written since creation
+        self._data = np.zeros(capacity * channels, dtype=np.int16)
+        self._condition = threading.Condition()
+
+    def write(self, samples):
+        """
+        Copy interleaved samples into the ring, overwriting the oldest data
+
+        Args:
+            samples (np.ndarray): 1-D int16 samples, at most `capacity` frames
+        """
+        start = (self.written % self.capacity) * self.channels
+        first = min(samples.size, self._data.size - start)
+        self._data[start:start + first] = samples[:first]
+        if first < samples.size:
+            self._data[:samples.size - first] = samples[first:]
+
+        with self._condition:
+            self.written += samples.size // self.channels
+            self._condition.notify_all()
+
+    def wait_for(self, position, timeout=None):
+        """
+        Block until at least `position` frames have been written
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.written >= position, timeout)
+
+    def is_available(self, position):
+        """Check whether the frame at `position` has not been overwritten yet"""
+        return position >= self.written - self.capacity
+
+    def views(self, start, end):
+        """
+        Zero-copy views of frames [start, end). Returns two views when the
+        range wraps around the end of the ring.
+
+        Args:
+            start (int): First absolute frame position
+            end (int): Absolute frame position to stop at
+
+        Returns:
+            list: One or two int16 arrays backed by the ring
+        """
+        if not self.is_available(start) or end > self.written:
+            raise ValueError(
+                f"Frames {start}-{end} are not in the ring buffer")
+
+        offset = (start % self.capacity) * self.channels
+        stop = offset + (end - start) * self.channels
+        if stop <= self._data.size:
+            return [self._data[offset:stop]]
+        return [self._data[offset:], self._data[:stop - self._data.size]]
+
+
+class CaptureEngine:
+    """
+    Callback-driven PyAudio input stream that writes into a RingBuffer.
+
+    The PortAudio callback only copies the incoming block into the ring, so
+    the capture cost is fixed and nothing blocks the caller's thread while
+    audio arrives. Readers consume CHUNK_SIZE blocks as zero-copy views.
+    """
+
+    def __init__(self, pa, device_index=None, sample_rate=SAMPLE_RATE, channels=CHANNELS,
+                 chunk_size=CHUNK_SIZE, buffer_seconds=CAPTURE_RING_SECONDS):
+        """
+        Args:
+            pa (pyaudio.PyAudio): PyAudio instance
+            device_index (int, optional): Input device, None for the default
+            sample_rate (int): Sample rate in Hz
+            channels (int): Number of channels
+            chunk_size (int): Frames per callback and per chunk view
+            buffer_seconds (float): Ring buffer length in seconds
+        """
+        self.pa = pa
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.chunk_size = chunk_size
+        # A whole number of chunks, so a chunk view never wraps
+        ring_chunks = max(2, math.ceil(buffer_seconds * sample_rate / chunk_size))
+        self.ring = RingBuffer(ring_chunks * chunk_size, channels)
+        self.input_overflows = 0  # Reported by PortAudio
+        self.dropped_chunks = 0  # Overwritten before the reader got to them
+        self.stream = None
+
+    @property
+    def overruns(self):
+        """Total number of overrun events (device and ring buffer)"""
+        return self.input_overflows + self.dropped_chunks
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """PortAudio callback: copy the block into the ring"""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return (None, pyaudio.paContinue)
+
+    def start(self):
+        """Open the input stream and start capturing"""
+        with timed_stage("device_open"):
+            self.stream = self.pa.open(
+                format=pyaudio.paInt16,
+                channels=self.channels,
+                rate=self.sample_rate,
+                input=True,
+                input_device_index=self.device_index,
+                frames_per_buffer=self.chunk_size,
+                stream_callback=self._callback
+            )
+        return self
+
+    def stop(self):
+        """Stop capturing and close the stream"""
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.overruns:
+            logger.warning(
+                f"Capture overruns: {self.input_overflows} device, {self.dropped_chunks} ring buffer")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def chunks(self, max_chunks, timeout=CAPTURE_STALL_TIMEOUT):
+        """
+        Yield captured chunks in order as zero-copy views into the ring.
+
+        A view is only valid until the writer laps it, so consumers that keep
+        a chunk beyond the current iteration must copy it.
+
+        Args:
+            max_chunks (int): Number of chunks to capture
+            timeout (float): Seconds to wait for a chunk before giving up
+
+        Yields:
+            np.ndarray: int16 samples of one chunk
+        """
+        position = 0
+        limit = max_chunks * self.chunk_size
+        while position < limit:
+            end = position + self.chunk_size
+            if not self.ring.wait_for(end, timeout):
+                raise IOError("No audio received from the input device")
+
+            if not self.ring.is_available(position):
+                # The reader fell behind by more than the ring length; skipped
+                # chunks still count towards max_chunks so timing is preserved
+                oldest = self.ring.written - self.ring.capacity
+                skipped = math.ceil((oldest - position) / self.chunk_size)
+                self.dropped_chunks += skipped
+                position += skipped * self.chunk_size
+                continue
+
+            yield self.ring.views(position, end)[0]
+            position = end
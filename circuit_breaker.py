@@ -0,0 +1,188 @@
+import time
+import logging
+import threading
+from collections import deque
+
+from config import (BREAKER_WINDOW_SECONDS, BREAKER_MIN_REQUESTS, BREAKER_ERROR_RATE,
+                    BREAKER_SLOW_CALL_SECONDS, BREAKER_OPEN_SECONDS)
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(
+            f"{name} is unavailable (circuit open, retry in {retry_after:.0f} seconds)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for one API endpoint.
+
+    The circuit opens when, over the last `window_seconds`, at least
+    `min_requests` calls were made and the share of failed or slow calls
+    reaches `error_rate`. After `open_seconds` a single probe call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, window_seconds=BREAKER_WINDOW_SECONDS, min_requests=BREAKER_MIN_REQUESTS,
+                 error_rate=BREAKER_ERROR_RATE, slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+                 open_seconds=BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._calls = deque()  # (timestamp, ok, latency)
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        """Drop calls that fell out of the rolling window (lock must be held)"""
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def retry_after(self):
+        """Seconds until an open circuit lets a probe through"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow_request(self):
+        """
+        Check whether a call may proceed, moving from open to half-open once
+        the cool-down has passed
+
+        Returns:
+            bool: True if the call may be made
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"[{self.name}] Circuit half-open, sending probe")
+
+            if self.state == HALF_OPEN:
+                # A probe that never reported back is given up on after open_seconds
+                if self._probe_in_flight and now - self._probe_started < self.open_seconds:
+                    return False
+                self._probe_in_flight = True
+                self._probe_started = now
+            return True
+
+    def available(self):
+        """
+        Check whether a call could proceed right now without claiming the
+        half-open probe, e.g. before queueing for it
+
+        Returns:
+            bool: False while the circuit is open or its probe is in flight
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                return now - self._opened_at >= self.open_seconds
+            if self.state == HALF_OPEN:
+                return not self._probe_in_flight or now - self._probe_started >= self.open_seconds
+            return True
+
+    def release(self):
+        """Give back a half-open probe that ended without an outcome, e.g. because it was cancelled"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def check(self):
+        """Raise CircuitOpenError if the call may not proceed"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self, latency):
+        """Record a completed call; slow calls count against the endpoint"""
+        self._record(latency <= self.slow_call_seconds, latency)
+
+    def record_failure(self, latency):
+        """Record a failed call"""
+        self._record(False, latency)
+
+    def _record(self, ok, latency):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"[{self.name}] Probe succeeded, circuit closed")
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, ok, latency))
+            self._prune(now)
+            if self.state == CLOSED and len(self._calls) >= self.min_requests:
+                failures = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+                if failures / len(self._calls) >= self.error_rate:
+                    self._open(now)
+
+    def _open(self, now):
+        """Open the circuit (lock must be held)"""
+        self.state = OPEN
+        self._opened_at = now
+        logger.warning(
+            f"[{self.name}] Circuit opened for {self.open_seconds} seconds")
+
+    def snapshot(self):
+        """Get the current state and rolling-window statistics"""
+        retry_after = self.retry_after()
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            latencies = [latency for _, _, latency in self._calls]
+            return {
+                "name": self.name,
+                "state": self.state,
+                "calls": calls,
+                "failure_rate": failures / calls if calls else 0.0,
+                "avg_latency": sum(latencies) / calls if calls else 0.0,
+                "retry_after": retry_after
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Get the process-wide circuit breaker for an endpoint, creating it on first use"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def all_breakers():
+    """Get snapshots of every circuit breaker created so far"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.snapshot() for breaker in breakers]
@@ -0,0 +1,48 @@
+import threading
+
+from startup_profile import timed
+
+# Process-wide component instances, created on first use. They are shared by
+# every session, so per-user settings are passed into their calls, not set on them
+_instances = {}
+_instances_lock = threading.RLock()
+
+
+def _get_instance(name, factory):
+    """Create a component once per process, timing its import and construction"""
+    with _instances_lock:
+        if name not in _instances:
+            with timed(name):
+                _instances[name] = factory()
+        return _instances[name]
+
+
+def get_audio_processor():
+    """Get the shared AudioProcessor"""
+    def create():
+        from audio_processor import AudioProcessor
+        return AudioProcessor()
+    return _get_instance("audio_processor", create)
+
+
+def get_text_transformer():
+    """Get the shared TextTransformer"""
+    def create():
+        from text_transformer import TextTransformer
+        return TextTransformer()
+    return _get_instance("text_transformer", create)
+
+
+def get_voice_synthesizer():
+    """Get the shared VoiceSynthesizer"""
+    def create():
+        from voice_synthesizer import VoiceSynthesizer
+        return VoiceSynthesizer()
+    return _get_instance("voice_synthesizer", create)
+
+
+COMPONENTS = {
+    "audio_processor": get_audio_processor,
+    "text_transformer": get_text_transformer,
+    "voice_synthesizer": get_voice_synthesizer
+}
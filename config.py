@@ -6,10 +6,27 @@ load_dotenv()
 
 # OpenAI API configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # None uses the official endpoint
+# Rewrite text in the celebrity's style; when disabled the text is spoken as is
+TEXT_TRANSFORM_ENABLED = os.getenv("TEXT_TRANSFORM_ENABLED", "false").lower() == "true"
+# Stream the rewritten text into synthesis sentence by sentence while it is generated
+TRANSFORM_STREAMING_ENABLED = os.getenv("TRANSFORM_STREAMING_ENABLED", "true").lower() == "true"
 
 # Fish Audio API configuration
 FISH_AUDIO_API_KEY = os.getenv("FISH_API_KEY")
-FISH_AUDIO_API_URL = "https://api.fish.audio/v1/tts"
+FISH_AUDIO_API_URL = os.getenv("FISH_AUDIO_API_URL", "https://api.fish.audio/v1/tts")
+FISH_AUDIO_ASR_URL = os.getenv("FISH_AUDIO_ASR_URL", "https://api.fish.audio/v1/asr")
+FISH_AUDIO_BASE_URL = "https://api.fish.audio"
+
+# HTTP connection pool configuration (shared by all API clients)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+# Hosts to open connections to at startup so the first request skips the handshake
+HTTP_WARMUP_URLS = [FISH_AUDIO_BASE_URL]
 
 # Audio recording configuration
 SAMPLE_RATE = 44100
@@ -17,6 +34,18 @@ CHANNELS = 1
 CHUNK_SIZE = 1024
 RECORD_SECONDS = 5
 FORMAT = "wav"
+CAPTURE_RING_SECONDS = float(os.getenv("CAPTURE_RING_SECONDS", "3"))
+CAPTURE_STALL_TIMEOUT = 2.0  # Seconds without input before capture fails
+# Sample rates probed (once) per input device for the Settings tab
+DEVICE_PROBE_RATES = [8000, 16000, 22050, 32000, 44100, 48000]
+
+# Voice activity detection (stop recording when the speaker stops)
+VAD_ENERGY_THRESHOLD_DB = float(os.getenv("VAD_ENERGY_THRESHOLD_DB", "-45"))
+VAD_NOISE_MARGIN_DB = float(os.getenv("VAD_NOISE_MARGIN_DB", "10"))
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.35"))
+VAD_HANGOVER_SECONDS = float(os.getenv("VAD_HANGOVER_SECONDS", "0.8"))
+VAD_PADDING_SECONDS = float(os.getenv("VAD_PADDING_SECONDS", "0.2"))
+VAD_MAX_SECONDS = float(os.getenv("VAD_MAX_SECONDS", "15"))
 
 # Celebrities configuration
 CELEBRITIES = {
@@ -34,10 +63,136 @@ CELEBRITIES = {
     }
 }
 
+# Local media server (progressive playback of synthesized audio)
+MEDIA_SERVER_ENABLED = os.getenv("MEDIA_SERVER_ENABLED", "true").lower() == "true"
+# Local only by default: run.py tunnels the port for remote browsers; 0.0.0.0 serves the LAN directly
+MEDIA_SERVER_HOST = os.getenv("MEDIA_SERVER_HOST", "127.0.0.1")
+MEDIA_SERVER_PORT = int(os.getenv("MEDIA_SERVER_PORT", "8502"))
+# Public URL of the media server when it is tunneled (set by run.py), empty to use the page's host
+MEDIA_PUBLIC_URL = os.getenv("MEDIA_PUBLIC_URL", "").rstrip("/")
+LIVE_STREAM_TTL = 600  # Seconds a finished live stream stays available
+# Output files never change once written, so browsers may cache them
+MEDIA_CACHE_MAX_AGE = 86400
+
+# Background pipeline jobs (Streamlit UI)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RETENTION_SECONDS = 600  # Finished jobs are forgotten after this long
+JOB_POLL_INTERVAL = 0.5  # Seconds between UI refreshes while a job runs
+
+# Latency metrics (per-stage histograms, exported at /metrics)
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1000"))  # Observations per stage for percentiles
+METRICS_TRACES = 50  # Recent requests whose stage timings are kept
+
+# Headless HTTP API (python api_server.py)
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8503"))
+API_MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_MB", "10")) * 1024 * 1024
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "30"))  # Seconds to receive a request
+
 # File paths
 TEMP_AUDIO_DIR = "temp_audio"
 OUTPUT_AUDIO_DIR = "output_audio"
+CACHE_DIR = "cache"
+
+# Audio store for synthesized speech, the TTS cache and saved recordings: "pack"
+# appends clips to segment files in <dir>/pack, "directory" keeps one plain file per clip
+AUDIO_STORE_BACKEND = os.getenv("AUDIO_STORE_BACKEND", "pack")
+AUDIO_STORE_DIRS = {"outputs": OUTPUT_AUDIO_DIR, "tts_cache": os.path.join(OUTPUT_AUDIO_DIR, "tts_cache"),
+                    "recordings": TEMP_AUDIO_DIR}
+PACK_SEGMENT_MAX_BYTES = int(os.getenv("PACK_SEGMENT_MAX_MB", "32")) * 1024 * 1024
+PACK_COMPACT_GARBAGE_RATIO = 0.5  # Sealed segments with more dead bytes than this are rewritten
+PACK_INDEX_SYNC_EVERY = 20  # Changes between index snapshots; later ones are recovered from the segments
+PACK_FSYNC = os.getenv("PACK_FSYNC", "false").lower() == "true"  # fsync every clip (slow on SD cards)
+
+# Disk janitor: background thread enforcing an age and size quota per directory
+# (top-level files only; the caches in subdirectories bound themselves)
+JANITOR_ENABLED = os.getenv("JANITOR_ENABLED", "true").lower() == "true"
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL_SECONDS", "300"))
+JANITOR_QUOTAS = {
+    TEMP_AUDIO_DIR: {
+        "max_age": float(os.getenv("TEMP_AUDIO_MAX_AGE_HOURS", "6")) * 3600,
+        "max_bytes": int(os.getenv("TEMP_AUDIO_MAX_MB", "100")) * 1024 * 1024
+    },
+    OUTPUT_AUDIO_DIR: {
+        "max_age": float(os.getenv("OUTPUT_AUDIO_MAX_AGE_HOURS", "48")) * 3600,
+        "max_bytes": int(os.getenv("OUTPUT_AUDIO_MAX_MB", "300")) * 1024 * 1024
+    }
+}
+JANITOR_MIN_AGE = 120  # Younger files may still be being written
+JANITOR_HOLD_SECONDS = 3600  # Files shown by a session stay protected this long after its last rerun or fetch
+JANITOR_BATCH_SIZE = 50  # Files deleted between pauses, so the SD card keeps serving other writes
+JANITOR_BATCH_PAUSE = 0.05
+
+# TTS request budget: all attempts (and the fallback) must finish within this time
+TTS_DEADLINE_SECONDS = float(os.getenv("TTS_DEADLINE_SECONDS", "45"))
+
+# Sentence-parallel TTS (long texts are split and synthesized concurrently)
+TTS_PARALLEL_ENABLED = os.getenv("TTS_PARALLEL_ENABLED", "true").lower() == "true"
+TTS_PARALLEL_MIN_CHARS = int(os.getenv("TTS_PARALLEL_MIN_CHARS", "300"))  # Shorter texts go as one request
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "250"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "3"))
+TTS_CROSSFADE_MS = int(os.getenv("TTS_CROSSFADE_MS", "0"))  # 0 joins MP3 frames without re-encoding
+
+# Admission control shared by every session in the process: a token bucket
+# (calls per second and burst) and a concurrency cap per API provider
+RATE_LIMITS = {
+    "fish_audio": {
+        "rate": float(os.getenv("FISH_AUDIO_RATE_LIMIT", "2")),
+        "burst": int(os.getenv("FISH_AUDIO_BURST", "4")),
+        "max_concurrency": int(os.getenv("FISH_AUDIO_MAX_CONCURRENCY", "4"))
+    },
+    "openai": {
+        "rate": float(os.getenv("OPENAI_RATE_LIMIT", "1")),
+        "burst": int(os.getenv("OPENAI_BURST", "3")),
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "3"))
+    }
+}
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))  # Longer waits are rejected
+ADMISSION_DEFAULT_BACKOFF = 2.0  # Pause after a 429 without a Retry-After header
+
+# Circuit breaker configuration (per API endpoint)
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "4"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "20"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+# TTS cache configuration (synthesized clips keyed on the full request, kept in their own audio store)
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_DIR = AUDIO_STORE_DIRS["tts_cache"]
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# ASR cache configuration (transcripts keyed on the audio content hash)
+ASR_CACHE_ENABLED = os.getenv("ASR_CACHE_ENABLED", "true").lower() == "true"
+ASR_CACHE_DIR = os.path.join(CACHE_DIR, "asr")
+ASR_CACHE_MAX_BYTES = int(os.getenv("ASR_CACHE_MAX_MB", "20")) * 1024 * 1024
+ASR_CACHE_TTL = float(os.getenv("ASR_CACHE_TTL_HOURS", "168")) * 3600
+
+# Transform cache configuration (OpenAI rewrites keyed on text, celebrity, model and prompt)
+TRANSFORM_CACHE_ENABLED = os.getenv("TRANSFORM_CACHE_ENABLED", "true").lower() == "true"
+TRANSFORM_CACHE_PATH = os.path.join(CACHE_DIR, "transforms.sqlite3")
+TRANSFORM_CACHE_MAX_ENTRIES = int(os.getenv("TRANSFORM_CACHE_MAX_ENTRIES", "5000"))
+TRANSFORM_MODEL = os.getenv("TRANSFORM_MODEL", "gpt-4")
+# Deterministic mode uses temperature 0, so a cached rewrite is the answer the model would give again
+TRANSFORM_DETERMINISTIC = os.getenv("TRANSFORM_DETERMINISTIC", "false").lower() == "true"
+TRANSFORM_TEMPERATURE = 0.0 if TRANSFORM_DETERMINISTIC else 0.7
+
+# Hedged transcription (race Fish Audio against Google, first good result wins)
+RACE_TRANSCRIPTION = os.getenv("RACE_TRANSCRIPTION", "false").lower() == "true"
+TRANSCRIPTION_HEDGE_DELAY = float(os.getenv("TRANSCRIPTION_HEDGE_DELAY", "1.5"))
+
+# Streaming ASR (utterances are transcribed while recording continues)
+STREAMING_ASR_PAUSE_SECONDS = float(os.getenv("STREAMING_ASR_PAUSE_SECONDS", "0.4"))
+STREAMING_ASR_MIN_SEGMENT_SECONDS = float(
+    os.getenv("STREAMING_ASR_MIN_SEGMENT_SECONDS", "1.5"))
+STREAMING_ASR_MAX_SEGMENT_SECONDS = float(
+    os.getenv("STREAMING_ASR_MAX_SEGMENT_SECONDS", "12"))
+
+# ASR upload configuration (audio is downsampled and compressed before upload)
+ASR_UPLOAD_SAMPLE_RATE = int(os.getenv("ASR_UPLOAD_SAMPLE_RATE", "16000"))  # 0 keeps the capture rate
+ASR_UPLOAD_CODEC = os.getenv("ASR_UPLOAD_CODEC", "flac")  # "flac", "opus" or "wav"
+ASR_UPLOAD_OPUS_BITRATE = os.getenv("ASR_UPLOAD_OPUS_BITRATE", "24k")
 
 # Create directories if they don't exist
-for directory in [TEMP_AUDIO_DIR, OUTPUT_AUDIO_DIR]:
+for directory in [TEMP_AUDIO_DIR, OUTPUT_AUDIO_DIR, CACHE_DIR]:
     os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,183 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from config import CHANNELS, DEVICE_PROBE_RATES
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("device_manager")
+
+
+def device_key(device):
+    """Identify a device across re-enumerations, where its index may change"""
+    return (device['name'], device['host_api'])
+
+
+def hotplug_fingerprint():
+    """
+    Cheap signature of the sound devices known to the OS, or None where it
+    can't be read (then only an explicit refresh picks up new devices)
+    """
+    parts = []
+    try:
+        with open("/proc/asound/cards") as f:
+            parts.append(f.read())
+    except OSError:
+        pass
+    try:
+        parts.append(",".join(sorted(os.listdir("/dev/snd"))))
+    except OSError:
+        pass
+    return "\n".join(parts) if parts else None
+
+
+class DeviceManager:
+    """
+    Owns the PyAudio instance and caches input-device enumeration.
+
+    A PortAudio scan takes hundreds of milliseconds on ALSA, so the device list
+    is only rebuilt when the OS sound devices change or refresh is requested.
+    PortAudio only notices hotplugged devices after re-initializing, so a
+    rebuild replaces the PyAudio instance; while a capture holds it (see
+    in_use()) the cached list is kept until the next check. Supported sample
+    rates are probed once per device.
+    """
+
+    def __init__(self, probe_rates=DEVICE_PROBE_RATES):
+        self.probe_rates = probe_rates
+        self.scans = 0
+        self.last_scan_seconds = None
+        self._pa = None
+        self._devices = None
+        self._default_index = None
+        self._fingerprint = None
+        self._rates = {}  # device key -> supported sample rates
+        self._users = 0
+        self._lock = threading.RLock()
+
+    def __del__(self):
+        """Clean up PyAudio when the object is destroyed"""
+        if getattr(self, '_pa', None) is not None:
+            self._pa.terminate()
+
+    @property
+    def pa(self):
+        """PyAudio instance, initialized on first use"""
+        with self._lock:
+            if self._pa is None:
+                import pyaudio  # Import here, loading PortAudio is slow
+                self._pa = pyaudio.PyAudio()
+            return self._pa
+
+    @contextmanager
+    def in_use(self):
+        """Hold the PyAudio instance for a capture, postponing re-initialization"""
+        with self._lock:
+            pa = self.pa
+            self._users += 1
+        try:
+            yield pa
+        finally:
+            with self._lock:
+                self._users -= 1
+
+    def input_devices(self, refresh=False):
+        """
+        Get the available input devices
+
+        Args:
+            refresh (bool): Rescan even if no hotplug was detected
+
+        Returns:
+            list: Device dicts with index, name, channels, sample_rate,
+                host_api and supported sample_rates
+        """
+        with self._lock:
+            fingerprint = hotplug_fingerprint()
+            if self._devices is not None:
+                if not refresh and fingerprint == self._fingerprint:
+                    return list(self._devices)
+                if self._users:
+                    logger.info("Audio devices changed during a capture, rescanning later")
+                    return list(self._devices)
+                logger.info("Rescanning audio devices" if refresh else "Audio devices changed, rescanning")
+                # PortAudio only sees hotplugged devices after re-initializing
+                self._pa.terminate()
+                self._pa = None
+
+            self._scan()
+            self._fingerprint = fingerprint
+            return list(self._devices)
+
+    def _scan(self):
+        """Enumerate input devices through PortAudio (lock must be held)"""
+        start_time = time.perf_counter()
+        pa = self.pa
+        devices = []
+        for i in range(pa.get_device_count()):
+            device_info = pa.get_device_info_by_index(i)
+            if device_info['maxInputChannels'] > 0:  # If it's an input device
+                device = {
+                    'index': i,
+                    'name': device_info['name'],
+                    'channels': device_info['maxInputChannels'],
+                    'sample_rate': int(device_info['defaultSampleRate']),
+                    'host_api': device_info['hostApi']
+                }
+                device['sample_rates'] = self._supported_rates(device)
+                devices.append(device)
+
+        try:
+            self._default_index = pa.get_default_input_device_info()['index']
+        except IOError:
+            self._default_index = None
+
+        self._devices = devices
+        self.scans += 1
+        self.last_scan_seconds = time.perf_counter() - start_time
+        logger.info(
+            f"Found {len(devices)} input devices in {self.last_scan_seconds * 1000:.0f} ms")
+
+    def _supported_rates(self, device):
+        """Probe the sample rates a device accepts, once per device (lock must be held)"""
+        key = device_key(device)
+        if key not in self._rates:
+            import pyaudio  # Already loaded by self.pa
+
+            rates = []
+            for rate in self.probe_rates:
+                try:
+                    if self.pa.is_format_supported(rate, input_device=device['index'],
+                                                   input_channels=min(CHANNELS, device['channels']),
+                                                   input_format=pyaudio.paInt16):
+                        rates.append(rate)
+                except ValueError:
+                    pass
+            self._rates[key] = rates
+        return self._rates[key]
+
+    def get_device(self, index):
+        """Get a cached input device by index, or None"""
+        for device in self.input_devices():
+            if device['index'] == index:
+                return device
+        return None
+
+    def find_device(self, key):
+        """Get a cached input device by its device_key(), or None"""
+        for device in self.input_devices():
+            if device_key(device) == key:
+                return device
+        return None
+
+    def default_device(self):
+        """Get the system default input device, or None if there is none"""
+        devices = self.input_devices()
+        for device in devices:
+            if device['index'] == self._default_index:
+                return device
+        return devices[0] if devices else None
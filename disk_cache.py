@@ -0,0 +1,350 @@
+import os
+import time
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from utils import ensure_directory_exists
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("disk_cache")
+
+
+def make_cache_key(payload):
+    """
+    Build a content-addressed cache key from a JSON-serializable payload
+
+    Args:
+        payload: Dict (or other JSON-serializable value) describing the cached item
+
+    Returns:
+        str: Hex SHA-256 digest of the canonical JSON encoding
+    """
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"),
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed file cache with a byte-size cap and LRU eviction.
+
+    Each entry is a single file named `<key><suffix>`. The file's mtime records
+    when the entry was written (used for the TTL) and its atime records the
+    last access (used for LRU ordering), so the order survives restarts.
+    """
+
+    def __init__(self, directory, max_bytes, ttl=None, name="cache"):
+        """
+        Args:
+            directory (str): Directory holding the cache entries
+            max_bytes (int): Maximum total size of all entries in bytes
+            ttl (float, optional): Maximum entry age in seconds, None to disable
+            name (str): Name used in log messages
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (path, size), oldest access first
+        self._total_bytes = 0
+        ensure_directory_exists(directory)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the in-memory LRU index from the files on disk"""
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            stat = entry.stat()
+            key = entry.name.split(".", 1)[0]
+            found.append((stat.st_atime, key, entry.path, stat.st_size))
+
+        for _, key, path, size in sorted(found):
+            self._entries[key] = (path, size)
+            self._total_bytes += size
+
+        logger.info(
+            f"[{self.name}] Loaded {len(self._entries)} entries ({self._total_bytes} bytes)")
+        with self._lock:
+            self._evict()
+
+    def _is_expired(self, path):
+        """Check whether an entry is older than the TTL"""
+        if self.ttl is None:
+            return False
+        return time.time() - os.path.getmtime(path) > self.ttl
+
+    def _remove(self, key):
+        """Remove an entry from the index and disk (lock must be held)"""
+        path, size = self._entries.pop(key)
+        self._total_bytes -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Evict least recently used entries until under the size cap (lock must be held)"""
+        while self._entries and self._total_bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+            logger.info(f"[{self.name}] Evicted entry {key[:12]}")
+
+    def get(self, key):
+        """
+        Look up an entry and mark it as recently used
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            str or None: Path to the cached file, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                path = entry[0]
+                try:
+                    if self._is_expired(path):
+                        self._remove(key)
+                        entry = None
+                    else:
+                        os.utime(path, (time.time(), os.path.getmtime(path)))
+                        self._entries.move_to_end(key)
+                except FileNotFoundError:
+                    # Removed behind our back
+                    self._remove(key)
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry[0]
+
+    def put_file(self, key, source_path, suffix=""):
+        """
+        Move a finished file into the cache with an atomic rename
+
+        Args:
+            key (str): The cache key
+            source_path (str): File to move; must be on the same filesystem
+            suffix (str): File extension for the entry, e.g. ".mp3"
+
+        Returns:
+            str: Path to the cached entry
+        """
+        path = os.path.join(self.directory, key + suffix)
+        size = os.path.getsize(source_path)
+        os.replace(source_path, path)
+
+        with self._lock:
+            if key in self._entries:
+                old_path, old_size = self._entries.pop(key)
+                self._total_bytes -= old_size
+                if old_path != path and os.path.exists(old_path):
+                    os.remove(old_path)
+            self._entries[key] = (path, size)
+            self._total_bytes += size
+            self._evict()
+
+        return path
+
+    def put_bytes(self, key, data, suffix=""):
+        """
+        Write bytes to a temporary file and atomically publish it as an entry
+
+        Args:
+            key (str): The cache key
+            data (bytes): Entry contents
+            suffix (str): File extension for the entry
+
+        Returns:
+            str: Path to the cached entry
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            return self.put_file(key, tmp_path, suffix)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def stats(self):
+        """Get hit/miss counters and current cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+class StoreCache:
+    """
+    Content-addressed cache of clips in an audio store, with a byte-size cap
+    and LRU eviction.
+
+    Each entry is a clip named `<key>.<extension>`, so a hit is a reference
+    that can be handed out as is and a miss is written to the store once.
+    The LRU order lives in memory; after a restart it starts out as the order
+    the clips were written in.
+
+    Since callers get the entries themselves rather than copies, the cache
+    owns the lifetime of the clips it hands out: an entry that is still in
+    use is skipped by eviction, even if that leaves the cache over its cap
+    until the entry is released.
+    """
+
+    def __init__(self, store, max_bytes, name="cache", in_use=None):
+        """
+        Args:
+            store (AudioStore): Store holding the cache entries, used by nothing else
+            max_bytes (int): Maximum total size of all entries in bytes
+            name (str): Name used in log messages
+            in_use (callable, optional): Tells whether a clip reference is still
+                in use, e.g. held by a session (see janitor.is_held)
+        """
+        self.store = store
+        self.max_bytes = max_bytes
+        self.name = name
+        self.in_use = in_use
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (reference, size), oldest access first
+        self._total_bytes = 0
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the in-memory LRU index from the store's clips"""
+        for ref, _, size in sorted(self.store.entries(), key=lambda entry: entry[1]):
+            key = os.path.basename(ref).split(".", 1)[0]
+            self._entries[key] = (ref, size)
+            self._total_bytes += size
+
+        logger.info(
+            f"[{self.name}] Loaded {len(self._entries)} entries ({self._total_bytes} bytes)")
+        with self._lock:
+            evicted = self._evict()
+        if evicted:
+            self.store.compact()
+
+    def _evict(self, keep=None):
+        """
+        Evict least recently used entries until under the size cap, skipping
+        the ones still in use (lock must be held)
+
+        Args:
+            keep (str, optional): Key of an entry about to be handed out, which must stay too
+
+        Returns:
+            int: Number of evicted entries
+        """
+        evicted = 0
+        for key, (ref, size) in list(self._entries.items()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if key == keep or (self.in_use is not None and self.in_use(ref)):
+                continue
+            del self._entries[key]
+            self._total_bytes -= size
+            self.store.delete(ref)
+            self.evictions += 1
+            evicted += 1
+            logger.info(f"[{self.name}] Evicted entry {key[:12]}")
+        if self._total_bytes > self.max_bytes:
+            logger.warning(f"[{self.name}] Over its cap ({self._total_bytes} bytes): "
+                           f"the remaining entries are in use")
+        return evicted
+
+    def get(self, key):
+        """
+        Look up an entry and mark it as recently used
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            str or None: Reference to the cached clip, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.store.info(entry[0]) is None:
+                # Removed behind our back
+                self._entries.pop(key)
+                self._total_bytes -= entry[1]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, data, suffix=""):
+        """
+        Store a clip as an entry
+
+        Args:
+            key (str): The cache key
+            data (bytes-like): The clip
+            suffix (str): File extension for the entry, e.g. ".mp3"
+
+        Returns:
+            str: Reference to the cached clip
+        """
+        ref = self.store.put(data, suffix.lstrip("."), name=key)
+        size = len(memoryview(data).cast("B"))
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+                if old[0] != ref:
+                    self.store.delete(old[0])
+            self._entries[key] = (ref, size)
+            self._total_bytes += size
+            evicted = self._evict(keep=key)
+
+        if evicted:
+            # Reclaim the space of the evicted clips once enough of a segment is dead
+            self.store.compact()
+        return ref
+
+    def stats(self):
+        """Get hit/miss counters and current cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,175 @@
+import asyncio
+import atexit
+import importlib.util
+import logging
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+from config import (HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    HTTP_KEEPALIVE_EXPIRY, HTTP2_ENABLED, HTTP_WARMUP_URLS)
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("http_client")
+
+# Process-wide background event loop used by the synchronous wrappers
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+# One pooled AsyncClient per event loop (httpx connections are bound to their loop)
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+# Pooled session for the synchronous `requests` fallback
+_session = None
+_session_lock = threading.Lock()
+
+_warmup_started = False
+
+
+def http2_available():
+    """Check whether HTTP/2 is enabled and the `h2` package is installed"""
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def get_event_loop():
+    """Get the shared background event loop, starting it on first use"""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(
+                target=_loop.run_forever, name="http-event-loop", daemon=True)
+            _loop_thread.start()
+            logger.info("Started shared background event loop")
+    return _loop
+
+
+def run_async(coro, timeout=None):
+    """
+    Run a coroutine on the shared background event loop and wait for its result
+
+    Args:
+        coro: The coroutine to run
+        timeout (float, optional): Maximum time to wait for the result in seconds
+
+    Returns:
+        The value returned by the coroutine
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError(
+            "run_async() cannot be called from the shared event loop thread")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def get_async_client():
+    """Get the pooled httpx.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            import httpx  # Import here, the first request pays for it instead of startup
+            client = httpx.AsyncClient(
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                http2=http2_available()
+            )
+            _async_clients[loop] = client
+    return client
+
+
+@asynccontextmanager
+async def get_httpx_client():
+    """Context manager yielding the shared pooled httpx client (left open for reuse)"""
+    yield get_async_client()
+
+
+def get_requests_session():
+    """Get the pooled requests.Session used by synchronous fallbacks"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests  # Import here, only the synchronous fallbacks need it
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                pool_maxsize=HTTP_MAX_CONNECTIONS
+            )
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+
+async def _warm_up_async(urls):
+    """Open keep-alive connections to each URL on the running loop"""
+    client = get_async_client()
+    for url in urls:
+        try:
+            response = await client.head(url, timeout=5.0)
+            logger.info(
+                f"Warmed up connection to {url} ({response.http_version})")
+        except Exception as e:
+            logger.warning(f"Could not warm up connection to {url}: {str(e)}")
+
+
+def warm_up_connections(urls=None):
+    """
+    Open connections to the API hosts in the background so the first request
+    does not pay for the TCP/TLS handshake. Only runs once per process.
+
+    Args:
+        urls (list, optional): URLs to connect to, defaults to HTTP_WARMUP_URLS
+
+    Returns:
+        concurrent.futures.Future or None: The warm-up task, or None if already started
+    """
+    global _warmup_started
+    with _loop_lock:
+        if _warmup_started:
+            return None
+        _warmup_started = True
+
+    urls = urls or HTTP_WARMUP_URLS
+    return asyncio.run_coroutine_threadsafe(_warm_up_async(urls), get_event_loop())
+
+
+async def _close_async_client():
+    """Close the pooled client that belongs to the running loop"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def close_clients():
+    """Close the pooled clients and stop the background event loop"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+    if _loop is not None and _loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(
+                _close_async_client(), _loop).result(5)
+        except Exception as e:
+            logger.warning(f"Error closing HTTP clients: {str(e)}")
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+atexit.register(close_clients)
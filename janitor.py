@@ -0,0 +1,255 @@
+import os
+import time
+import shutil
+import logging
+import threading
+
+from config import (JANITOR_ENABLED, JANITOR_INTERVAL, JANITOR_QUOTAS, JANITOR_MIN_AGE, JANITOR_HOLD_SECONDS,
+                    JANITOR_BATCH_SIZE, JANITOR_BATCH_PAUSE)
+from audio_store import open_stores, is_store_ref, delete_audio
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("janitor")
+
+
+def _normalize(path):
+    """Compare files by real path and audio store clips by reference"""
+    return path if is_store_ref(path) else os.path.realpath(path)
+
+
+class DiskJanitor:
+    """
+    Background thread keeping recording and output directories within quota.
+
+    Every sweep deletes the top-level files of each directory (except dot
+    files), and the clips of the pack store kept in it, that are older than
+    its max_age, then the oldest remaining ones until the directory fits in
+    max_bytes, and compacts the pack. Files held by a session (see hold()) and files younger than
+    min_age are never deleted. Deletes happen in batches with a short pause in
+    between, so a large backlog does not monopolize the disk.
+    """
+
+    def __init__(self, quotas=JANITOR_QUOTAS, interval=JANITOR_INTERVAL, min_age=JANITOR_MIN_AGE,
+                 hold_seconds=JANITOR_HOLD_SECONDS, batch_size=JANITOR_BATCH_SIZE):
+        """
+        Args:
+            quotas (dict): Directory -> {"max_age": seconds, "max_bytes": bytes}
+            interval (float): Seconds between sweeps
+            min_age (float): Files younger than this are left alone
+            hold_seconds (float): How long a hold lasts unless it is renewed
+            batch_size (int): Files deleted between pauses
+        """
+        self.quotas = quotas
+        self.interval = interval
+        self.min_age = min_age
+        self.hold_seconds = hold_seconds
+        self.batch_size = batch_size
+        self._holds = {}  # key -> (real path or store reference, expiry)
+        self._usage = {directory: {"files": 0, "bytes": 0, "deleted_files": 0, "deleted_bytes": 0,
+                                   "free_bytes": None, "last_sweep_at": None}
+                       for directory in quotas}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def hold(self, key, path):
+        """
+        Protect a file that is still in use, e.g. shown by a session
+
+        Args:
+            key (str): Holder of the file, e.g. "<session>:output_file"; a new
+                path replaces the key's previous one
+            path (str or None): The file or audio store reference, None to drop the key's hold
+        """
+        with self._lock:
+            if path is None:
+                self._holds.pop(key, None)
+            else:
+                self._holds[key] = (_normalize(path), time.time() + self.hold_seconds)
+
+    def release(self, key):
+        """Drop a hold"""
+        self.hold(key, None)
+
+    def renew(self, path):
+        """
+        Extend every hold on a file, e.g. whenever the media server serves it,
+        so a page that stays open keeps its clip without Streamlit reruns
+
+        Returns:
+            int: Number of holds renewed
+        """
+        path = _normalize(path)
+        expiry = time.time() + self.hold_seconds
+        with self._lock:
+            keys = [key for key, (held, _) in self._holds.items() if held == path]
+            for key in keys:
+                self._holds[key] = (path, expiry)
+        return len(keys)
+
+    def is_held(self, path):
+        """Check whether a file or audio store reference has an unexpired hold"""
+        return _normalize(path) in self._held_paths(time.time())
+
+    def _held_paths(self, now):
+        with self._lock:
+            for key in [key for key, (_, expiry) in self._holds.items() if expiry <= now]:
+                del self._holds[key]
+            return {path for path, _ in self._holds.values()}
+
+    def start(self):
+        """Sweep in a background thread until stop()"""
+        self._thread = threading.Thread(target=self._run, name="disk-janitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Disk janitor sweeping {', '.join(self.quotas)} every {self.interval:.0f}s")
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Disk janitor sweep failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def sweep(self):
+        """
+        Enforce the quotas once
+
+        Returns:
+            dict: Directory -> (files deleted, bytes freed)
+        """
+        now = time.time()
+        held = self._held_paths(now)
+        return {directory: self._sweep_directory(directory, quota, held, now)
+                for directory, quota in self.quotas.items()}
+
+    def _sweep_directory(self, directory, quota, held, now):
+        # Clips in a pack store count against the quota of the directory the pack is in
+        stores = [store for store in open_stores() if store.backend == "pack" and store.directory == directory]
+        files = [(created_at, size, ref) for store in stores for ref, created_at, size in store.entries()]
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    # Dot files are tracked placeholders (.gitkeep) or clips still being written (.tmp-*)
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                    except FileNotFoundError:
+                        continue  # Deleted while listing
+        except FileNotFoundError:
+            return 0, 0
+        files.sort()  # Oldest first
+
+        total = sum(size for _, size, _ in files)
+        victims = []
+        for mtime, size, path in files:
+            age = now - mtime
+            if age < self.min_age or _normalize(path) in held:
+                continue
+            if age > quota["max_age"] or total > quota["max_bytes"]:
+                victims.append((path, size))
+                total -= size
+
+        deleted_files, deleted_bytes = self._delete(victims)
+        for store in stores:
+            store.compact()
+        if total > quota["max_bytes"]:
+            logger.warning(f"{directory} is still over quota ({total / 1024 / 1024:.1f} MB): "
+                           f"the remaining files are in use or too new to delete")
+
+        with self._lock:
+            usage = self._usage[directory]
+            usage["files"] = len(files) - deleted_files
+            usage["bytes"] = sum(size for _, size, _ in files) - deleted_bytes
+            usage["deleted_files"] += deleted_files
+            usage["deleted_bytes"] += deleted_bytes
+            usage["free_bytes"] = shutil.disk_usage(directory).free
+            usage["last_sweep_at"] = now
+        if deleted_files:
+            logger.info(f"Deleted {deleted_files} files ({deleted_bytes / 1024 / 1024:.1f} MB) from {directory}")
+        return deleted_files, deleted_bytes
+
+    def _delete(self, victims):
+        """Delete files and clips in batches; returns the number of them and bytes actually removed"""
+        deleted_files = deleted_bytes = 0
+        for start in range(0, len(victims), self.batch_size):
+            if start and self._stop.wait(JANITOR_BATCH_PAUSE):
+                break
+            for path, size in victims[start:start + self.batch_size]:
+                try:
+                    if not delete_audio(path):
+                        continue
+                except OSError as e:
+                    logger.warning(f"Could not delete {path}: {str(e)}")
+                    continue
+                deleted_files += 1
+                deleted_bytes += size
+        return deleted_files, deleted_bytes
+
+    def stats(self):
+        """Get the usage of every directory as of the last sweep"""
+        with self._lock:
+            return [{"directory": directory, **usage, **self.quotas[directory], "held": len(self._holds)}
+                    for directory, usage in self._usage.items()]
+
+    def prometheus_text(self):
+        """Render the disk usage in the Prometheus text exposition format"""
+        metrics = [
+            ("voice_disk_usage_bytes", "gauge", "Bytes used by files in the directory.", "bytes"),
+            ("voice_disk_files", "gauge", "Files in the directory.", "files"),
+            ("voice_disk_quota_bytes", "gauge", "Size quota of the directory.", "max_bytes"),
+            ("voice_disk_free_bytes", "gauge", "Free space on the directory's filesystem.", "free_bytes"),
+            ("voice_disk_deleted_files_total", "counter", "Files deleted by the janitor.", "deleted_files"),
+            ("voice_disk_deleted_bytes_total", "counter", "Bytes freed by the janitor.", "deleted_bytes")
+        ]
+        stats = self.stats()
+        lines = []
+        for name, kind, description, key in metrics:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{directory="{usage["directory"]}"}} {usage[key]}'
+                      for usage in stats if usage[key] is not None]
+        return "\n".join(lines) + "\n"
+
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+
+def get_janitor():
+    """
+    Get the process-wide janitor, starting its thread on first use
+
+    Returns:
+        DiskJanitor: The janitor; with JANITOR_ENABLED off it holds files but never sweeps
+    """
+    global _janitor
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = DiskJanitor()
+            if JANITOR_ENABLED:
+                _janitor.start()
+        return _janitor
+
+
+def renew_hold(path):
+    """Extend the holds on a file, if the janitor has been started in this process"""
+    return _janitor.renew(path) if _janitor is not None else 0
+
+
+def is_held(path):
+    """Check whether a file is held, if the janitor has been started in this process"""
+    return _janitor.is_held(path) if _janitor is not None else False
+
+
+def prometheus_text():
+    """Disk usage metrics, or nothing if the janitor has not been started in this process"""
+    return _janitor.prometheus_text() if _janitor is not None else ""
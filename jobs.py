@@ -0,0 +1,188 @@
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOB_WORKERS, JOB_RETENTION_SECONDS
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+PENDING = "pending"  # Stage not started yet
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+
+class Job:
+    """
+    A pipeline run executing on the worker pool.
+
+    The worker reports progress through stage() and results through
+    set_result(); the UI reads consistent copies with snapshot(). Cancellation
+    is cooperative: the job checks for it between and during stages.
+    """
+
+    def __init__(self, kind, stages):
+        """
+        Args:
+            kind (str): Kind of pipeline, for logs and the UI
+            stages (list): Names of the stages in execution order
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.stages = {name: {"status": PENDING, "seconds": None, "message": None}
+                       for name in stages}
+        self.results = {}
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """Whether cancellation was requested"""
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def cancel(self):
+        """Request cancellation; the job stops at its next check"""
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    @property
+    def cancel_event(self):
+        """Event set on cancellation, for blocking loops that can't raise JobCancelled themselves"""
+        return self._cancel_event
+
+    @contextmanager
+    def stage(self, name, message=None):
+        """Mark a stage as running for the duration of the block"""
+        self.check_cancelled()
+        start_time = time.time()
+        with self._lock:
+            self.stages[name].update(status=RUNNING, message=message)
+        try:
+            yield
+        except JobCancelled:
+            self._end_stage(name, CANCELLED, start_time)
+            raise
+        except BaseException:
+            self._end_stage(name, FAILED, start_time)
+            raise
+        self._end_stage(name, DONE, start_time)
+
+    def _end_stage(self, name, status, start_time):
+        with self._lock:
+            self.stages[name].update(status=status, seconds=time.time() - start_time)
+
+    def skip_stage(self, name, message=None):
+        """Mark a stage as done without running it (e.g. merged into another stage)"""
+        with self._lock:
+            self.stages[name].update(status=DONE, seconds=0.0, message=message)
+
+    def set_result(self, key, value):
+        """Publish a (partial) result for the UI"""
+        with self._lock:
+            self.results[key] = value
+
+    def snapshot(self):
+        """Get a consistent copy of the job state"""
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "error": self.error,
+                "elapsed": (self.finished_at or time.time()) - self.created_at,
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "results": dict(self.results)
+            }
+
+
+class JobManager:
+    """
+    Shared worker pool running pipeline jobs independently of Streamlit
+    script runs, so reruns and other interactions don't lose in-flight work.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, stages, fn, *args, **kwargs):
+        """
+        Queue fn(job, *args, **kwargs) on the worker pool
+
+        Args:
+            kind (str): Kind of pipeline
+            stages (list): Stage names reported by fn
+            fn (callable): Pipeline function; receives the Job as first argument
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(kind, stages)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        """Execute a job and record how it ended"""
+        status, error = DONE, None
+        try:
+            job.check_cancelled()
+            job.status = RUNNING
+            fn(job, *args, **kwargs)
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            status, error = FAILED, str(e)
+            logger.error(f"{job.kind} job {job.id} failed: {error}")
+        with job._lock:
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+        logger.info(f"{job.kind} job {job.id} {status} after "
+                    f"{job.finished_at - job.created_at:.2f} seconds")
+
+    def get(self, job_id):
+        """Get a job by id, or None if unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation of a job"""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def _prune(self):
+        """Forget finished jobs past their retention time (lock must be held)"""
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > JOB_RETENTION_SECONDS]:
+            del self._jobs[job_id]
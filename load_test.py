@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mock_apis import MockAPIServer, add_profile_arguments, profiles_from_arguments
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("load_test")
+
+# Lower is better for these results; throughput is compared the other way round
+COMPARED_LATENCIES = [("end_to_end", "p95"), ("first_audio", "p95")]
+
+
+class FirstAudioSink:
+    """Stands in for a LiveAudioStream, noting when the first audio arrives"""
+
+    def __init__(self):
+        self.first_chunk_at = None
+
+    def write(self, chunk):
+        if self.first_chunk_at is None and chunk:
+            self.first_chunk_at = time.perf_counter()
+
+    def reset(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def fail(self):
+        pass
+
+
+def summarize(values):
+    """Nearest-rank percentiles, mean and max of a list of durations, or None if empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def percentile(quantile):
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+    return {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+            "mean": sum(ordered) / len(ordered), "max": ordered[-1]}
+
+
+def synthetic_recording(seconds, seed):
+    """A recording of a voice-like tone with noise, different for every seed"""
+    from audio_buffer import AudioBuffer
+    from config import SAMPLE_RATE
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    signal = 0.3 * np.sin(2 * np.pi * 180 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    signal += rng.normal(0, 0.02, len(t))
+    recording = AudioBuffer(SAMPLE_RATE, 1, 2)
+    recording.append((np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes())
+    return recording.finalize()
+
+
+class LoadTest:
+    """Runs concurrent pipelines through the real recognizer, transformer and synthesizer"""
+
+    def __init__(self, users, iterations, audio_seconds, celebrity_id, stream_transform, keep_outputs=False):
+        from speech_recognizer import SpeechRecognizer
+        from text_transformer import TextTransformer
+        from voice_synthesizer import VoiceSynthesizer
+
+        self.users = users
+        self.iterations = iterations
+        self.audio_seconds = audio_seconds
+        self.celebrity_id = celebrity_id
+        self.stream_transform = stream_transform
+        self.keep_outputs = keep_outputs
+        self.recognizer = SpeechRecognizer()
+        self.transformer = TextTransformer()
+        self.synthesizer = VoiceSynthesizer()
+        self.results = []
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Run every user's pipelines and return the wall-clock duration"""
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users, thread_name_prefix="load-user") as executor:
+            for future in [executor.submit(self._user, user) for user in range(self.users)]:
+                future.result()
+        return time.perf_counter() - started_at
+
+    def _user(self, user):
+        from admission import set_session
+
+        # Each virtual user is queued fairly like a separate browser session
+        set_session(f"load-user-{user}")
+        for iteration in range(self.iterations):
+            result = self._pipeline(user, iteration)
+            with self._lock:
+                self.results.append(result)
+
+    def _pipeline(self, user, iteration):
+        """Run one recording through ASR, transformation and synthesis"""
+        from metrics import start_request
+        from text_transformer import all_sentences
+        from audio_store import delete_audio
+
+        request_id = start_request(f"u{user}-{iteration}")
+        recording = synthetic_recording(self.audio_seconds, seed=user * 100003 + iteration)
+        result = {"user": user, "request_id": request_id, "ok": False}
+        started_at = time.perf_counter()
+        stage = "asr"
+        try:
+            text = self.recognizer.transcribe_audio(recording)
+            if not text:
+                raise RuntimeError("empty transcript")
+
+            stage = "synthesis"
+            sink = FirstAudioSink()
+            if self.stream_transform:
+                sentences = []
+
+                def transformed():
+                    for sentence in self.transformer.transform_text_stream(text, self.celebrity_id):
+                        sentences.append(sentence)
+                        yield sentence
+
+                output_file = self.synthesizer.start_sentence_stream_synthesis(
+                    transformed(), self.celebrity_id, sink).result()
+                fell_back = sentences == all_sentences(text)
+            else:
+                transformed_text = self.transformer.transform_text(text, self.celebrity_id)
+                fell_back = transformed_text == text
+                output_file = self.synthesizer.start_streaming_synthesis(
+                    transformed_text, self.celebrity_id, sink).result()
+
+            result.update(ok=True, seconds=time.perf_counter() - started_at)
+            if sink.first_chunk_at is not None:
+                result["first_audio"] = sink.first_chunk_at - started_at
+            if fell_back:
+                # The transformer swallows API errors and speaks the input instead
+                result["warning"] = "transform: fell back to the original text"
+            if not self.keep_outputs and self.synthesizer.cache is None:
+                delete_audio(output_file)
+        except Exception as e:
+            result.update(seconds=time.perf_counter() - started_at,
+                          error=f"{stage}: {type(e).__name__}: {str(e)[:120]}")
+        return result
+
+    def report(self, duration):
+        """Aggregate the results"""
+        from metrics import stage_summary
+        from admission import all_limiters
+
+        succeeded = [result for result in self.results if result["ok"]]
+        return {
+            "pipelines": len(self.results),
+            "succeeded": len(succeeded),
+            "failed": len(self.results) - len(succeeded),
+            "duration": duration,
+            "throughput": len(succeeded) / duration if duration > 0 else 0.0,
+            "latency": {
+                "end_to_end": summarize([result["seconds"] for result in succeeded]),
+                "first_audio": summarize([result["first_audio"] for result in succeeded
+                                          if "first_audio" in result])
+            },
+            "errors": dict(Counter(result["error"] for result in self.results if "error" in result)),
+            "warnings": dict(Counter(result["warning"] for result in self.results if "warning" in result)),
+            "stages": stage_summary(),
+            "admission": all_limiters()
+        }
+
+
+def compare(results, baseline, max_regression):
+    """
+    Compare results with a baseline run
+
+    Returns:
+        list: Descriptions of the regressions beyond max_regression (a fraction)
+    """
+    regressions = []
+    for name, statistic in COMPARED_LATENCIES:
+        current = (results["latency"].get(name) or {}).get(statistic)
+        previous = (baseline["latency"].get(name) or {}).get(statistic)
+        if current is not None and previous and current > previous * (1 + max_regression):
+            regressions.append(f"{name} {statistic} {previous:.2f}s -> {current:.2f}s")
+    if baseline["throughput"] and results["throughput"] < baseline["throughput"] * (1 - max_regression):
+        regressions.append(f"throughput {baseline['throughput']:.2f}/s -> {results['throughput']:.2f}/s")
+    if results["failed"] > baseline["failed"] * (1 + max_regression) + 1:
+        regressions.append(f"failures {baseline['failed']} -> {results['failed']}")
+    return regressions
+
+
+def print_report(results):
+    print(f"\n{results['succeeded']}/{results['pipelines']} pipelines succeeded in {results['duration']:.1f}s "
+          f"({results['throughput']:.2f} pipelines/s)")
+    for name, stats in results["latency"].items():
+        if stats:
+            print(f"{name:<12} p50 {stats['p50']:.2f}s  p95 {stats['p95']:.2f}s  "
+                  f"p99 {stats['p99']:.2f}s  max {stats['max']:.2f}s")
+
+    print(f"\n{'Stage':<26} {'Count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for stats in results["stages"]:
+        print(f"{stats['stage']:<26} {stats['count']:>6} {stats['p50'] * 1000:>6.0f}ms "
+              f"{stats['p95'] * 1000:>6.0f}ms {stats['p99'] * 1000:>6.0f}ms")
+
+    for title, key in (("Errors", "errors"), ("Warnings", "warnings")):
+        if results[key]:
+            print(f"\n{title}:")
+            for message, count in sorted(results[key].items(), key=lambda item: -item[1]):
+                print(f"  {count:>4} x {message}")
+    print("\nMock API requests: " + ", ".join(
+        f"{endpoint} {counts}" for endpoint, counts in results["mock_requests"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the voice pipeline against local mock Fish Audio and OpenAI servers")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=5, help="Pipelines per user")
+    parser.add_argument("--audio-seconds", type=float, default=3.0, help="Length of each synthetic recording")
+    parser.add_argument("--celebrity", default="donald_trump")
+    parser.add_argument("--no-stream-transform", action="store_true",
+                        help="Wait for the whole rewrite before synthesis")
+    parser.add_argument("--keep-caches", action="store_true",
+                        help="Leave the ASR, transform and TTS caches enabled")
+    parser.add_argument("--unlimited", action="store_true",
+                        help="Lift the per-provider rate limits to measure the pipeline alone")
+    parser.add_argument("--output", default="load_results.json", help="Where to save the results")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline before failing (fraction)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockAPIServer(profiles_from_arguments(args)).start()
+
+    # Settings are read when the app modules are imported, so set them first
+    os.environ.update(server.environment())
+    os.environ["TEXT_TRANSFORM_ENABLED"] = "true"
+    os.environ["TRANSFORM_STREAMING_ENABLED"] = "false" if args.no_stream_transform else "true"
+    os.environ.setdefault("FISH_API_KEY", "mock")
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    if not args.keep_caches:
+        for name in ("ASR_CACHE_ENABLED", "TRANSFORM_CACHE_ENABLED", "TTS_CACHE_ENABLED"):
+            os.environ[name] = "false"
+    if args.unlimited:
+        for provider in ("FISH_AUDIO", "OPENAI"):
+            os.environ[f"{provider}_RATE_LIMIT"] = "1000"
+            os.environ[f"{provider}_BURST"] = "1000"
+            os.environ[f"{provider}_MAX_CONCURRENCY"] = "1000"
+
+    load_test = LoadTest(args.users, args.iterations, args.audio_seconds, args.celebrity,
+                         stream_transform=not args.no_stream_transform)
+    logger.info(f"Running {args.users} users x {args.iterations} pipelines against {server.base_url}")
+    duration = load_test.run()
+    server.stop()
+
+    results = load_test.report(duration)
+    results["mock_requests"] = server.stats()
+    results["config"] = {
+        "users": args.users,
+        "iterations": args.iterations,
+        "audio_seconds": args.audio_seconds,
+        "stream_transform": not args.no_stream_transform,
+        "keep_caches": args.keep_caches,
+        "unlimited": args.unlimited,
+        "profiles": {endpoint: profile.to_dict() for endpoint, profile in server.profiles.items()}
+    }
+    results["started_at"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - duration))
+    print_report(results)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+import os
+import re
+import hmac
+import time
+import uuid
+import hashlib
+import secrets
+import ipaddress
+import mimetypes
+import logging
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+from config import (MEDIA_SERVER_ENABLED, MEDIA_SERVER_HOST, MEDIA_SERVER_PORT,
+                    MEDIA_PUBLIC_URL, LIVE_STREAM_TTL, MEDIA_CACHE_MAX_AGE, OUTPUT_AUDIO_DIR)
+from metrics import prometheus_text
+from janitor import prometheus_text as disk_prometheus_text, renew_hold
+from audio_store import STORE_SCHEME, is_store_ref, read_audio, audio_info
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("media_server")
+
+
+class LiveAudioStream:
+    """
+    Audio that is still being produced, readable by any number of HTTP
+    clients while the producer appends chunks.
+
+    The producer calls write() for every chunk and finish() or fail() at the
+    end. reset() discards a partial attempt before a retry; if a listener has
+    already received some of it the stream is failed instead, since those
+    bytes cannot be taken back.
+    """
+
+    def __init__(self, mime_type="audio/mpeg"):
+        self.id = uuid.uuid4().hex
+        self.mime_type = mime_type
+        self.created_at = time.time()
+        self.first_chunk_at = None
+        self.finished = False
+        self.failed = False
+        self._data = bytearray()
+        self._served = False
+        self._condition = threading.Condition()
+
+    def write(self, chunk):
+        """Append a chunk and wake up waiting readers"""
+        with self._condition:
+            if self.first_chunk_at is None:
+                self.first_chunk_at = time.time()
+            self._data += chunk
+            self._condition.notify_all()
+
+    def reset(self):
+        """Discard a failed partial attempt before retrying"""
+        with self._condition:
+            if self._served and self._data:
+                self.failed = True
+            self._data = bytearray()
+            self.first_chunk_at = None
+            self._condition.notify_all()
+
+    def finish(self):
+        """Mark the stream as complete"""
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def fail(self):
+        """Mark the stream as failed; readers stop after the data they already have"""
+        with self._condition:
+            self.failed = True
+            self._condition.notify_all()
+
+    def read_from(self, offset, timeout=30.0):
+        """
+        Wait for data past `offset`
+
+        Args:
+            offset (int): Number of bytes the reader already has
+            timeout (float): Maximum time to wait for new data
+
+        Returns:
+            tuple: (new bytes, True if the stream has ended)
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: len(self._data) > offset or self.finished or self.failed, timeout)
+            self._served = True
+            ended = self.finished or self.failed
+            return bytes(self._data[offset:]), ended
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+_server = None
+_server_failed = False
+_media_root = os.path.realpath(OUTPUT_AUDIO_DIR)
+_range_pattern = re.compile(r"bytes=(\d*)-(\d*)$")
+_copy_chunk_size = 64 * 1024
+# Signs the URLs handed out by media_path(); links only work for this process's lifetime
+_url_secret = secrets.token_bytes(32)
+_server_lock = threading.Lock()
+
+
+def register_stream(stream):
+    """
+    Make a live stream available at /stream/<id>, dropping expired ones
+
+    Returns:
+        str: URL path of the stream
+    """
+    now = time.time()
+    with _streams_lock:
+        for stream_id in [key for key, value in _streams.items()
+                          if now - value.created_at > LIVE_STREAM_TTL]:
+            del _streams[stream_id]
+        _streams[stream.id] = stream
+    return f"/stream/{stream.id}"
+
+
+def _url_token(url_path):
+    """Token proving a URL path was handed out by media_path()"""
+    return hmac.new(_url_secret, url_path.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def media_path(file_path):
+    """
+    Signed URL path under which the media server serves an output file
+
+    Files and clips are only served with the token of their own path, so
+    nobody can fetch another session's audio by guessing names.
+
+    Args:
+        file_path (str): File inside OUTPUT_AUDIO_DIR, or a reference to a clip in an audio store
+
+    Returns:
+        str: URL path with its token in the query string, or None if the file
+            is outside the served directory
+    """
+    if is_store_ref(file_path):
+        url_path = f"/store/{file_path[len(STORE_SCHEME):]}"
+    else:
+        real_path = os.path.realpath(file_path)
+        if os.path.commonpath([real_path, _media_root]) != _media_root:
+            return None
+        relative_path = os.path.relpath(real_path, _media_root).replace(os.sep, "/")
+        url_path = f"/media/{quote(relative_path)}"
+    return f"{url_path}?token={_url_token(url_path)}"
+
+
+def _resolve_media(url_path):
+    """Map a /media/ URL path back to a file, refusing anything outside the root"""
+    real_path = os.path.realpath(os.path.join(_media_root, unquote(url_path)))
+    if os.path.commonpath([real_path, _media_root]) != _media_root or \
+            not os.path.isfile(real_path):
+        return None
+    return real_path
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves live audio streams, finished output files and latency metrics.
+
+    Files and clips need the token added by media_path(); live streams are
+    addressed by unguessable random ids.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _authorized(self, path):
+        """Check the token of a /media/ or /store/ URL, answering 404 if it is missing or wrong"""
+        token = parse_qs(urlsplit(self.path).query).get("token", [""])[0]
+        if hmac.compare_digest(token, _url_token(path)):
+            return True
+        # The same answer as for a missing file, so tokens can't be used to probe for names
+        self.send_error(404)
+        return False
+
+    def _local_client(self):
+        """
+        Check that a request comes straight from this machine, answering 404 otherwise
+
+        Tunnels such as ngrok connect from loopback too, but they say so in a
+        forwarding header.
+        """
+        try:
+            loopback = ipaddress.ip_address(self.client_address[0]).is_loopback
+        except ValueError:
+            loopback = False
+        if loopback and "X-Forwarded-For" not in self.headers and "Forwarded" not in self.headers:
+            return True
+        self.send_error(404)
+        return False
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if (path.startswith("/media/") or path.startswith("/store/")) and not self._authorized(path):
+            return
+        if path.startswith("/stream/"):
+            self._serve_stream(path[len("/stream/"):])
+        elif path.startswith("/media/"):
+            self._serve_file(path[len("/media/"):])
+        elif path.startswith("/store/"):
+            self._serve_clip(path[len("/store/"):])
+        elif path == "/metrics":
+            # Latencies, queues and disk space are for local scrapers, not for whoever has the tunnel URL
+            if self._local_client():
+                self._serve_metrics()
+        else:
+            self.send_error(404)
+
+    def _serve_metrics(self):
+        """Serve the stage latency histograms and disk usage for Prometheus"""
+        body = (prometheus_text() + disk_prometheus_text()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        path = urlsplit(self.path).path
+        if (path.startswith("/media/") or path.startswith("/store/")) and not self._authorized(path):
+            return
+        if path.startswith("/media/"):
+            self._serve_file(path[len("/media/"):], send_body=False)
+        elif path.startswith("/store/"):
+            self._serve_clip(path[len("/store/"):], send_body=False)
+        else:
+            self.send_error(404)
+
+    def _not_modified(self, etag, mtime):
+        """Check the conditional request headers against the file's validators"""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or \
+                if_none_match.strip() == "*"
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _parse_range(self, size, etag):
+        """
+        Parse a single-range Range header
+
+        Returns:
+            tuple: (start, end) inclusive byte range, None for the whole file,
+                or False if the range cannot be satisfied
+        """
+        range_header = self.headers.get("Range")
+        if not range_header:
+            return None
+        # A stale If-Range means the client's partial copy is outdated
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range.strip() != etag:
+            return None
+
+        match = _range_pattern.match(range_header.strip())
+        if not match or match.groups() == ("", ""):
+            # Multiple or malformed ranges: send the whole file
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(last))
+            end = size - 1
+        if start >= size or start > end:
+            return False
+        return start, end
+
+    def _serve_file(self, url_path, send_body=True):
+        """Send an output file with ETag, Range and caching support"""
+        file_path = _resolve_media(url_path)
+        if file_path is None:
+            self.send_error(404)
+            return
+
+        stat = os.stat(file_path)
+        # Pages that still show the file keep it from the janitor by fetching it
+        renew_hold(file_path)
+
+        def read_range(start, length):
+            with open(file_path, "rb") as f:
+                f.seek(start)
+                while length > 0:
+                    data = f.read(min(_copy_chunk_size, length))
+                    if not data:
+                        break
+                    yield data
+                    length -= len(data)
+
+        self._send_media(url_path, stat.st_size, stat.st_mtime, f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                         mimetypes.guess_type(file_path)[0], read_range, send_body)
+
+    def _serve_clip(self, url_path, send_body=True):
+        """Send a clip from an audio store; clips never change, so they cache like files"""
+        ref = STORE_SCHEME + url_path
+        try:
+            info = audio_info(ref)
+            data = read_audio(ref) if info is not None else None
+        except FileNotFoundError:
+            data = None
+        if data is None:
+            self.send_error(404)
+            return
+        renew_hold(ref)
+
+        def read_range(start, length):
+            # Slices of the store's mmap go to the socket without copying
+            view = memoryview(data)
+            for offset in range(start, start + length, _copy_chunk_size):
+                yield view[offset:min(offset + _copy_chunk_size, start + length)]
+
+        size, created_at = info
+        self._send_media(url_path, size, created_at, f'"{int(created_at * 1e9):x}-{size:x}"',
+                         mimetypes.guess_type(unquote(url_path))[0], read_range, send_body)
+
+    def _send_media(self, url_path, size, mtime, etag, mime_type, read_range, send_body):
+        """
+        Send a response for immutable media, honoring conditional and Range requests
+
+        Args:
+            url_path (str): Requested path, for log messages
+            size (int): Size in bytes
+            mtime (float): Modification time, for Last-Modified
+            etag (str): Quoted entity tag
+            mime_type (str): Content type, None if unknown
+            read_range (callable): Yields the body of (start, length) in chunks
+            send_body (bool): False for HEAD requests
+        """
+        mime_type = mime_type or "application/octet-stream"
+        if self._not_modified(etag, mtime):
+            self.send_response(304)
+            self._send_file_headers(etag, mtime)
+            self.end_headers()
+            return
+
+        byte_range = self._parse_range(size, etag)
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self._send_file_headers(etag, mtime)
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+        if byte_range:
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", mime_type)
+        self.send_header("Content-Length", str(length))
+        # Browsers ignore the download attribute on cross-origin links
+        download_name = parse_qs(urlsplit(self.path).query).get("download")
+        if download_name:
+            self.send_header("Content-Disposition",
+                             f"attachment; filename*=UTF-8''{quote(download_name[0])}")
+        self._send_file_headers(etag, mtime)
+        self.end_headers()
+
+        if not send_body:
+            return
+        try:
+            for data in read_range(start, length):
+                self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug(f"Listener disconnected from {url_path}")
+
+    def _send_file_headers(self, etag, mtime):
+        """Validators and caching headers shared by every file response"""
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", f"public, max-age={MEDIA_CACHE_MAX_AGE}")
+        self.send_header("Access-Control-Allow-Origin", "*")
+
+    def _serve_stream(self, stream_id):
+        """Send a live stream with chunked transfer encoding as it is produced"""
+        with _streams_lock:
+            stream = _streams.get(stream_id)
+        if stream is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", stream.mime_type)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        offset = 0
+        try:
+            while True:
+                data, ended = stream.read_from(offset)
+                if data:
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                    offset += len(data)
+                elif ended:
+                    break
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Listener disconnected from stream {stream_id}")
+
+
+def ensure_media_server():
+    """
+    Start the media server in a background thread (once per process)
+
+    Returns:
+        bool: True if the server is running
+    """
+    global _server, _server_failed
+    if not MEDIA_SERVER_ENABLED or _server_failed:
+        return False
+
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(
+                    (MEDIA_SERVER_HOST, MEDIA_SERVER_PORT), MediaRequestHandler)
+            except OSError as e:
+                # Don't retry on every Streamlit rerun
+                _server_failed = True
+                logger.warning(f"Could not start media server: {str(e)}")
+                return False
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever,
+                             name="media-server", daemon=True).start()
+            logger.info(
+                f"Media server listening on {MEDIA_SERVER_HOST}:{MEDIA_SERVER_PORT}")
+    return True
+
+
+def media_base_url():
+    """Public base URL of the media server, or None to derive it in the browser"""
+    return MEDIA_PUBLIC_URL or None
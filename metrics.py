@@ -0,0 +1,210 @@
+import time
+import uuid
+import bisect
+import logging
+import threading
+import contextvars
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+from config import METRICS_WINDOW, METRICS_TRACES
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("metrics")
+
+# Pipeline stages in the order a request goes through them
+STAGES = ["device_open", "capture", "wav_write", "asr_encode", "asr_upload", "asr_response",
+          "transform_first_sentence", "transform", "tts_first_byte", "tts_complete", "ui_render"]
+
+# Upper bounds of the Prometheus histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Request the code currently running belongs to, shared by all of its stages
+_current_request = contextvars.ContextVar("metrics_request", default=None)
+
+
+def start_request(request_id=None):
+    """
+    Attribute the stages timed from the current context to a request
+
+    Args:
+        request_id (str, optional): ID to use, e.g. a job ID; a new one is made if omitted
+
+    Returns:
+        str: The request ID
+    """
+    request_id = request_id or uuid.uuid4().hex[:12]
+    _current_request.set(request_id)
+    return request_id
+
+
+def current_request():
+    """Get the request ID of the current context, or None"""
+    return _current_request.get()
+
+
+class LatencyHistogram:
+    """
+    Latency distribution of one stage.
+
+    Keeps cumulative Prometheus buckets since startup and the most recent
+    `window` observations for rolling percentiles.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def percentiles(self):
+        """Nearest-rank percentiles of the recent observations, or None if there are none"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return {quantile: ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+                for quantile in QUANTILES}
+
+
+_histograms = {}
+_traces = OrderedDict()  # request ID -> [(stage, seconds)], oldest first
+_lock = threading.Lock()
+
+
+def observe(stage, seconds, request_id=None):
+    """
+    Record how long a stage took
+
+    Args:
+        stage (str): Stage name, see STAGES
+        seconds (float): Duration
+        request_id (str, optional): Request the stage belongs to, defaults to
+            the current context's
+    """
+    if request_id is None:
+        request_id = _current_request.get()
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = LatencyHistogram()
+        histogram.observe(seconds)
+
+        if request_id is not None:
+            if request_id not in _traces:
+                _traces[request_id] = []
+                while len(_traces) > METRICS_TRACES:
+                    _traces.popitem(last=False)
+            _traces[request_id].append((stage, seconds))
+    # Per-observation lines would flood the logs; the histograms and /metrics carry the data
+    logger.debug(f"[{request_id or '-'}] {stage} took {seconds * 1000:.0f} ms")
+
+
+@contextmanager
+def timed_stage(stage):
+    """Time the block as a stage of the current request (failed runs are recorded too)"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start_time)
+
+
+class HTTPStageTimer:
+    """
+    Split an httpx request into an upload stage (connecting and sending the
+    body) and a response stage (waiting for and reading the answer), using
+    httpcore's trace extension.
+
+    Create it right before the request, pass `extensions={"trace": timer.trace}`
+    to the async client and call record() once the response has been read.
+    """
+
+    def __init__(self, upload_stage, response_stage):
+        self.upload_stage = upload_stage
+        self.response_stage = response_stage
+        self.started_at = time.perf_counter()
+        self.sent_at = None
+
+    async def trace(self, event_name, info):
+        if event_name.endswith("send_request_body.complete"):
+            self.sent_at = time.perf_counter()
+
+    def record(self):
+        """Record both stages; nothing is recorded if the body was never sent"""
+        if self.sent_at is None:
+            return
+        observe(self.upload_stage, self.sent_at - self.started_at)
+        observe(self.response_stage, time.perf_counter() - self.sent_at)
+
+
+def stage_summary():
+    """
+    Get the rolling percentiles of every stage seen so far
+
+    Returns:
+        list: Dicts with stage, count, p50, p95, p99 and mean (seconds), in pipeline order
+    """
+    with _lock:
+        summary = []
+        for stage, histogram in sorted(_histograms.items(), key=lambda item: _stage_order(item[0])):
+            percentiles = histogram.percentiles()
+            summary.append({
+                "stage": stage,
+                "count": histogram.count,
+                "p50": percentiles[0.5],
+                "p95": percentiles[0.95],
+                "p99": percentiles[0.99],
+                "mean": histogram.sum / histogram.count
+            })
+        return summary
+
+
+def recent_traces(limit=10):
+    """Get the stage timings of the most recent requests, newest first"""
+    with _lock:
+        return [{"request_id": request_id, "stages": list(stages)}
+                for request_id, stages in reversed(list(_traces.items())[-limit:])]
+
+
+def _stage_order(stage):
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+
+def _format_float(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def prometheus_text():
+    """Render all stage histograms in the Prometheus text exposition format"""
+    lines = [
+        "# HELP voice_stage_seconds Latency of each voice pipeline stage.",
+        "# TYPE voice_stage_seconds histogram"
+    ]
+    rolling = [
+        f"# HELP voice_stage_rolling_seconds Percentiles of the last {METRICS_WINDOW} observations per stage.",
+        "# TYPE voice_stage_rolling_seconds gauge"
+    ]
+    with _lock:
+        for stage, histogram in sorted(_histograms.items(), key=lambda item: _stage_order(item[0])):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), histogram.bucket_counts):
+                cumulative += count
+                lines.append(
+                    f'voice_stage_seconds_bucket{{stage="{stage}",le="{_format_float(bound)}"}} {cumulative}')
+            lines.append(f'voice_stage_seconds_sum{{stage="{stage}"}} {_format_float(histogram.sum)}')
+            lines.append(f'voice_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            for quantile, seconds in (histogram.percentiles() or {}).items():
+                rolling.append(
+                    f'voice_stage_rolling_seconds{{stage="{stage}",quantile="{quantile}"}} {_format_float(seconds)}')
+    return "\n".join(lines + rolling) + "\n"
@@ -0,0 +1,288 @@
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("mock_apis")
+
+ASR_PATH = "/v1/asr"
+TTS_PATH = "/v1/tts"
+CHAT_PATH = "/v1/chat/completions"
+
+# What the mock "celebrity" says; sentences are streamed word by word
+CHAT_REPLY = ("Believe me, this is tremendous. Nobody has ever said it better, many people are telling me. "
+              "We are going to make it huge, the best ever!")
+ASR_TRANSCRIPT = "This is a recording made for the load test, please say it like a celebrity."
+
+
+class LatencyProfile:
+    """Log-normal latency distribution given by its median and 99th percentile (seconds)"""
+
+    def __init__(self, median, p99=None):
+        self.median = median
+        self.p99 = p99 if p99 is not None else median
+        # ln(p99 / median) = 2.326 sigma for a log-normal distribution
+        self.sigma = math.log(self.p99 / self.median) / 2.326 if self.median > 0 and self.p99 > self.median else 0.0
+
+    @classmethod
+    def parse(cls, value):
+        """Parse "median" or "median,p99" (seconds)"""
+        parts = [float(part) for part in value.split(",")]
+        return cls(*parts[:2])
+
+    def sample(self):
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.sigma)
+
+    def to_dict(self):
+        return {"median": self.median, "p99": self.p99}
+
+
+class EndpointProfile:
+    """How a mock endpoint behaves"""
+
+    def __init__(self, latency, error_rate=0.0, rate_limit_rate=0.0, chunk_delay=0.0):
+        """
+        Args:
+            latency (LatencyProfile): Time until the response (first byte when streaming)
+            error_rate (float): Share of requests answered with a 500
+            rate_limit_rate (float): Share of requests answered with a 429
+            chunk_delay (float): Seconds between streamed chunks (audio chunks or tokens)
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.chunk_delay = chunk_delay
+
+    def outcome(self):
+        """Pick how to answer the next request: "ok", "error" or "rate_limited" """
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+    def to_dict(self):
+        return {"latency": self.latency.to_dict(), "error_rate": self.error_rate,
+                "rate_limit_rate": self.rate_limit_rate, "chunk_delay": self.chunk_delay}
+
+
+def default_profiles(error_rate=0.0, rate_limit_rate=0.0):
+    """Latencies in the range of the real APIs"""
+    return {
+        "asr": EndpointProfile(LatencyProfile(0.8, 2.5), error_rate, rate_limit_rate),
+        "tts": EndpointProfile(LatencyProfile(0.6, 2.0), error_rate, rate_limit_rate, chunk_delay=0.05),
+        "chat": EndpointProfile(LatencyProfile(0.5, 1.5), error_rate, rate_limit_rate, chunk_delay=0.03)
+    }
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Answers like Fish Audio ASR/TTS and the OpenAI chat completions endpoint"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        path = urlsplit(self.path).path
+        routes = {ASR_PATH: ("asr", self._asr), TTS_PATH: ("tts", self._tts),
+                  CHAT_PATH: ("chat", self._chat)}
+        if path not in routes:
+            self.send_error(404)
+            return
+
+        endpoint, handler = routes[path]
+        profile = self.server.profiles[endpoint]
+        outcome = profile.outcome()
+        self.server.count(endpoint, outcome)
+        if outcome == "rate_limited":
+            self._send_json(429, {"error": "rate limited"}, {"Retry-After": "1"})
+        elif outcome == "error":
+            time.sleep(profile.latency.sample())
+            self._send_json(500, {"error": "mock failure"})
+        else:
+            handler(body, profile)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("latin-1") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _asr(self, body, profile):
+        time.sleep(profile.latency.sample())
+        self._send_json(200, {"text": ASR_TRANSCRIPT, "duration": len(body) / 32000, "segments": []})
+
+    def _tts(self, body, profile):
+        text = json.loads(body).get("text", "")
+        time.sleep(profile.latency.sample())
+        self._start_chunked("audio/mpeg")
+        # Roughly 1 KB of MP3 per 20 characters, in 1 KB chunks
+        for index in range(max(2, len(text) // 20)):
+            if index:
+                time.sleep(profile.chunk_delay)
+            self._write_chunk(b"\xff\xfb" + bytes(1022))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chat(self, body, profile):
+        request = json.loads(body)
+        model = request.get("model", "gpt-4")
+        time.sleep(profile.latency.sample())
+        if not request.get("stream"):
+            time.sleep(profile.chunk_delay * len(CHAT_REPLY.split()))
+            self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": CHAT_REPLY}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+            return
+
+        self._start_chunked("text/event-stream")
+        words = CHAT_REPLY.split(" ")
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(profile.chunk_delay)
+            self._write_event({"content": word if index == 0 else " " + word}, model)
+        self._write_event({}, model, finish_reason="stop")
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_event(self, delta, model, finish_reason=None):
+        event = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Fish Audio and OpenAI APIs with configurable
+    latency, streaming speed, errors and rate limits, so the pipeline can be
+    load tested without spending API credits.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, profiles=None, host="127.0.0.1", port=0):
+        """
+        Args:
+            profiles (dict, optional): EndpointProfile for "asr", "tts" and "chat"
+            host (str): Interface to listen on
+            port (int): Port to listen on, 0 picks a free one
+        """
+        super().__init__((host, port), MockRequestHandler)
+        self.profiles = profiles or default_profiles()
+        self._counts = {endpoint: Counter() for endpoint in self.profiles}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count(self, endpoint, outcome):
+        with self._lock:
+            self._counts[endpoint][outcome] += 1
+
+    def stats(self):
+        """Get the number of requests per endpoint and outcome"""
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._counts.items()}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self):
+        """Environment variables that point the app's API clients at this server"""
+        return {
+            "FISH_AUDIO_API_URL": self.base_url + TTS_PATH,
+            "FISH_AUDIO_ASR_URL": self.base_url + ASR_PATH,
+            "OPENAI_BASE_URL": self.base_url + "/v1"
+        }
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-apis", daemon=True)
+        self._thread.start()
+        logger.info(f"Mock APIs listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def add_profile_arguments(parser):
+    """Add the command line options describing the mock endpoints"""
+    parser.add_argument("--asr-latency", type=LatencyProfile.parse, default=LatencyProfile(0.8, 2.5),
+                        help="ASR response time as median[,p99] seconds (default 0.8,2.5)")
+    parser.add_argument("--tts-latency", type=LatencyProfile.parse, default=LatencyProfile(0.6, 2.0),
+                        help="TTS time to first byte as median[,p99] seconds (default 0.6,2.0)")
+    parser.add_argument("--chat-latency", type=LatencyProfile.parse, default=LatencyProfile(0.5, 1.5),
+                        help="OpenAI time to first token as median[,p99] seconds (default 0.5,1.5)")
+    parser.add_argument("--tts-chunk-delay", type=float, default=0.05,
+                        help="Seconds between streamed TTS audio chunks")
+    parser.add_argument("--token-delay", type=float, default=0.03,
+                        help="Seconds between streamed OpenAI tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Share of requests answered with a 429")
+
+
+def profiles_from_arguments(args):
+    """Build the endpoint profiles from parsed add_profile_arguments() options"""
+    return {
+        "asr": EndpointProfile(args.asr_latency, args.error_rate, args.rate_limit_rate),
+        "tts": EndpointProfile(args.tts_latency, args.error_rate, args.rate_limit_rate, args.tts_chunk_delay),
+        "chat": EndpointProfile(args.chat_latency, args.error_rate, args.rate_limit_rate, args.token_delay)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run local stand-ins for the Fish Audio and OpenAI APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockAPIServer(profiles_from_arguments(args), args.host, args.port)
+    print("Point the app at the mocks with:")
+    for name, value in server.environment().items():
+        print(f"  export {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
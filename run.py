@@ -3,6 +3,7 @@ import sys
 import subprocess
 import logging
 from tunnel import setup_ngrok, cleanup_tunnels
+from config import MEDIA_SERVER_PORT
 import atexit
 
 # Configure logging
@@ -26,6 +27,9 @@ def run_app():
         # Default Streamlit port
         port = 8501
 
+        # Environment for the Streamlit process
+        env = os.environ.copy()
+
         # Try to set up ngrok tunnel, but don't fail if it doesn't work
         try:
             tunnel_url = setup_ngrok(port)
@@ -50,6 +54,12 @@ def run_app():
                     "2. If on a corporate network, try a personal network")
                 logger.info("3. Make sure your firewall allows the connection")
                 logger.info("-" * 70)
+
+                # Tunnel the media server too, so remote browsers can stream audio
+                media_url = setup_ngrok(MEDIA_SERVER_PORT)
+                if media_url:
+                    env["MEDIA_PUBLIC_URL"] = media_url
+                    logger.info(f"Media URL: {media_url}")
         except Exception as e:
             logger.warning(f"Remote access (ngrok) not available: {str(e)}")
             logger.info(f"Local access only at: http://localhost:{port}")
@@ -57,7 +67,7 @@ def run_app():
         # Start Streamlit
         logger.info("Starting the application...")
         streamlit_cmd = [sys.executable, "-m", "streamlit", "run", "app.py"]
-        process = subprocess.run(streamlit_cmd)
+        process = subprocess.run(streamlit_cmd, env=env)
 
         # Cleanup when the app is closed
         cleanup()
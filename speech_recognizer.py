@@ -1,13 +1,23 @@
-import os
-import logging
-import httpx
+import io
+import json
+import math
+import time
+import wave
 import asyncio
+import hashlib
+import logging
+import numpy as np
 from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv
-from contextlib import asynccontextmanager
 
-from config import FISH_AUDIO_API_KEY
+from config import (FISH_AUDIO_API_KEY, FISH_AUDIO_ASR_URL, ASR_CACHE_ENABLED, ASR_CACHE_DIR, ASR_CACHE_MAX_BYTES,
+                    ASR_CACHE_TTL, ASR_UPLOAD_SAMPLE_RATE, ASR_UPLOAD_CODEC, ASR_UPLOAD_OPUS_BITRATE)
+from http_client import get_httpx_client, run_async
+from disk_cache import DiskCache, make_cache_key
+from audio_buffer import AudioBuffer
+from admission import admission, report_rate_limited
+from metrics import timed_stage, HTTPStageTimer
 
 # Configure logger
 logging.basicConfig(level=logging.INFO,
@@ -15,7 +25,7 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger("speech_recognizer")
 
 # Fish Audio ASR API endpoint
-ASR_API_URL = "https://api.fish.audio/v1/asr"
+ASR_API_URL = FISH_AUDIO_ASR_URL
 
 
 class TextSegment(BaseModel):
@@ -39,14 +49,154 @@ class ASRRequest(BaseModel):
     ignore_timestamps: bool = True
 
 
-@asynccontextmanager
-async def get_httpx_client(timeout=60.0):
-    """Context manager for httpx client"""
-    client = httpx.AsyncClient(timeout=timeout)
+def audio_content_hash(audio_data):
+    """
+    Hash the PCM content of a WAV file so identical audio maps to the same key
+    regardless of header differences. Non-WAV data is hashed as-is.
+
+    Args:
+        audio_data (bytes or AudioBuffer): Contents of the audio file
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    if isinstance(audio_data, AudioBuffer):
+        digest = hashlib.sha256(
+            f"{audio_data.channels}:{audio_data.sample_width}:{audio_data.sample_rate}:".encode())
+        digest.update(audio_data.pcm)
+        return digest.hexdigest()
+
+    try:
+        with wave.open(io.BytesIO(audio_data), 'rb') as wf:
+            digest = hashlib.sha256(
+                f"{wf.getnchannels()}:{wf.getsampwidth()}:{wf.getframerate()}:".encode())
+            digest.update(wf.readframes(wf.getnframes()))
+            return digest.hexdigest()
+    except (wave.Error, EOFError):
+        return hashlib.sha256(audio_data).hexdigest()
+
+
+def load_audio(audio):
+    """
+    Get the WAV bytes for a recording without copying in-memory buffers
+
+    Args:
+        audio (str, bytes or AudioBuffer): Path to a WAV file, the file's contents
+            or an in-memory recording
+
+    Returns:
+        tuple: (audio data, description for log messages)
+    """
+    if isinstance(audio, AudioBuffer):
+        return audio, "in-memory recording"
+    if isinstance(audio, (bytes, bytearray)):
+        return bytes(audio), f"uploaded audio ({len(audio)} bytes)"
+
+    with open(audio, 'rb') as f:
+        return f.read(), audio
+
+
+def _read_pcm(audio_data):
+    """Get int16 samples shaped (frames, channels) and the sample rate of a WAV"""
+    if isinstance(audio_data, AudioBuffer):
+        if audio_data.sample_width != 2:
+            raise ValueError("Only 16-bit PCM audio can be resampled")
+        return audio_data.samples().reshape(-1, audio_data.channels), audio_data.sample_rate
+
+    with wave.open(io.BytesIO(audio_data), 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM audio can be resampled")
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        return samples.reshape(-1, wf.getnchannels()), wf.getframerate()
+
+
+def resample_for_asr(samples, source_rate, target_rate):
+    """
+    Downmix to mono and downsample with a polyphase filter
+
+    Args:
+        samples (np.ndarray): int16 samples shaped (frames, channels)
+        source_rate (int): Sample rate of the input
+        target_rate (int): Desired sample rate; audio is never upsampled
+
+    Returns:
+        tuple: (mono int16 samples, sample rate)
+    """
+    mono = samples.mean(axis=1, dtype=np.float32)
+    rate = source_rate
+    if target_rate and source_rate > target_rate:
+        from scipy.signal import resample_poly  # Import here, scipy is slow to load
+        divisor = math.gcd(source_rate, target_rate)
+        mono = resample_poly(mono, target_rate // divisor,
+                             source_rate // divisor)
+        rate = target_rate
+    return np.clip(np.rint(mono), -32768, 32767).astype(np.int16), rate
+
+
+def _encode_flac(pcm, sample_rate):
+    """Encode mono 16-bit PCM as FLAC using the SpeechRecognition flac converter"""
+    import speech_recognition as sr  # Import here to keep it optional for this module
+    return sr.AudioData(pcm, sample_rate, 2).get_flac_data()
+
+
+def _encode_opus(pcm, sample_rate):
+    """Encode mono 16-bit PCM as Ogg/Opus through pydub and ffmpeg"""
+    from pydub import AudioSegment  # Import here to keep it optional for this module
+    output = io.BytesIO()
+    AudioSegment(data=pcm, sample_width=2, frame_rate=sample_rate, channels=1).export(
+        output, format="opus", bitrate=ASR_UPLOAD_OPUS_BITRATE)
+    return output.getvalue()
+
+
+ASR_ENCODERS = {
+    "flac": _encode_flac,
+    "opus": _encode_opus,
+}
+
+
+def prepare_asr_upload(audio_data, sample_rate=ASR_UPLOAD_SAMPLE_RATE, codec=ASR_UPLOAD_CODEC):
+    """
+    Downsample and compress audio before uploading it for recognition. Falls
+    back to a raw PCM WAV when the codec isn't available.
+
+    Args:
+        audio_data (bytes or AudioBuffer): WAV audio
+        sample_rate (int): Target sample rate, 0 to keep the original
+        codec (str): "flac", "opus" or "wav"
+
+    Returns:
+        tuple: (payload bytes, name of the format actually used)
+    """
     try:
-        yield client
-    finally:
-        await client.aclose()
+        samples, rate = _read_pcm(audio_data)
+        pcm, rate = resample_for_asr(samples, rate, sample_rate)
+    except (wave.Error, EOFError, ValueError) as e:
+        logger.warning(f"Uploading audio unchanged, could not decode it: {str(e)}")
+        original = audio_data.wav if isinstance(
+            audio_data, AudioBuffer) else audio_data
+        return original, "original"
+
+    pcm_bytes = pcm.tobytes()
+    encoder = ASR_ENCODERS.get(codec)
+    if encoder is not None:
+        try:
+            return encoder(pcm_bytes, rate), codec
+        except Exception as e:
+            logger.warning(
+                f"{codec} encoding unavailable ({str(e)}), uploading raw PCM")
+
+    buffer = AudioBuffer(rate, 1, 2, capacity=len(pcm_bytes))
+    buffer.append(pcm_bytes)
+    return buffer.wav, "wav"
+
+
+def asr_cache_key(content_hash, language, ignore_timestamps):
+    """Build the ASR cache key for a piece of audio and request options"""
+    return make_cache_key({
+        "audio": content_hash,
+        "language": language,
+        "ignore_timestamps": ignore_timestamps
+    })
 
 
 class SpeechRecognizer:
@@ -54,78 +204,58 @@ class SpeechRecognizer:
         """Initialize the Fish Audio ASR client"""
         self.api_key = FISH_AUDIO_API_KEY
         load_dotenv()  # Make sure environment variables are loaded
+        self.cache = DiskCache(ASR_CACHE_DIR, ASR_CACHE_MAX_BYTES, ttl=ASR_CACHE_TTL,
+                               name="asr_cache") if ASR_CACHE_ENABLED else None
+
+    def get_cache_stats(self):
+        """Get hit/miss statistics for the ASR cache, or None if disabled"""
+        return self.cache.stats() if self.cache else None
 
-    def transcribe_audio(self, audio_file_path, language=None):
+    def transcribe_audio(self, audio, language=None):
         """
         Transcribe audio file using Fish Audio's Speech-to-Text API
 
         Args:
-            audio_file_path (str): Path to the audio file
+            audio (str, bytes or AudioBuffer): Path to the audio file, its contents or an in-memory recording
             language (str, optional): Language code (e.g., 'en' for English)
 
         Returns:
             str: Transcribed text
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self.transcribe_audio_async(audio_file_path, language))
-        finally:
-            loop.close()
+        return run_async(self.transcribe_audio_async(audio, language))
 
-    async def transcribe_audio_async(self, audio_file_path, language=None):
+    async def transcribe_audio_async(self, audio, language=None):
         """
         Asynchronously transcribe audio using Fish Audio's Speech-to-Text API
 
         Args:
-            audio_file_path (str): Path to the audio file
+            audio (str, bytes or AudioBuffer): Path to the audio file, its contents or an in-memory recording
             language (str, optional): Language code (e.g., 'en' for English)
 
         Returns:
             str: Transcribed text
         """
-        # Read audio file
-        with open(audio_file_path, 'rb') as f:
-            audio_data = f.read()
+        audio_data, source = load_audio(audio)
 
-        # Create request
-        request = ASRRequest(
-            audio=audio_data,
-            language=language,
-            ignore_timestamps=True  # Set to False for precise timestamps
-        )
-
-        # Set headers
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/msgpack'
-        }
+        # A timestamped result also contains the plain text, so either entry will do
+        content_hash = audio_content_hash(audio_data)
+        cached = (self._cache_lookup(content_hash, language, True)
+                  or self._cache_lookup(content_hash, language, False))
+        if cached is not None:
+            logger.info(f"ASR cache hit for file: {source}")
+            return cached.text
 
         try:
-            # Use httpx to make the API request
             logger.info(
-                f"Making Fish Audio ASR API request for file: {audio_file_path}")
-
-            import ormsgpack  # Import here to avoid issues if not installed
-
-            async with get_httpx_client() as client:
-                response = await client.post(
-                    ASR_API_URL,
-                    headers=headers,
-                    content=ormsgpack.packb(request.model_dump(
-                        exclude={'audio'}) | {'audio': audio_data}),
-                )
-
-                # Check response status
-                response.raise_for_status()
-
-                # Parse response
-                result = response.json()
-                logger.info(
-                    f"Successfully transcribed audio, duration: {result.get('duration', 0)} seconds")
+                f"Making Fish Audio ASR API request for file: {source}")
+            result = await self._request_asr(audio_data, language,
+                                             ignore_timestamps=True)
+            logger.info(
+                f"Successfully transcribed audio, duration: {result.duration} seconds")
+            self._cache_store(content_hash, language, True, result)
 
-                # Return just the transcribed text
-                return result.get('text', '')
+            # Return just the transcribed text
+            return result.text
 
         except Exception as e:
             logger.error(
@@ -133,44 +263,79 @@ class SpeechRecognizer:
             # If we failed to transcribe, return an empty string
             return ""
 
-    def get_segments(self, audio_file_path, language=None):
+    def get_segments(self, audio, language=None):
         """
         Get detailed segments with timestamps from the audio
 
         Args:
-            audio_file_path (str): Path to the audio file
+            audio (str, bytes or AudioBuffer): Path to the audio file, its contents or an in-memory recording
             language (str, optional): Language code (e.g., 'en' for English)
 
         Returns:
             List[TextSegment]: List of text segments with timestamps
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self.get_segments_async(audio_file_path, language))
-        finally:
-            loop.close()
+        return run_async(self.get_segments_async(audio, language))
 
-    async def get_segments_async(self, audio_file_path, language=None):
+    async def get_segments_async(self, audio, language=None):
         """
         Asynchronously get detailed segments with timestamps from the audio
 
         Args:
-            audio_file_path (str): Path to the audio file
+            audio (str, bytes or AudioBuffer): Path to the audio file, its contents or an in-memory recording
             language (str, optional): Language code (e.g., 'en' for English)
 
         Returns:
             List[TextSegment]: List of text segments with timestamps
         """
-        # Read audio file
-        with open(audio_file_path, 'rb') as f:
-            audio_data = f.read()
+        audio_data, source = load_audio(audio)
+
+        content_hash = audio_content_hash(audio_data)
+        cached = self._cache_lookup(content_hash, language, False)
+        if cached is not None:
+            logger.info(f"ASR cache hit for segments: {source}")
+            return cached.segments
+
+        try:
+            logger.info(
+                f"Making Fish Audio ASR API request for segments: {source}")
+            # Request precise timestamps
+            result = await self._request_asr(audio_data, language,
+                                             ignore_timestamps=False)
+            logger.info(
+                f"Successfully retrieved {len(result.segments)} segments")
+            self._cache_store(content_hash, language, False, result)
+            return result.segments
+
+        except Exception as e:
+            logger.error(
+                f"Error getting segments with Fish Audio API: {str(e)}")
+            # If we failed, return an empty list
+            return []
+
+    async def _request_asr(self, audio_data, language, ignore_timestamps):
+        """
+        Send audio to the Fish Audio ASR endpoint
 
-        # Create request with ignore_timestamps=False for detailed segments
-        request = ASRRequest(
-            audio=audio_data,
+        Args:
+            audio_data (bytes or AudioBuffer): Contents of the audio file
+            language (str, optional): Language code
+            ignore_timestamps (bool): Whether to skip precise segment timestamps
+
+        Returns:
+            ASRResponse: The parsed response
+        """
+        # Downsample and compress off the event loop
+        original_size = len(audio_data)
+        with timed_stage("asr_encode"):
+            audio_payload, upload_format = await asyncio.get_running_loop().run_in_executor(
+                None, prepare_asr_upload, audio_data)
+        upload_size = len(audio_payload)
+
+        # model_construct skips validation, which would copy the audio buffer
+        request = ASRRequest.model_construct(
+            audio=audio_payload,
             language=language,
-            ignore_timestamps=False  # Get precise timestamps
+            ignore_timestamps=ignore_timestamps
         )
 
         # Set headers
@@ -179,34 +344,66 @@ class SpeechRecognizer:
             'Content-Type': 'application/msgpack'
         }
 
-        try:
-            # Use httpx to make the API request
+        import ormsgpack  # Import here to avoid issues if not installed
+
+        async with get_httpx_client() as client, admission("fish_audio"):
+            start_time = time.time()
+            upload_timer = HTTPStageTimer("asr_upload", "asr_response")
+            response = await client.post(
+                ASR_API_URL,
+                headers=headers,
+                content=ormsgpack.packb(request.model_dump(
+                    exclude={'audio'}) | {'audio': audio_payload}),
+                extensions={"trace": upload_timer.trace}
+            )
+            duration = time.time() - start_time
+            upload_timer.record()
+            if response.status_code == 429:
+                report_rate_limited(
+                    "fish_audio", response.headers.get("Retry-After"))
+
+            saved = original_size - upload_size
             logger.info(
-                f"Making Fish Audio ASR API request for segments: {audio_file_path}")
-
-            import ormsgpack  # Import here to avoid issues if not installed
-
-            async with get_httpx_client() as client:
-                response = await client.post(
-                    ASR_API_URL,
-                    headers=headers,
-                    content=ormsgpack.packb(request.model_dump(
-                        exclude={'audio'}) | {'audio': audio_data}),
-                )
-
-                # Check response status
-                response.raise_for_status()
-
-                # Parse response
-                result = response.json()
-                segments = [TextSegment(**segment)
-                            for segment in result.get('segments', [])]
-
-                logger.info(f"Successfully retrieved {len(segments)} segments")
-                return segments
-
-        except Exception as e:
-            logger.error(
-                f"Error getting segments with Fish Audio API: {str(e)}")
-            # If we failed, return an empty list
-            return []
+                f"ASR upload: {upload_size / 1024:.1f} KB as {upload_format} "
+                f"(saved {saved / 1024:.1f} KB, {saved / max(original_size, 1):.0%}), "
+                f"request completed in {duration:.2f} seconds")
+
+            # Check response status
+            response.raise_for_status()
+
+            # Parse response
+            result = response.json()
+            return ASRResponse(
+                text=result.get('text', ''),
+                duration=result.get('duration', 0),
+                segments=[TextSegment(**segment)
+                          for segment in result.get('segments', [])]
+            )
+
+    def _cache_lookup(self, content_hash, language, ignore_timestamps):
+        """Load a cached ASRResponse, or None on a miss"""
+        if self.cache is None:
+            return None
+        path = self.cache.get(asr_cache_key(
+            content_hash, language, ignore_timestamps))
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return ASRResponse(**json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable ASR cache entry: {str(e)}")
+            return None
+
+    def _cache_store(self, content_hash, language, ignore_timestamps, result):
+        """Persist an ASRResponse; empty transcripts are not cached"""
+        if self.cache is None or not result.text:
+            return
+        try:
+            self.cache.put_bytes(
+                asr_cache_key(content_hash, language, ignore_timestamps),
+                result.model_dump_json().encode('utf-8'),
+                ".json"
+            )
+        except OSError as e:
+            logger.warning(f"Could not cache ASR result: {str(e)}")
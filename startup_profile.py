@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import subprocess
+from contextlib import contextmanager
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("startup_profile")
+
+# Modules app.py loads, in the order it first needs them
+APP_MODULES = ["config", "utils", "metrics", "http_client", "circuit_breaker", "admission", "jobs", "audio_store", "janitor", "media_server",
+               "device_manager", "audio_processor", "voice_synthesizer", "text_transformer"]
+
+# First measurement of each startup step in this process: name -> timing
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def record_timing(name, kind, seconds):
+    """Record how long a startup step took; only the first measurement is kept"""
+    with _timings_lock:
+        if name not in _timings:
+            _timings[name] = {"name": name, "kind": kind, "seconds": seconds}
+            logger.info(f"Startup {kind} of {name} took {seconds * 1000:.0f} ms")
+
+
+@contextmanager
+def timed(name, kind="init"):
+    """Time the block as a startup step"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, kind, time.perf_counter() - start_time)
+
+
+def startup_report():
+    """Get the startup steps measured in this process, in the order they happened"""
+    with _timings_lock:
+        return [dict(timing) for timing in _timings.values()]
+
+
+def measure_import(module):
+    """
+    Cold-import a module in a fresh interpreter and break down the cost
+
+    Args:
+        module (str): Module name
+
+    Returns:
+        dict: Total import time in seconds and the heaviest direct imports,
+            or an error message if the import failed
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+
+    # Lines look like "import time:   self [us] | cumulative | <indent>name"; a
+    # module is reported after its dependencies, two spaces deeper per level
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((depth, name.strip(), int(cumulative) / 1e6))
+
+    # Walk backwards from the module's own line to collect its direct imports
+    for index in range(len(entries) - 1, -1, -1):
+        depth, name, seconds = entries[index]
+        if name == module:
+            break
+    else:
+        return {"module": module, "seconds": 0.0, "heaviest": []}
+
+    children = []
+    for child_depth, child_name, child_seconds in reversed(entries[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append((child_name, child_seconds))
+    children.sort(key=lambda child: child[1], reverse=True)
+    return {"module": module, "seconds": seconds, "heaviest": children[:3]}
+
+
+def measure_init():
+    """Time creating each app component in this process"""
+    import components
+
+    timings = []
+    for name, getter in components.COMPONENTS.items():
+        start_time = time.perf_counter()
+        try:
+            getter()
+            timings.append({"name": name, "seconds": time.perf_counter() - start_time})
+        except Exception as e:
+            timings.append({"name": name, "error": str(e)})
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report import and initialization cost of the app's modules")
+    parser.add_argument("modules", nargs="*", default=APP_MODULES,
+                        help="Modules to measure (default: the modules app.py uses)")
+    parser.add_argument("--budget", type=float,
+                        help="Fail if the slowest cold import takes longer than this many seconds")
+    parser.add_argument("--init", action="store_true",
+                        help="Also time creating the components (opens audio devices)")
+    args = parser.parse_args()
+
+    print(f"{'Module':<20} {'Import':>9}  Heaviest direct imports")
+    slowest = 0.0
+    for module in args.modules:
+        result = measure_import(module)
+        if "error" in result:
+            print(f"{module:<20} {'failed':>9}  {result['error']}")
+            continue
+        slowest = max(slowest, result["seconds"])
+        heaviest = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in result["heaviest"])
+        print(f"{module:<20} {result['seconds'] * 1000:>6.0f} ms  {heaviest}")
+
+    if args.init:
+        print(f"\n{'Component':<20} {'Init':>9}")
+        for timing in measure_init():
+            if "error" in timing:
+                print(f"{timing['name']:<20} {'failed':>9}  {timing['error']}")
+            else:
+                print(f"{timing['name']:<20} {timing['seconds'] * 1000:>6.0f} ms")
+
+    if args.budget is not None and slowest > args.budget:
+        print(f"\nSlowest import took {slowest:.2f}s, over the {args.budget:.2f}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+
+from config import (SAMPLE_RATE, CHANNELS, CHUNK_SIZE, STREAMING_ASR_PAUSE_SECONDS,
+                    STREAMING_ASR_MIN_SEGMENT_SECONDS, STREAMING_ASR_MAX_SEGMENT_SECONDS)
+from audio_buffer import AudioBuffer
+from http_client import get_event_loop
+from vad import VoiceActivityDetector
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("streaming_asr")
+
+
+class StreamingTranscriber:
+    """
+    Cuts a live stream of PCM chunks into utterances at pauses and transcribes
+    each utterance while recording is still going.
+
+    Chunks are fed from the capture thread with feed(); segmentation and the
+    ASR requests run on the shared background event loop. Transcripts of
+    finished utterances are delivered in order through the async iterator,
+    which must be consumed on that same loop.
+    """
+
+    _END = object()
+
+    def __init__(self, recognizer, language=None, sample_rate=SAMPLE_RATE, channels=CHANNELS,
+                 sample_width=2, pause_seconds=STREAMING_ASR_PAUSE_SECONDS,
+                 min_segment_seconds=STREAMING_ASR_MIN_SEGMENT_SECONDS,
+                 max_segment_seconds=STREAMING_ASR_MAX_SEGMENT_SECONDS):
+        """
+        Args:
+            recognizer (SpeechRecognizer): Recognizer used for each utterance
+            language (str, optional): Language code passed to the recognizer
+            sample_rate (int): Sample rate of the fed chunks
+            channels (int): Channel count of the fed chunks
+            sample_width (int): Bytes per sample of the fed chunks
+            pause_seconds (float): Silence that ends an utterance
+            min_segment_seconds (float): Shorter utterances are merged with the next one
+            max_segment_seconds (float): Utterances are cut at this length regardless of pauses
+        """
+        self.recognizer = recognizer
+        self.language = language
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.pause_seconds = pause_seconds
+        self.min_segment_seconds = min_segment_seconds
+        self.max_segment_seconds = max_segment_seconds
+        self.segments = []  # Transcripts of finished utterances, in order
+        self.failed_segments = 0  # Utterances whose transcription failed or came back empty
+        self.loop = get_event_loop()
+        self._chunks = asyncio.Queue()
+        self._results = asyncio.Queue()
+        self._future = None
+
+    @property
+    def transcript(self):
+        """Transcript of all utterances finished so far"""
+        return " ".join(self.segments)
+
+    @property
+    def complete(self):
+        """Whether every utterance so far was transcribed, i.e. the transcript has no gaps"""
+        return self.failed_segments == 0
+
+    def start(self):
+        """Start the pipeline on the shared event loop"""
+        self._future = asyncio.run_coroutine_threadsafe(self._run(), self.loop)
+        return self
+
+    def feed(self, chunk):
+        """Queue a captured PCM chunk (safe to call from any thread)"""
+        # Copy, since capture chunks are views into a reused ring buffer
+        self.loop.call_soon_threadsafe(self._chunks.put_nowait, bytes(chunk))
+
+    def close(self):
+        """Signal the end of the recording"""
+        self.loop.call_soon_threadsafe(self._chunks.put_nowait, self._END)
+
+    def result(self, timeout=None):
+        """
+        Wait for every utterance to be transcribed
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds
+
+        Returns:
+            str: The full transcript
+        """
+        return self._future.result(timeout)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        text = await self._results.get()
+        if text is self._END:
+            # Leave the marker in place so repeated iteration also stops
+            self._results.put_nowait(self._END)
+            raise StopAsyncIteration
+        return text
+
+    async def _run(self):
+        """Segment incoming chunks and transcribe utterances as they finish"""
+        pending = asyncio.Queue()
+        emitter = asyncio.create_task(self._emit_in_order(pending))
+
+        vad = VoiceActivityDetector(self.sample_rate, CHUNK_SIZE,
+                                    hangover_seconds=self.pause_seconds)
+        max_bytes = int(self.max_segment_seconds * self.sample_rate) * \
+            self.channels * self.sample_width
+        segment = None
+        speech_flags = []
+        silent_run = 0
+        heard_speech = False
+
+        try:
+            while True:
+                chunk = await self._chunks.get()
+                if chunk is self._END:
+                    break
+
+                if segment is None:
+                    segment = AudioBuffer(self.sample_rate, self.channels,
+                                          self.sample_width, capacity=max_bytes)
+                    speech_flags = []
+                segment.append(chunk)
+
+                speech = vad.is_speech(chunk)
+                speech_flags.append(speech)
+                if speech:
+                    heard_speech = True
+                    silent_run = 0
+                else:
+                    silent_run += 1
+
+                paused = silent_run >= vad.hangover_frames and \
+                    segment.duration >= self.min_segment_seconds
+                if heard_speech and (paused or segment.duration >= self.max_segment_seconds):
+                    self._submit(segment, speech_flags, vad, pending)
+                    segment = None
+                    silent_run = 0
+                    heard_speech = False
+
+            if segment is not None and heard_speech:
+                self._submit(segment, speech_flags, vad, pending)
+        finally:
+            pending.put_nowait(None)
+            await emitter
+
+        logger.info(
+            f"Streaming transcription finished with {len(self.segments)} utterances "
+            f"({self.failed_segments} failed)")
+        return self.transcript
+
+    def _submit(self, segment, speech_flags, vad, pending):
+        """Trim an utterance and start transcribing it"""
+        keep = vad.trim(speech_flags)
+        if keep is not None:
+            start, end = keep
+            chunk_bytes = CHUNK_SIZE * segment.frame_bytes
+            segment.trim(start * chunk_bytes,
+                         min(end * chunk_bytes, segment.pcm_length))
+        segment.finalize()
+        logger.info(
+            f"Transcribing utterance of {segment.duration:.2f} seconds while recording")
+        pending.put_nowait(asyncio.create_task(
+            self.recognizer.transcribe_audio_async(segment, self.language)))
+
+    async def _emit_in_order(self, pending):
+        """Publish utterance transcripts in recording order, counting the ones that failed"""
+        index = 1
+        try:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                try:
+                    text = await task
+                except Exception as e:
+                    logger.error(f"Error transcribing utterance {index}: {str(e)}")
+                    text = ""
+                if text:
+                    self.segments.append(text)
+                    await self._results.put(text)
+                else:
+                    # Leaving it out would silently drop part of what was said
+                    self.failed_segments += 1
+                    logger.warning(f"Utterance {index} could not be transcribed")
+                index += 1
+        finally:
+            await self._results.put(self._END)
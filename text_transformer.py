@@ -1,44 +1,247 @@
-import os
-import openai
-from config import OPENAI_API_KEY, CELEBRITIES
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+import unicodedata
+from config import (OPENAI_API_KEY, OPENAI_BASE_URL, CELEBRITIES, TEXT_TRANSFORM_ENABLED, TRANSFORM_STREAMING_ENABLED,
+                    TRANSFORM_CACHE_ENABLED, TRANSFORM_CACHE_PATH, TRANSFORM_CACHE_MAX_ENTRIES,
+                    TRANSFORM_MODEL, TRANSFORM_TEMPERATURE)
+from utils import SENTENCE_END
+from admission import admission, report_rate_limited
+from disk_cache import make_cache_key
+from transform_cache import TransformCache
+from metrics import observe, timed_stage
+
+
+def pop_sentences(buffer):
+    """
+    Split complete sentences off the front of text that is still being generated
+
+    A sentence only counts as complete once whitespace follows its terminal
+    punctuation, so "3." in "3.5" is not cut off while "5" is on its way.
+
+    Args:
+        buffer (str): Text generated so far
+
+    Returns:
+        tuple: (list of complete sentences, remaining incomplete text)
+    """
+    parts = SENTENCE_END.split(buffer)
+    sentences = [part.strip() for part in parts[:-1] if part.strip()]
+    return sentences, parts[-1]
+
+
+def normalize_text(text):
+    """Normalize input text for cache lookups (Unicode form and whitespace)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def all_sentences(text):
+    """Split finished text into sentences"""
+    sentences, rest = pop_sentences(text)
+    return sentences + [rest.strip()] if rest.strip() else sentences
 
 
 class TextTransformer:
     def __init__(self):
-        """Initialize the OpenAI client with API key"""
-        openai.api_key = OPENAI_API_KEY
-        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        """Set up the transformer; the OpenAI client is created on first use"""
+        self._client = None
+        self.cache = TransformCache(TRANSFORM_CACHE_PATH, TRANSFORM_CACHE_MAX_ENTRIES) \
+            if TRANSFORM_CACHE_ENABLED else None
 
-    def transform_text(self, text, celebrity_id):
-        return text
+    @property
+    def client(self):
+        """OpenAI client, created on first use since the openai package is slow to import"""
+        if self._client is None:
+            import openai  # Import here to keep startup fast
+            openai.api_key = OPENAI_API_KEY
+            # No SDK retries: they would bypass admission control and ignore Retry-After
+            self._client = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+        return self._client
+
+    @property
+    def streaming(self):
+        """Whether transform_text_stream generates text (rather than passing it through)"""
+        return TEXT_TRANSFORM_ENABLED and TRANSFORM_STREAMING_ENABLED
+
+    def get_cache_stats(self):
+        """Get hit/miss statistics for the transform cache, or None if disabled"""
+        return self.cache.stats() if self.cache else None
 
+    def cache_key(self, text, celebrity_id):
+        """
+        Build the cache key of a transformation
+
+        The key covers the normalized input, the celebrity, the model settings
+        and a fingerprint of the prompt template, so editing a prompt in
+        _create_prompt invalidates the rewrites made with the old one.
+        """
+        celebrity = CELEBRITIES[celebrity_id]
+        return make_cache_key({
+            "text": normalize_text(text),
+            "celebrity": celebrity_id,
+            "model": TRANSFORM_MODEL,
+            "temperature": TRANSFORM_TEMPERATURE,
+            "prompt": make_cache_key(self._create_messages("{text}", celebrity))
+        })
+
+    def transform_text(self, text, celebrity_id):
         """Transform text to mimic a celebrity's speaking style"""
+        if not TEXT_TRANSFORM_ENABLED:
+            return text
+
         # Get celebrity info
         if celebrity_id not in CELEBRITIES:
             raise ValueError(f"Celebrity {celebrity_id} not found")
 
         celebrity = CELEBRITIES[celebrity_id]
 
-        # Create prompt for OpenAI
-        prompt = self._create_prompt(text, celebrity)
+        cache_key = self.cache_key(text, celebrity_id)
+        if self.cache is not None:
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                return cached_text
 
         # Call OpenAI API
+        import openai  # Import here to keep startup fast
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system",
-                        "content": f"You are {celebrity['name']}. Respond in first person with the speaking style, vocabulary, and mannerisms that {celebrity['name']} would use. IMPORTANT: Always respond in the SAME LANGUAGE as the user's input - if they write in Portuguese, Spanish, or any other language, you must respond in that SAME language."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.7
-            )
-            return response.choices[0].message.content.strip()
+            with timed_stage("transform"), admission("openai"):
+                response = self.client.chat.completions.create(
+                    model=TRANSFORM_MODEL,
+                    messages=self._create_messages(text, celebrity),
+                    max_tokens=300,
+                    temperature=TRANSFORM_TEMPERATURE
+                )
+            transformed_text = response.choices[0].message.content.strip()
+            if self.cache is not None and transformed_text:
+                self.cache.put(cache_key, transformed_text, celebrity_id)
+            return transformed_text
+        except openai.RateLimitError as e:
+            # Hold back other sessions until OpenAI accepts requests again
+            report_rate_limited("openai", e.response.headers.get("retry-after"))
+            print(f"Error calling OpenAI API: {str(e)}")
+            return text
         except Exception as e:
             print(f"Error calling OpenAI API: {str(e)}")
             return text  # Return original text if API call fails
 
+    def transform_text_stream(self, text, celebrity_id):
+        """
+        Transform text like transform_text, yielding each sentence as soon as
+        the model has finished generating it, so synthesis can start on the
+        first sentence while the rest is still being written
+
+        Args:
+            text (str): Text to transform
+            celebrity_id (str): The ID of the celebrity whose style to use
+
+        Yields:
+            str: Sentences of the transformed text, or of the original text when
+                transformation is disabled or fails before producing anything
+        """
+        if not TEXT_TRANSFORM_ENABLED:
+            yield from all_sentences(text)
+            return
+
+        if celebrity_id not in CELEBRITIES:
+            raise ValueError(f"Celebrity {celebrity_id} not found")
+
+        celebrity = CELEBRITIES[celebrity_id]
+
+        cache_key = self.cache_key(text, celebrity_id)
+        if self.cache is not None:
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                yield from all_sentences(cached_text)
+                return
+
+        import openai  # Import here to keep startup fast
+        sentences = queue.Queue()  # Finished sentences, then None
+        stopped = threading.Event()  # Set once the consumer has gone away
+        start_time = time.perf_counter()
+
+        def read_stream():
+            # Read the whole answer on a thread of its own, so the OpenAI slot and the
+            # transform timer are not held while the consumer synthesizes a sentence
+            generated = []
+            buffer = ""
+            produced = False
+
+            def emit(sentence):
+                nonlocal produced
+                if not produced:
+                    observe("transform_first_sentence", time.perf_counter() - start_time)
+                produced = True
+                sentences.put(sentence)
+
+            try:
+                with timed_stage("transform"), admission("openai"):
+                    stream = self.client.chat.completions.create(
+                        model=TRANSFORM_MODEL,
+                        messages=self._create_messages(text, celebrity),
+                        max_tokens=300,
+                        temperature=TRANSFORM_TEMPERATURE,
+                        stream=True
+                    )
+                    try:
+                        for event in stream:
+                            if stopped.is_set():
+                                return
+                            if not event.choices or not event.choices[0].delta.content:
+                                continue
+                            generated.append(event.choices[0].delta.content)
+                            buffer += event.choices[0].delta.content
+                            finished, buffer = pop_sentences(buffer)
+                            for sentence in finished:
+                                emit(sentence)
+                    finally:
+                        stream.close()
+                # Only complete answers are cached
+                transformed_text = "".join(generated).strip()
+                if self.cache is not None and transformed_text:
+                    self.cache.put(cache_key, transformed_text, celebrity_id)
+            except openai.RateLimitError as e:
+                # Hold back other sessions until OpenAI accepts requests again
+                report_rate_limited("openai", e.response.headers.get("retry-after"))
+                print(f"Error calling OpenAI API: {str(e)}")
+            except Exception as e:
+                print(f"Error calling OpenAI API: {str(e)}")
+            finally:
+                # The last sentence has no whitespace after it (or was cut off by an error)
+                if buffer.strip() and not stopped.is_set():
+                    emit(buffer.strip())
+                sentences.put(None)
+
+        # In a copy of this context, so admission and metrics see the same session and request
+        threading.Thread(target=contextvars.copy_context().run, args=(read_stream,),
+                         name="transform-stream", daemon=True).start()
+        produced = False
+        try:
+            while True:
+                sentence = sentences.get()
+                if sentence is None:
+                    break
+                produced = True
+                yield sentence
+        finally:
+            stopped.set()
+        if not produced:
+            yield from all_sentences(text)  # Speak the original text if the API call fails
+
+    async def transform_text_async(self, text, celebrity_id):
+        """Transform text without blocking the event loop"""
+        # to_thread keeps the caller's context, so admission sees the right session
+        return await asyncio.to_thread(self.transform_text, text, celebrity_id)
+
+    def _create_messages(self, text, celebrity):
+        """Create the chat messages for the OpenAI API"""
+        return [
+            {"role": "system",
+                "content": f"You are {celebrity['name']}. Respond in first person with the speaking style, vocabulary, and mannerisms that {celebrity['name']} would use. IMPORTANT: Always respond in the SAME LANGUAGE as the user's input - if they write in Portuguese, Spanish, or any other language, you must respond in that SAME language."},
+            {"role": "user", "content": self._create_prompt(text, celebrity)}
+        ]
+
     def _create_prompt(self, text, celebrity):
         """Create a prompt for the OpenAI API"""
         name = celebrity["name"]
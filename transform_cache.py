@@ -0,0 +1,123 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("transform_cache")
+
+
+class TransformCache:
+    """
+    Persistent LRU cache of text transformations backed by SQLite.
+
+    Each row maps a cache key (see make_cache_key) to the transformed text and
+    records when it was last read, so the LRU order survives restarts. Rows
+    beyond max_entries are evicted least recently used first.
+    """
+
+    def __init__(self, path, max_entries, name="transform_cache"):
+        """
+        Args:
+            path (str): SQLite database file
+            max_entries (int): Maximum number of cached transformations
+            name (str): Name used in log messages
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by all threads, serialized by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS transforms (
+                key TEXT PRIMARY KEY,
+                celebrity TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS transforms_accessed_at ON transforms (accessed_at)")
+        self._db.commit()
+        logger.info(f"[{self.name}] Loaded {self._count()} entries from {path}")
+
+    def _count(self):
+        return self._db.execute("SELECT COUNT(*) FROM transforms").fetchone()[0]
+
+    def get(self, key):
+        """
+        Look up a transformation and mark it as recently used
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            str or None: The transformed text, or None on a miss
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM transforms WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._db.execute(
+                "UPDATE transforms SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, text, celebrity=""):
+        """
+        Store a transformation, evicting the least recently used ones over the cap
+
+        Args:
+            key (str): The cache key
+            text (str): The transformed text
+            celebrity (str): Celebrity ID, kept for inspection
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO transforms (key, celebrity, text, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)", (key, celebrity, text, now, now))
+            excess = self._count() - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM transforms WHERE key IN "
+                    "(SELECT key FROM transforms ORDER BY accessed_at LIMIT ?)", (excess,))
+                self.evictions += excess
+                logger.info(f"[{self.name}] Evicted {excess} entries")
+            self._db.commit()
+
+    def clear(self):
+        """Remove every cached transformation"""
+        with self._lock:
+            self._db.execute("DELETE FROM transforms")
+            self._db.commit()
+
+    def stats(self):
+        """Get hit/miss counters and current cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": self._count(),
+                "max_entries": self.max_entries
+            }
@@ -1,10 +1,17 @@
 import os
+import re
 import time
 import uuid
+import base64
+import threading
 from pathlib import Path
 import wave
 
 
+# Whitespace after terminal punctuation, optionally followed by a closing quote or bracket
+SENTENCE_END = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'”’)\]]))\s+")
+
+
 def generate_unique_filename(directory, extension):
     """Generate a unique filename using timestamp and UUID"""
     timestamp = int(time.time())
@@ -22,15 +29,35 @@ def get_wav_duration(wav_file):
     return duration
 
 
+def audio_data_uri(audio_bytes, mime_type):
+    """Encode audio as a data: URI for inlining into HTML"""
+    return f"data:{mime_type};base64,{base64.b64encode(audio_bytes).decode()}"
+
+
 def ensure_directory_exists(directory):
     """Ensure that a directory exists, create if it doesn't"""
     Path(directory).mkdir(parents=True, exist_ok=True)
 
 
 def cleanup_temp_files(file_path, delay=0):
-    """Delete temporary files after a delay"""
+    """
+    Delete a temporary file, optionally after a delay
+
+    Args:
+        file_path (str): File to delete
+        delay (float): Seconds to wait; the file is then deleted on a timer
+            thread instead of blocking the caller
+
+    Returns:
+        bool: Whether the file was deleted (with a delay: whether it exists to be deleted)
+    """
     if delay > 0:
-        time.sleep(delay)
+        if not os.path.exists(file_path):
+            return False
+        timer = threading.Timer(delay, cleanup_temp_files, args=(file_path,))
+        timer.daemon = True
+        timer.start()
+        return True
 
     if os.path.exists(file_path):
         try:
@@ -0,0 +1,91 @@
+import logging
+import numpy as np
+
+from config import (SAMPLE_RATE, CHUNK_SIZE, VAD_ENERGY_THRESHOLD_DB, VAD_NOISE_MARGIN_DB,
+                    VAD_MAX_ZCR, VAD_HANGOVER_SECONDS, VAD_PADDING_SECONDS)
+
+# Configure logger
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("vad")
+
+
+def frame_features(frame):
+    """
+    Compute the energy and zero-crossing rate of a 16-bit PCM frame
+
+    Args:
+        frame (bytes or np.ndarray): 16-bit mono PCM samples
+
+    Returns:
+        tuple: (level in dBFS, zero-crossing rate in crossings per sample)
+    """
+    samples = np.frombuffer(frame, dtype=np.int16) if isinstance(
+        frame, (bytes, bytearray, memoryview)) else frame
+    if samples.size == 0:
+        return -np.inf, 0.0
+
+    x = samples.astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(x * x))
+    level_db = 20.0 * np.log10(rms + 1e-10)
+    zcr = np.count_nonzero(np.diff(np.signbit(x))) / samples.size
+    return float(level_db), float(zcr)
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing voice activity detector for fixed-size PCM frames.
+
+    A frame counts as speech when its level is above both an absolute
+    threshold and the running noise floor plus a margin, and its zero-crossing
+    rate is low enough to rule out broadband hiss.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_size=CHUNK_SIZE,
+                 energy_threshold_db=VAD_ENERGY_THRESHOLD_DB, noise_margin_db=VAD_NOISE_MARGIN_DB,
+                 max_zcr=VAD_MAX_ZCR, hangover_seconds=VAD_HANGOVER_SECONDS,
+                 padding_seconds=VAD_PADDING_SECONDS):
+        self.energy_threshold_db = energy_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.max_zcr = max_zcr
+        frame_seconds = frame_size / float(sample_rate)
+        self.hangover_frames = max(1, int(round(hangover_seconds / frame_seconds)))
+        self.padding_frames = int(round(padding_seconds / frame_seconds))
+        self.noise_floor_db = energy_threshold_db - noise_margin_db
+
+    def is_speech(self, frame):
+        """
+        Classify a frame and update the noise floor estimate
+
+        Args:
+            frame (bytes or np.ndarray): 16-bit mono PCM samples
+
+        Returns:
+            bool: True if the frame contains speech
+        """
+        level_db, zcr = frame_features(frame)
+        threshold = max(self.energy_threshold_db,
+                        self.noise_floor_db + self.noise_margin_db)
+        speech = level_db > threshold and zcr < self.max_zcr
+        if not speech and np.isfinite(level_db):
+            # Track slow changes in background noise
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * level_db
+        return speech
+
+    def trim(self, speech_flags):
+        """
+        Find the range of frames to keep, dropping leading and trailing silence
+
+        Args:
+            speech_flags (list): Per-frame speech decisions
+
+        Returns:
+            tuple: (start, end) frame indices, or None if no speech was found
+        """
+        flags = np.asarray(speech_flags, dtype=bool)
+        speech_indices = np.flatnonzero(flags)
+        if speech_indices.size == 0:
+            return None
+        start = max(0, speech_indices[0] - self.padding_frames)
+        end = min(flags.size, speech_indices[-1] + 1 + self.padding_frames)
+        return int(start), int(end)
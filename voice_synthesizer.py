@@ -1,17 +1,25 @@
-import os
+import io
 import asyncio
+import threading
+import contextvars
 import logging
 import time
 import random
-import json
-import httpx
-import requests
 from pydantic import BaseModel
-from typing import Dict, Optional, Literal
-from contextlib import asynccontextmanager
-
-from config import FISH_AUDIO_API_KEY, FISH_AUDIO_API_URL, CELEBRITIES, OUTPUT_AUDIO_DIR
-from utils import generate_unique_filename, ensure_directory_exists
+from typing import Dict, Literal
+
+from config import (FISH_AUDIO_API_KEY, FISH_AUDIO_API_URL, CELEBRITIES, OUTPUT_AUDIO_DIR,
+                    TTS_CACHE_ENABLED, TTS_CACHE_MAX_BYTES, TTS_DEADLINE_SECONDS,
+                    TTS_PARALLEL_ENABLED, TTS_PARALLEL_MIN_CHARS, TTS_CHUNK_MAX_CHARS,
+                    TTS_MAX_CONCURRENCY, TTS_CROSSFADE_MS)
+from utils import ensure_directory_exists, SENTENCE_END
+from disk_cache import StoreCache, make_cache_key
+from audio_store import get_audio_store
+from janitor import is_held
+from circuit_breaker import get_breaker, CircuitOpenError
+from admission import admission, report_rate_limited, AdmissionRejectedError
+from http_client import get_httpx_client, get_requests_session, get_event_loop, run_async
+from metrics import observe, timed_stage
 
 # Configure logger
 logging.basicConfig(level=logging.INFO,
@@ -19,6 +27,20 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger("voice_synthesizer")
 
 
+class FishAudioAPIError(Exception):
+    """Raised when Fish Audio answers with a non-200 status"""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"Fish Audio API error: {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after  # Retry-After header of a 429, if any
+
+    @property
+    def retryable(self):
+        """Rate limits and server errors are worth retrying, other client errors are not"""
+        return self.status_code == 429 or self.status_code >= 500
+
+
 class TTSRequest(BaseModel):
     """Model for TTS request to Fish Audio API"""
     text: str
@@ -42,14 +64,118 @@ VOICE_SPEEDS = {
 }
 
 
-@asynccontextmanager
-async def get_httpx_client(timeout=60.0):
-    """Context manager for httpx client"""
-    client = httpx.AsyncClient(timeout=timeout)
+def tts_cache_key(request):
+    """Build the cache key for a TTS request, ignoring insignificant whitespace"""
+    payload = request.model_dump()
+    payload["text"] = " ".join(request.text.split())
+    return make_cache_key(payload)
+
+
+def split_sentences(text, max_chars=TTS_CHUNK_MAX_CHARS):
+    """
+    Split text into chunks at sentence boundaries for parallel synthesis.
+
+    The first sentence is kept on its own so it can be played as early as
+    possible; the following sentences are packed into chunks of up to
+    `max_chars` characters. A single sentence longer than that is not split.
+
+    Args:
+        text (str): Text to split
+        max_chars (int): Soft upper bound on the chunk length
+
+    Returns:
+        list: Non-empty text chunks in order
+    """
+    sentences = [sentence.strip() for sentence in SENTENCE_END.split(text.strip())]
+    sentences = [sentence for sentence in sentences if sentence]
+    if len(sentences) <= 1:
+        return sentences
+
+    chunks = [sentences[0]]
+    current = ""
+    for sentence in sentences[1:]:
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def stitch_audio(chunks, crossfade_ms=0):
+    """
+    Join MP3 chunks in order into one clip
+
+    Args:
+        chunks (list): MP3 audio of the chunks (bytes-like)
+        crossfade_ms (int): Crossfade between chunks through pydub; 0 joins
+            the MP3 frames directly without re-encoding
+
+    Returns:
+        bytes: The joined MP3 audio
+    """
+    if crossfade_ms <= 0:
+        return b"".join(chunks)
+
+    from pydub import AudioSegment  # Import here, only needed for crossfades
+
+    combined = AudioSegment.from_file(io.BytesIO(chunks[0]), format="mp3")
+    for chunk in chunks[1:]:
+        segment = AudioSegment.from_file(io.BytesIO(chunk), format="mp3")
+        combined = combined.append(
+            segment, crossfade=min(crossfade_ms, len(combined), len(segment)))
+    output = io.BytesIO()
+    combined.export(output, format="mp3", bitrate="192k")
+    return output.getvalue()
+
+
+async def iterate_async(items):
+    """Iterate a list as an async iterator"""
+    for item in items:
+        yield item
+
+
+async def iterate_in_thread(iterable):
+    """
+    Consume a blocking iterator on a worker thread, yielding its items on the
+    event loop as they are produced
+
+    The thread runs in a copy of the caller's context (so admission control
+    sees the right session) and stops at the next item once the consumer
+    goes away.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()  # (item, finished, error)
+    stopped = threading.Event()
+
+    def produce():
+        error = None
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(items.put_nowait, (item, False, None))
+        except BaseException as e:
+            error = e
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+        loop.call_soon_threadsafe(items.put_nowait, (None, True, error))
+
+    loop.run_in_executor(None, contextvars.copy_context().run, produce)
     try:
-        yield client
+        while True:
+            item, finished, error = await items.get()
+            if error is not None:
+                raise error
+            if finished:
+                return
+            yield item
     finally:
-        await client.aclose()
+        stopped.set()
 
 
 class VoiceSynthesizer:
@@ -58,26 +184,94 @@ class VoiceSynthesizer:
         self.api_key = FISH_AUDIO_API_KEY
         self.api_url = FISH_AUDIO_API_URL
         ensure_directory_exists(OUTPUT_AUDIO_DIR)
+        # Cached clips are handed out as they are, so each clip is written exactly once;
+        # the cache decides when they go and keeps the ones a session still holds
+        self.cache = StoreCache(get_audio_store("tts_cache"), TTS_CACHE_MAX_BYTES,
+                                name="tts_cache", in_use=is_held) if TTS_CACHE_ENABLED else None
+        self.store = get_audio_store("outputs")
+
+    def get_cache_stats(self):
+        """Get hit/miss statistics for the TTS cache, or None if disabled"""
+        return self.cache.stats() if self.cache else None
+
+    def _from_cache(self, cache_key, audio_format, live_stream, log_prefix):
+        """
+        Look up a clip in the cache, writing it to live_stream on a hit
 
-    def synthesize_speech(self, text, celebrity_id):
+        Returns:
+            tuple or None: The cached clip as (audio, format, reference), None on a miss
+        """
+        if self.cache is None:
+            return None
+        ref = self.cache.get(cache_key)
+        if ref is None:
+            return None
+        try:
+            audio = self.cache.store.read(ref)
+        except FileNotFoundError:
+            # Evicted in the meantime
+            return None
+        logger.info(f"{log_prefix} TTS cache hit: {ref}")
+        if live_stream is not None:
+            live_stream.write(audio)
+        return audio, audio_format, ref
+
+    async def _store_in_cache(self, cache_key, audio, audio_format):
+        """
+        Add a finished clip to the cache, off the event loop
+
+        Returns:
+            tuple: The clip as (audio, format, reference), where the reference
+                is None if caching is disabled or failed
+        """
+        if self.cache is None:
+            return audio, audio_format, None
+        try:
+            ref = await asyncio.get_running_loop().run_in_executor(
+                None, self.cache.put, cache_key, audio, f".{audio_format}")
+        except OSError as e:
+            logger.warning(f"Could not cache synthesized audio: {str(e)}")
+            ref = None
+        return audio, audio_format, ref
+
+    def synthesize_speech(self, text, celebrity_id, parallel=TTS_PARALLEL_ENABLED):
         """
         Synchronous wrapper around async speech synthesis
 
         Args:
             text (str): The text to synthesize
             celebrity_id (str): The ID of the celebrity voice to use
+            parallel (bool): Synthesize long texts sentence by sentence in parallel
 
         Returns:
-            str: The path to the synthesized audio file
+            str: Reference to the synthesized audio in the output store (see audio_store)
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self.synthesize_speech_async(text, celebrity_id))
-        finally:
-            loop.close()
+        return run_async(self.synthesize_speech_async(text, celebrity_id, parallel=parallel))
 
-    async def synthesize_speech_async(self, text, celebrity_id, max_retries=3, timeout=60.0):
+    def start_streaming_synthesis(self, text, celebrity_id, live_stream=None, chunk_stats=None,
+                                  parallel=TTS_PARALLEL_ENABLED):
+        """
+        Start synthesis in the background, feeding audio into live_stream as it
+        arrives so playback can begin before the file is complete
+
+        Args:
+            text (str): The text to synthesize
+            celebrity_id (str): The ID of the celebrity voice to use
+            live_stream (LiveAudioStream, optional): Receives the audio chunks
+            chunk_stats (list, optional): Receives the per-chunk stats of a parallel synthesis
+            parallel (bool): Synthesize long texts sentence by sentence in parallel
+
+        Returns:
+            concurrent.futures.Future: Resolves to the reference of the synthesized audio
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.synthesize_speech_async(
+                text, celebrity_id, live_stream=live_stream, chunk_stats=chunk_stats, parallel=parallel),
+            get_event_loop()
+        )
+
+    async def synthesize_speech_async(self, text, celebrity_id, max_retries=3, timeout=60.0, deadline=None,
+                                      live_stream=None, chunk_stats=None, parallel=TTS_PARALLEL_ENABLED):
         """
         Use Fish Audio API to synthesize speech in a celebrity's voice (async version)
 
@@ -85,43 +279,127 @@ class VoiceSynthesizer:
             text (str): The text to synthesize
             celebrity_id (str): The ID of the celebrity voice to use
             max_retries (int): Maximum number of retry attempts
-            timeout (float): Request timeout in seconds
+            timeout (float): Upper bound for a single request in seconds
+            deadline (float, optional): Time budget in seconds for all attempts and
+                the fallback, defaults to TTS_DEADLINE_SECONDS
+            live_stream (LiveAudioStream, optional): Receives audio chunks as they arrive
+            chunk_stats (list, optional): Receives the per-chunk stats of a parallel
+                synthesis (see _synthesize_chunks)
+            parallel (bool): Split texts of TTS_PARALLEL_MIN_CHARS or more at sentence
+                boundaries and synthesize the parts concurrently
+
+        Returns:
+            str: Reference to the synthesized audio in the output store (see audio_store)
+        """
+        chunks = split_sentences(text) if parallel and len(text) >= TTS_PARALLEL_MIN_CHARS else []
+        if len(chunks) > 1:
+            synthesis = self._synthesize_parallel(chunks, celebrity_id, max_retries, timeout,
+                                                  deadline, live_stream, chunk_stats)
+        else:
+            synthesis = self._synthesize(text, celebrity_id, max_retries, timeout,
+                                         deadline, live_stream)
+        return await self._feed_live_stream(synthesis, live_stream)
+
+    def start_sentence_stream_synthesis(self, sentences, celebrity_id, live_stream=None, chunk_stats=None):
+        """
+        Start synthesizing text that is still being generated, e.g. by
+        TextTransformer.transform_text_stream, in the background
+
+        Args:
+            sentences (iterable): Blocking iterator of sentences; it is consumed
+                on a worker thread and each sentence starts synthesizing as
+                soon as it arrives
+            celebrity_id (str): The ID of the celebrity voice to use
+            live_stream (LiveAudioStream, optional): Receives the audio chunks
+            chunk_stats (list, optional): Receives the per-sentence stats
+
+        Returns:
+            concurrent.futures.Future: Resolves to the reference of the synthesized audio
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.synthesize_sentence_stream_async(
+                iterate_in_thread(sentences), celebrity_id, live_stream=live_stream, chunk_stats=chunk_stats),
+            get_event_loop()
+        )
+
+    async def synthesize_sentence_stream_async(self, sentences, celebrity_id, max_retries=3, timeout=60.0,
+                                               deadline=None, live_stream=None, chunk_stats=None):
+        """
+        Synthesize sentences as they arrive from an async iterator, so the first
+        sentence is audible before the last one has been generated
+
+        Args:
+            sentences: Async iterator of sentences
+            celebrity_id (str): The ID of the celebrity voice to use
+            max_retries (int): Maximum number of retry attempts per sentence
+            timeout (float): Upper bound for a single request in seconds
+            deadline (float, optional): Time budget in seconds for all sentences,
+                defaults to TTS_DEADLINE_SECONDS
+            live_stream (LiveAudioStream, optional): Receives audio chunks as they arrive
+            chunk_stats (list, optional): Receives the per-sentence stats
 
         Returns:
-            str: The path to the synthesized audio file
+            str: Reference to the synthesized audio in the output store (see audio_store)
+        """
+        if celebrity_id not in CELEBRITIES:
+            raise ValueError(f"Celebrity {celebrity_id} not found")
+        if deadline is None:
+            deadline = TTS_DEADLINE_SECONDS
+
+        logger.info(f"[Voice:{CELEBRITIES[celebrity_id]['name']}] Synthesizing sentences as they are generated")
+        return await self._feed_live_stream(
+            self._synthesize_chunks(sentences, celebrity_id, max_retries, timeout, deadline, live_stream,
+                                    chunk_stats=chunk_stats),
+            live_stream)
+
+    async def _feed_live_stream(self, synthesis, live_stream):
+        """Await a synthesis, finishing or failing live_stream with it, and publish the result"""
+        try:
+            with timed_stage("tts_complete"):
+                audio, audio_format, ref = await synthesis
+        except BaseException:
+            if live_stream is not None:
+                live_stream.fail()
+            raise
+
+        if live_stream is not None:
+            live_stream.finish()
+        if ref is not None:
+            # Already stored in the cache
+            return ref
+        return await asyncio.get_running_loop().run_in_executor(None, self.store.put, audio, audio_format)
+
+    async def _synthesize(self, text, celebrity_id, max_retries, timeout, deadline, live_stream):
+        """
+        Synthesize speech with caching, retries and the synchronous fallback
+
+        Returns:
+            tuple: The clip as (audio, format, reference of the cached clip or None)
         """
         # Get celebrity info
         if celebrity_id not in CELEBRITIES:
             raise ValueError(f"Celebrity {celebrity_id} not found")
+        if deadline is None:
+            deadline = TTS_DEADLINE_SECONDS
 
-        celebrity = CELEBRITIES[celebrity_id]
-        voice_id = celebrity["fish_audio_voice_id"]
-        name = celebrity["name"]
+        name = CELEBRITIES[celebrity_id]["name"]
 
         # Add context to logs
         log_prefix = f"[Voice:{name}]"
         logger.info(
             f"{log_prefix} Generating voice audio for text: {text[:50]}...")
 
-        # Get voice-specific speed or use default
-        speed = VOICE_SPEEDS.get(celebrity_id, VOICE_SPEEDS["default"])
-        logger.info(f"{log_prefix} Using voice speed: {speed}")
-
-        # Create output file path
-        output_file = generate_unique_filename(OUTPUT_AUDIO_DIR, "wav")
-
         # Prepare request
-        request = TTSRequest(
-            text=text,
-            reference_id=voice_id,  # Use reference_id instead of voice_id
-            format="mp3",
-            chunk_length=200,
-            mp3_bitrate=192,
-            model="speech-1.6",
-            prosody={
-                "speed": speed,
-            }
-        )
+        request = self._build_request(text, celebrity_id)
+        logger.info(f"{log_prefix} Using voice speed: {request.prosody['speed']}")
+
+        # Serve repeated requests straight from the cache
+        cache_key = tts_cache_key(request)
+        cached = self._from_cache(cache_key, request.format, live_stream, log_prefix)
+        if cached is not None:
+            return cached
+        if self.cache is not None:
+            logger.info(f"{log_prefix} TTS cache miss")
 
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -129,58 +407,84 @@ class VoiceSynthesizer:
             "model": "speech-1.6"  # Also include in headers
         }
 
+        # Fail fast while Fish Audio is known to be unhealthy
+        breaker = get_breaker(self.api_url)
+        expires_at = time.monotonic() + deadline
+
         # Retry logic
         retries = 0
         last_error = None
 
         while retries < max_retries:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                logger.error(f"{log_prefix} Deadline of {deadline} seconds exceeded")
+                break
+            if not breaker.available():
+                last_error = CircuitOpenError(
+                    "Fish Audio TTS", breaker.retry_after())
+                break
+
+            # Split what is left of the budget evenly across the remaining attempts
+            attempt_timeout = min(timeout, remaining / (max_retries - retries))
+            start_time = time.time()
+            probing = False  # Holding the breaker's permission without having reported back
             try:
-                logger.info(
-                    f"{log_prefix} Making API request to Fish Audio (attempt {retries+1}/{max_retries})")
-                # Use context manager to ensure client is properly closed
-                async with get_httpx_client(timeout=timeout) as client:
+                # Wait for our turn with the other sessions; the wait isn't charged to the endpoint
+                async with admission("fish_audio", timeout=remaining):
+                    # Only ask the breaker once our turn has come, so a half-open
+                    # probe is not held while queueing
+                    if not breaker.allow_request():
+                        last_error = CircuitOpenError(
+                            "Fish Audio TTS", breaker.retry_after())
+                        break
+                    probing = True
+                    attempt_timeout = min(
+                        timeout, (expires_at - time.monotonic()) / (max_retries - retries))
                     start_time = time.time()
-                    try:
-                        async with client.stream(
-                            "POST",
-                            self.api_url,
-                            json=request.model_dump(),
-                            headers=headers,
-                            timeout=timeout
-                        ) as response:
-                            if response.status_code != 200:
-                                error_text = await response.aread()
-                                logger.error(
-                                    f"{log_prefix} Fish Audio API Error: {response.status_code}")
-                                logger.error(
-                                    f"{log_prefix} Error details: {error_text.decode()}")
-                                raise Exception(
-                                    f"Fish Audio API error: {response.status_code}")
-
-                            logger.info(
-                                f"{log_prefix} Received successful response, writing to file")
-                            with open(output_file, "wb") as f:
-                                async for chunk in response.aiter_bytes():
-                                    f.write(chunk)
-
-                        duration = time.time() - start_time
-                        logger.info(
-                            f"{log_prefix} API request completed in {duration:.2f} seconds")
-                        return output_file
-
-                    except httpx.TimeoutException:
-                        logger.warning(
-                            f"{log_prefix} Request timed out after {timeout} seconds")
-                        raise
+                    logger.info(
+                        f"{log_prefix} Making API request to Fish Audio (attempt {retries+1}/{max_retries}, "
+                        f"timeout {attempt_timeout:.1f}s)")
+                    audio = await asyncio.wait_for(
+                        self._stream_audio(request, headers, log_prefix, live_stream),
+                        attempt_timeout
+                    )
+
+                duration = time.time() - start_time
+                probing = False
+                breaker.record_success(duration)
+                logger.info(
+                    f"{log_prefix} API request completed in {duration:.2f} seconds")
+                return await self._store_in_cache(cache_key, audio, request.format)
 
+            except AdmissionRejectedError:
+                # Queueing longer would blow the deadline; retrying can't help
+                raise
             except Exception as e:
+                duration = time.time() - start_time
+                probing = False
                 last_error = e
                 retries += 1
+                if live_stream is not None:
+                    live_stream.reset()
+                if isinstance(e, FishAudioAPIError) and e.status_code == 429:
+                    # Hold back every session until Fish Audio is ready again
+                    report_rate_limited("fish_audio", e.retry_after)
+                if isinstance(e, asyncio.TimeoutError):
+                    logger.warning(
+                        f"{log_prefix} Request timed out after {attempt_timeout:.1f} seconds")
                 logger.error(f"{log_prefix} Fish Audio API Error: {str(e)}")
 
+                if isinstance(e, FishAudioAPIError) and not e.retryable:
+                    # The endpoint is healthy, the request itself was rejected
+                    breaker.record_success(duration)
+                    raise Exception(f"Failed to synthesize speech: {str(e)}")
+                breaker.record_failure(duration)
+
                 if retries < max_retries:
-                    # Exponential backoff with jitter
-                    wait_time = (2 ** retries) + random.uniform(0, 1)
+                    # Exponential backoff with jitter, never using more than half the remaining budget
+                    wait_time = min((2 ** retries) + random.uniform(0, 1),
+                                    max(0.0, expires_at - time.monotonic()) / 2)
                     logger.info(
                         f"{log_prefix} Retrying in {wait_time:.2f} seconds (attempt {retries+1}/{max_retries})")
                     await asyncio.sleep(wait_time)
@@ -188,24 +492,227 @@ class VoiceSynthesizer:
                     logger.error(
                         f"{log_prefix} All {max_retries} attempts failed")
                     break
+            finally:
+                if probing:
+                    # Cancelled mid-request: there is no outcome to report, let another call probe
+                    breaker.release()
 
         # If we got here, all retries failed
         error_message = str(
             last_error) if last_error else "Failed to generate voice after multiple attempts"
         logger.error(f"{log_prefix} {error_message}")
 
-        # Fallback to synchronous request as a last resort
+        remaining = expires_at - time.monotonic()
+        if isinstance(last_error, CircuitOpenError) or remaining <= 0 or not breaker.available():
+            raise Exception(f"Failed to synthesize speech: {error_message}")
+
+        # Fallback to synchronous request as a last resort, off the event loop
+        start_time = time.time()
         try:
             logger.info(
-                f"{log_prefix} Attempting fallback to synchronous request")
-            return self._synchronous_fallback(text, celebrity_id, output_file)
+                f"{log_prefix} Attempting fallback to synchronous request ({remaining:.1f}s left)")
+            loop = asyncio.get_running_loop()
+            audio = await asyncio.wait_for(
+                # In a copy of this context, so admission and metrics see the same session and request
+                loop.run_in_executor(None, contextvars.copy_context().run, self._synchronous_fallback,
+                                     text, celebrity_id, remaining),
+                remaining
+            )
+            breaker.record_success(time.time() - start_time)
+            if live_stream is not None:
+                live_stream.write(audio)
+            return await self._store_in_cache(cache_key, audio, request.format)
         except Exception as e:
+            if not isinstance(e, AdmissionRejectedError):
+                breaker.record_failure(time.time() - start_time)
             logger.error(
                 f"{log_prefix} Synchronous fallback also failed: {str(e)}")
             raise Exception(f"Failed to synthesize speech: {error_message}")
 
-    def _synchronous_fallback(self, text, celebrity_id, output_file):
-        """Fallback to synchronous request if async fails"""
+    def _build_request(self, text, celebrity_id):
+        """Build the Fish Audio TTS request for a text in a celebrity's voice"""
+        # Get voice-specific speed or use default
+        speed = VOICE_SPEEDS.get(celebrity_id, VOICE_SPEEDS["default"])
+        return TTSRequest(
+            text=text,
+            reference_id=CELEBRITIES[celebrity_id]["fish_audio_voice_id"],  # Use reference_id instead of voice_id
+            format="mp3",
+            chunk_length=200,
+            mp3_bitrate=192,
+            model="speech-1.6",
+            prosody={
+                "speed": speed,
+            }
+        )
+
+    async def _synthesize_parallel(self, chunks, celebrity_id, max_retries, timeout, deadline, live_stream,
+                                   chunk_stats=None):
+        """
+        Synthesize sentence chunks concurrently and stitch them in order.
+
+        At most TTS_MAX_CONCURRENCY requests run at once, each with the usual
+        caching, retries and circuit breaker, under one shared deadline. The
+        first chunk streams straight into live_stream; every later chunk is
+        appended as soon as it and all chunks before it are done.
+        """
+        if celebrity_id not in CELEBRITIES:
+            raise ValueError(f"Celebrity {celebrity_id} not found")
+        if deadline is None:
+            deadline = TTS_DEADLINE_SECONDS
+
+        log_prefix = f"[Voice:{CELEBRITIES[celebrity_id]['name']}]"
+        logger.info(
+            f"{log_prefix} Synthesizing {len(chunks)} chunks with up to {TTS_MAX_CONCURRENCY} in parallel")
+
+        # The stitched result is cached too, keyed on its parts
+        cache_key = self._stitched_cache_key(chunks, celebrity_id)
+        cached = self._from_cache(cache_key, "mp3", live_stream, f"{log_prefix} Stitched audio:")
+        if cached is not None:
+            return cached
+
+        return await self._synthesize_chunks(iterate_async(chunks), celebrity_id, max_retries, timeout,
+                                             deadline, live_stream, cache_key, chunk_stats)
+
+    async def _synthesize_chunks(self, chunks, celebrity_id, max_retries, timeout, deadline, live_stream,
+                                 cache_key=None, chunk_stats=None):
+        """
+        Synthesize chunks from an async iterator as they arrive and stitch them in order
+
+        Args:
+            chunks: Async iterator of text chunks; each starts synthesizing as
+                soon as it is produced
+            cache_key (str, optional): Cache key of the stitched result, derived
+                from the chunks when not given
+            chunk_stats (list, optional): Receives a dict per chunk, in order: chunk,
+                chars, bytes, seconds, chars_per_second and ready_after. It belongs
+                to the caller, so concurrent syntheses don't mix up their stats
+
+        Returns:
+            tuple: The stitched clip as (audio, format, reference of the cached clip or None)
+        """
+        log_prefix = f"[Voice:{CELEBRITIES[celebrity_id]['name']}]"
+        semaphore = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+        expires_at = time.monotonic() + deadline
+        started_at = time.time()
+        texts = []
+        stats = []
+
+        async def synthesize_chunk(index, chunk):
+            async with semaphore:
+                start_time = time.time()
+                clip = await self._synthesize(
+                    chunk, celebrity_id, max_retries, timeout,
+                    max(0.0, expires_at - time.monotonic()),
+                    live_stream if index == 0 else None)
+                duration = time.time() - start_time
+                stats.append({
+                    "chunk": index + 1,
+                    "chars": len(chunk),
+                    "bytes": len(clip[0]),
+                    "seconds": duration,
+                    "chars_per_second": len(chunk) / duration if duration > 0 else 0.0,
+                    "ready_after": time.time() - started_at
+                })
+                return clip
+
+        # Start a task per chunk as it arrives; None marks the end of the chunks
+        scheduled = asyncio.Queue()
+
+        async def schedule():
+            try:
+                async for chunk in chunks:
+                    scheduled.put_nowait(asyncio.create_task(synthesize_chunk(len(texts), chunk)))
+                    texts.append(chunk)
+            finally:
+                scheduled.put_nowait(None)
+
+        scheduler = asyncio.create_task(schedule())
+        tasks = []
+        clips = []
+        try:
+            while True:
+                task = await scheduled.get()
+                if task is None:
+                    break
+                tasks.append(task)
+                clip = await task
+                if live_stream is not None and clips:
+                    live_stream.write(clip[0])
+                clips.append(clip)
+            await scheduler  # Raise if producing the chunks failed
+        except BaseException:
+            scheduler.cancel()
+            while not scheduled.empty():
+                task = scheduled.get_nowait()
+                if task is not None:
+                    tasks.append(task)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(scheduler, *tasks, return_exceptions=True)
+            raise
+
+        if not clips:
+            raise ValueError("No text to synthesize")
+        stats.sort(key=lambda entry: entry["chunk"])
+        if chunk_stats is not None:
+            chunk_stats.extend(stats)
+        for entry in stats:
+            logger.info(
+                f"{log_prefix} Chunk {entry['chunk']}/{len(texts)}: {entry['chars']} chars, "
+                f"{entry['bytes'] / 1024:.1f} KB in {entry['seconds']:.2f}s "
+                f"({entry['chars_per_second']:.0f} chars/s, ready after {entry['ready_after']:.2f}s)")
+        if len(clips) == 1:
+            return clips[0]
+
+        if cache_key is None:
+            cache_key = self._stitched_cache_key(texts, celebrity_id)
+        loop = asyncio.get_running_loop()
+        audio = await loop.run_in_executor(
+            None, stitch_audio, [clip[0] for clip in clips], TTS_CROSSFADE_MS)
+        logger.info(
+            f"{log_prefix} Stitched {len(clips)} chunks in {time.time() - started_at:.2f} seconds")
+        return await self._store_in_cache(cache_key, audio, "mp3")
+
+    def _stitched_cache_key(self, chunks, celebrity_id):
+        """Cache key of the audio stitched from chunks, keyed on its parts"""
+        return make_cache_key({
+            "chunks": [tts_cache_key(self._build_request(chunk, celebrity_id)) for chunk in chunks],
+            "crossfade_ms": TTS_CROSSFADE_MS
+        })
+
+    async def _stream_audio(self, request, headers, log_prefix, live_stream=None):
+        """Stream a TTS response from Fish Audio into memory (and live_stream, if given) and return it"""
+        # Reuse the shared keep-alive connection pool
+        start_time = time.perf_counter()
+        async with get_httpx_client() as client:
+            async with client.stream(
+                "POST",
+                self.api_url,
+                json=request.model_dump(),
+                headers=headers
+            ) as response:
+                if response.status_code != 200:
+                    error_text = await response.aread()
+                    logger.error(
+                        f"{log_prefix} Fish Audio API Error: {response.status_code}")
+                    logger.error(
+                        f"{log_prefix} Error details: {error_text.decode()}")
+                    raise FishAudioAPIError(response.status_code,
+                                            response.headers.get("Retry-After"))
+
+                logger.info(
+                    f"{log_prefix} Received successful response, receiving audio")
+                audio = bytearray()
+                async for chunk in response.aiter_bytes():
+                    if not audio:
+                        observe("tts_first_byte", time.perf_counter() - start_time)
+                    audio += chunk
+                    if live_stream is not None:
+                        live_stream.write(chunk)
+                return audio
+
+    def _synchronous_fallback(self, text, celebrity_id, timeout=None):
+        """Fallback to synchronous request if async fails; returns the audio"""
         voice_id = CELEBRITIES[celebrity_id]["fish_audio_voice_id"]
         name = CELEBRITIES[celebrity_id]["name"]
         log_prefix = f"[Voice:{name}]"
@@ -230,22 +737,27 @@ class VoiceSynthesizer:
         }
 
         # Make synchronous request
-        logger.info(
-            f"{log_prefix} Making synchronous API request to Fish Audio")
-        response = requests.post(
-            self.api_url,
-            headers=headers,
-            json=data,
-            stream=True
-        )
-
-        # Check if request was successful
-        response.raise_for_status()
-
-        # Save audio to file
-        with open(output_file, "wb") as f:
+        with admission("fish_audio", timeout=timeout):
+            logger.info(
+                f"{log_prefix} Making synchronous API request to Fish Audio")
+            response = get_requests_session().post(
+                self.api_url,
+                headers=headers,
+                json=data,
+                stream=True,
+                timeout=timeout
+            )
+
+            # Check if request was successful
+            if response.status_code == 429:
+                report_rate_limited(
+                    "fish_audio", response.headers.get("Retry-After"))
+            response.raise_for_status()
+
+            # Collect the audio
+            audio = bytearray()
             for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+                audio += chunk
 
         logger.info(f"{log_prefix} Synchronous request successful")
-        return output_file
+        return audio